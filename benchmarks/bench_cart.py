@@ -0,0 +1,144 @@
+import argparse
+import time
+
+from benchmarks.common import cleanup, scratch_copy
+from src.db.pool import ConnectionPool
+from src.db.repository import dbFunctions
+
+#   Cart operations per second: in-memory session cart vs. the previous
+#   write-through cart.
+#
+#   One customer session repeatedly fills a cart: five adds, a view, two
+#   quantity changes, a view, one removal, a view, then logout (which writes
+#   the in-memory cart back). Every add/set/remove/view counts as one
+#   operation. The legacy mode runs the statements dbFunctions used to run
+#   (a SELECT for the line, a write and a commit per change, the cart query
+#   per view); product rows come from the product cache in both modes.
+#
+#   Usage: python -m benchmarks.bench_cart [data/store.db] [--seconds 3]
+
+
+class LegacyCart:
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.pool = repo.pool
+
+    def _qty(self, s, pid):
+        with self.pool.reader() as conn:
+            return conn.execute("SELECT qty FROM cart WHERE cid = ? and sessionNo = ? and pid = ?;",
+                                (s.cid, s.sessionNo, pid)).fetchone()
+
+    def add(self, s, pid, qty):
+        rs = self._qty(s, pid)
+        stock = self.repo.check_stock(pid)["stock_count"]
+        with self.pool.writer() as conn:
+            if rs is None:
+                if stock > 0:
+                    conn.execute("INSERT INTO cart (cid,sessionNo,pid,qty) VALUES (?,?,?,?);", (s.cid, s.sessionNo, pid, qty))
+            elif rs[0] + qty <= stock:
+                conn.execute("UPDATE cart SET qty = ? WHERE cid = ? and sessionNo = ? and pid = ? ;",
+                             (rs[0] + qty, s.cid, s.sessionNo, pid))
+            conn.commit()
+
+    def set(self, s, pid, qty):
+        self._qty(s, pid)
+        if qty <= self.repo.check_stock(pid)["stock_count"]:
+            with self.pool.writer() as conn:
+                conn.execute("UPDATE cart SET qty = ? WHERE cid = ? and sessionNo = ? and pid = ? ;",
+                             (qty, s.cid, s.sessionNo, pid))
+                conn.commit()
+
+    def remove(self, s, pid):
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM cart WHERE cid = ? AND sessionNo = ? AND pid = ?;", (s.cid, s.sessionNo, pid))
+            conn.commit()
+
+    def view(self, s):
+        with self.pool.reader() as conn:
+            cart = conn.execute("SELECT pid, qty FROM cart WHERE cid = ? AND sessionNo = ?;", (s.cid, s.sessionNo)).fetchall()
+        products = self.repo.products.get_many([r[0] for r in cart])
+        return [(r[0], products[r[0]]["price"] * r[1]) for r in cart if r[0] in products]
+
+    def logout(self, s):
+        self.repo.update_session(s)
+
+
+class MemoryCart:
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    def add(self, s, pid, qty):
+        self.repo.add_to_cart(s, pid, qty, "add")
+
+    def set(self, s, pid, qty):
+        self.repo.add_to_cart(s, pid, qty, "set")
+
+    def remove(self, s, pid):
+        self.repo.delete_cart_items(s, pid)
+
+    def view(self, s):
+        return self.repo.get_cart_items(s)
+
+    def logout(self, s):
+        self.repo.update_session(s)
+
+
+#   Returns:
+#           tuple: (operations, seconds, cart rows in the table, sessions).
+def run(repo, cart, cid, pids, seconds):
+    ops = 0
+    sessions = []
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        s = repo.create_session(cid)
+        sessions.append(s)
+        for pid in pids:
+            cart.add(s, pid, 1)
+        cart.view(s)
+        cart.set(s, pids[0], 2)
+        cart.set(s, pids[1], 3)
+        cart.view(s)
+        cart.remove(s, pids[2])
+        cart.view(s)
+        cart.logout(s)
+        ops += len(pids) + 6
+    elapsed = time.perf_counter() - start
+    with repo.pool.reader() as conn:
+        rows = sum(conn.execute("SELECT COUNT(*) FROM cart WHERE cid = ? AND sessionNo = ?;",
+                                (s.cid, s.sessionNo)).fetchone()[0] for s in sessions)
+    return ops, elapsed, rows, len(sessions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cart operations per second")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    path = scratch_copy(args.db_path)
+    try:
+        pool = ConnectionPool(path)
+        repo = dbFunctions(pool)
+        with pool.reader() as conn:
+            cid = conn.execute("SELECT cid FROM customers ORDER BY cid LIMIT 1;").fetchone()[0]
+            pids = [r[0] for r in conn.execute("SELECT pid FROM products WHERE stock_count >= 5 ORDER BY pid LIMIT 5;")]
+        print(f"{'mode':<10}{'ops/s':>10}{'sessions':>10}{'rows kept':>11}")
+        print("-" * 41)
+        results = {}
+        for mode, cart in (("legacy", LegacyCart(repo)), ("memory", MemoryCart(repo))):
+            ops, elapsed, rows, sessions = run(repo, cart, cid, pids, args.seconds)
+            results[mode] = ops / elapsed
+            #   both modes must leave 4 lines per session in the table
+            print(f"{mode:<10}{ops / elapsed:>10.0f}{sessions:>10}{rows:>11}")
+        print(f"\nspeed-up: {results['memory'] / results['legacy']:.1f}x")
+        repo.close()
+    finally:
+        cleanup(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
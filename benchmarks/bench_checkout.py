@@ -0,0 +1,171 @@
+import argparse
+import multiprocessing as mp
+import random
+import sqlite3
+import time
+
+from benchmarks.common import cleanup, scratch_copy
+from src.db.pool import ConnectionPool
+from src.db.repository import dbFunctions
+from src.domain.models import SessionInf
+
+#   Checkout throughput under contention.
+#
+#   N worker processes check out concurrently against one store copy. Every
+#   cart holds 1-3 units of two of six "hot" products, so all workers fight
+#   over the same rows. Compares the set-based engine
+#   (dbFunctions.create_order) with the previous read-then-loop algorithm and
+#   verifies afterwards that stock was never oversold.
+#
+#   Usage: python -m benchmarks.bench_checkout [data/store.db] [--workers 8] [--seconds 5] [--stock N]
+#   A small --stock (e.g. 200) makes the race for the last units visible;
+#   a large one measures steady-state throughput.
+
+BASE_CID = 900000
+
+
+#   The checkout as it was before the set-based engine: cart and stock are
+#   read before the transaction, then one INSERT + UPDATE per line.
+def legacy_create_order(pool, sessionInformation, shipping_address):
+    with pool.reader() as conn:
+        rs = conn.execute("""
+            SELECT ct.pid, p.name, p.price, ct.qty, p.stock_count
+            FROM cart ct JOIN products p ON ct.pid = p.pid
+            WHERE ct.cid = ? AND ct.sessionNo = ?;
+        """, (sessionInformation.cid, sessionInformation.sessionNo)).fetchall()
+        ono = conn.execute("SELECT COALESCE(MAX(ono), 0) + 1 FROM orders;").fetchone()[0]
+    if not rs:
+        return None
+    odate = time.strftime("%Y-%m-%d %H:%M:%S")
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        conn.execute("INSERT INTO orders (ono, cid, sessionNo, odate, shipping_address) VALUES (?,?,?,?,?);",
+                     (ono, sessionInformation.cid, sessionInformation.sessionNo, odate, shipping_address))
+        for index, row in enumerate(rs, start=1):
+            if row["stock_count"] < row["qty"]:
+                conn.execute("ROLLBACK;")
+                return None
+            conn.execute("INSERT INTO orderlines (ono, lineNo, pid, qty, uprice) VALUES (?,?,?,?,?);",
+                         (ono, index, row["pid"], row["qty"], row["price"]))
+            conn.execute("UPDATE products SET stock_count = stock_count - ? WHERE pid = ?;",
+                         (row["qty"], row["pid"]))
+        conn.execute("DELETE FROM cart WHERE cid = ? AND sessionNo = ?;",
+                     (sessionInformation.cid, sessionInformation.sessionNo))
+        conn.commit()
+    return ono
+
+
+def _worker(db_path, worker_id, hot_pids, seconds, mode, start_at, out):
+    pool = ConnectionPool(db_path, readers=1, busy_timeout=30.0)
+    repo = dbFunctions(pool)
+    rnd = random.Random(worker_id)
+    cid = BASE_CID + worker_id
+    stats = {"ok": 0, "short": 0, "errors": 0, "busy": 0.0}
+    session_no = 0
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        session_no += 1
+        session = SessionInf(cid=cid, sessionNo=session_no)
+        lines = [(cid, session_no, pid, rnd.randint(1, 3)) for pid in rnd.sample(hot_pids, 2)]
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO sessions (cid, sessionNo, start_time) VALUES (?, ?, datetime('now'));",
+                         (cid, session_no))
+            conn.executemany("INSERT INTO cart (cid, sessionNo, pid, qty) VALUES (?, ?, ?, ?);", lines)
+
+        t0 = time.perf_counter()
+        try:
+            if mode == "legacy":
+                ono = legacy_create_order(pool, session, "1 Bench St")
+            else:
+                result = repo.checkout(session, "1 Bench St")
+                ono = result.ono if result else None
+        except sqlite3.Error:
+            ono = None
+            stats["errors"] += 1
+        stats["busy"] += time.perf_counter() - t0
+        if ono:
+            stats["ok"] += 1
+        else:
+            stats["short"] += 1
+            with pool.writer() as conn:
+                conn.execute("DELETE FROM cart WHERE cid = ? AND sessionNo = ?;", (cid, session_no))
+    pool.close()
+    out.put(stats)
+
+
+def run(db_path, mode, workers, seconds, stock):
+    path = scratch_copy(db_path)
+    try:
+        conn = sqlite3.connect(path)
+        hot_pids = [r[0] for r in conn.execute("SELECT pid FROM products ORDER BY pid LIMIT 6;")]
+        conn.executemany("UPDATE products SET stock_count = ? WHERE pid = ?;", [(stock, p) for p in hot_pids])
+        conn.executemany("INSERT INTO users (uid, pwd, role) VALUES (?, 'x', 'customer');",
+                         [(BASE_CID + i,) for i in range(workers)])
+        conn.executemany("INSERT INTO customers (cid, name, email) VALUES (?, 'bench', ?);",
+                         [(BASE_CID + i, f"bench{i}@example.com") for i in range(workers)])
+        max_ono = conn.execute("SELECT COALESCE(MAX(ono), 0) FROM orders;").fetchone()[0]
+        conn.commit()
+        conn.close()
+        ConnectionPool(path).close()     # switch the copy to WAL before the workers start
+
+        ctx = mp.get_context("spawn")
+        out = ctx.Queue()
+        start_at = time.time() + 1.0
+        procs = [ctx.Process(target=_worker, args=(path, i, hot_pids, seconds, mode, start_at, out))
+                 for i in range(workers)]
+        for p in procs:
+            p.start()
+        stats = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+        conn = sqlite3.connect(path)
+        sold = dict(conn.execute(
+            "SELECT ol.pid, SUM(ol.qty) FROM orderlines ol WHERE ol.ono > ? GROUP BY ol.pid;", (max_ono,)
+        ).fetchall())
+        left = dict(conn.execute(
+            f"SELECT pid, stock_count FROM products WHERE pid IN ({','.join('?' * len(hot_pids))});", hot_pids
+        ).fetchall())
+        conn.close()
+    finally:
+        cleanup(path)
+
+    ok = sum(s["ok"] for s in stats)
+    oversold = sum(max(0, -left[p]) for p in hot_pids)
+    mismatched = sum(1 for p in hot_pids if stock - left[p] != sold.get(p, 0))
+    busy = sum(s["busy"] for s in stats)
+    return {
+        "mode": mode,
+        "checkouts/s": round(ok / seconds, 1),
+        "ok": ok,
+        "rejected": sum(s["short"] for s in stats),
+        "errors": sum(s["errors"] for s in stats),
+        "avg ms": round(1000 * busy / max(1, ok + sum(s["short"] for s in stats)), 2),
+        "oversold units": oversold,
+        "stock mismatches": mismatched,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkout throughput under contention")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--stock", type=int, default=20000, help="starting stock of each hot product")
+    parser.add_argument("--mode", choices=["set", "legacy", "both"], default="both")
+    args = parser.parse_args(argv)
+
+    modes = ["legacy", "set"] if args.mode == "both" else [args.mode]
+    rows = [run(args.db_path, m, args.workers, args.seconds, args.stock) for m in modes]
+    cols = list(rows[0].keys())
+    print("  ".join(f"{c:>16}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>16}" for c in cols))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
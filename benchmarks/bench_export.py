@@ -0,0 +1,55 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import cleanup, scale_up, scratch_copy
+from src.export_tables import FORMATS, export_all
+from src.export_to_excel import Progress
+
+#   Table export: wall-clock time and output size per format and worker count.
+#
+#   The store copy is scaled up (history copied `--scale` times) so the
+#   serialization cost dominates. Every format is exported with one worker
+#   (tables one after another) and with `--workers` processes.
+#
+#   Usage: python -m benchmarks.bench_export [data/store.db] [--scale 2000] [--workers 4] [--formats csv,parquet,xlsx]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export time and size per format")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("--scale", type=int, default=2000, help="copies of the order/event history")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    args = parser.parse_args(argv)
+
+    path = scratch_copy(args.db_path)
+    out_root = tempfile.mkdtemp(prefix="store_export_")
+    try:
+        counts = scale_up(path, args.scale)
+        print("rows: " + ", ".join(f"{t}={n:,}" for t, n in counts.items()))
+        print(f"\n{'format':<8}{'workers':>8}{'seconds':>10}{'MB':>10}")
+        print("-" * 36)
+        for fmt in args.formats.split(","):
+            for workers in sorted({1, args.workers}):
+                out_dir = os.path.join(out_root, f"{fmt}_{workers}")
+                start = time.perf_counter()
+                try:
+                    results = export_all(path, out_dir, fmt, workers=workers, progress=Progress(enabled=False))
+                except RuntimeError as e:
+                    print(f"{fmt:<8}{workers:>8}  skipped: {e}")
+                    break
+                elapsed = time.perf_counter() - start
+                size = sum(r["bytes"] for r in results) / 1e6
+                print(f"{fmt:<8}{workers:>8}{elapsed:>10.2f}{size:>10.1f}")
+                shutil.rmtree(out_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(out_root, ignore_errors=True)
+        cleanup(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,312 @@
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks.common import cleanup, scratch_copy
+from benchmarks.generate_store import generate
+from src.db.analytics import customer_report
+from src.db.column_store import build_snapshot, open_snapshot
+from src.db.pool import ConnectionPool
+from src.db.repository import dbFunctions
+from src.export_tables import export_table
+
+#   Latency of the dbFunctions hot paths at several store sizes.
+#
+#   For every scale a synthetic store is generated (benchmarks/generate_store.py,
+#   `scale` times the base sizes below) and each case is timed `--repeat`
+#   times on a scratch copy of it. Caches are cleared before every timed
+#   call, so the numbers are the cost of the queries, not of a cache hit.
+#   Results (median / p95 / min ms per case and scale) are written to a JSON
+#   file; `--compare` loads an earlier file and flags every case that got
+#   slower than `--threshold` times its old median.
+#
+#   Usage: python -m benchmarks.bench_repository [--scales 1,10,100] [--repeat 20]
+#              [--cache-dir DIR] [--out results.json] [--compare old.json] [--threshold 1.3]
+#   With --cache-dir, generated stores are kept and reused by later runs.
+
+BASE_SIZES = {"customers": 1000, "products": 500, "sessions": 5000,
+              "searches": 10000, "views": 20000, "orders": 2000}
+SEARCH_TERMS = (["phone"], ["smart"], ["wireless", "speaker"], ["gift"], ["lamp"], ["pro"])
+#   cases that rewrite a whole table are timed at most this often
+SLOW_REPEAT = 3
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def _cold(repo):
+    repo.products.invalidate()
+    repo.reports.invalidate()
+
+
+#   Each case gets (ctx, i) and returns the seconds of the part being measured.
+
+def case_search_first_page(ctx, i):
+    repo = ctx["repo"]
+    return _timed(lambda: repo.search_product_cursor(SEARCH_TERMS[i % len(SEARCH_TERMS)], ctx["session"]).first())
+
+
+def case_search_page_5(ctx, i):
+    repo = ctx["repo"]
+    cursor = repo.search_product_cursor(["gift"], ctx["session"])
+    cursor.first()
+    for _ in range(3):
+        cursor.next()
+    return _timed(cursor.next)
+
+
+def case_product_details(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(repo.get_product_details, ctx["pids"][i % len(ctx["pids"])])
+
+
+def case_cart_add_and_list(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    pid = ctx["pids"][i % len(ctx["pids"])]
+    elapsed = _timed(lambda: (repo.add_to_cart(ctx["session"], pid, 1, "add"), repo.get_cart_items(ctx["session"])))
+    repo.clear_cart(ctx["session"])
+    return elapsed
+
+
+def case_checkout(ctx, i):
+    repo = ctx["repo"]
+    session = repo.create_session(ctx["cid"])
+    for pid in ctx["pids"][:2]:
+        repo.add_to_cart(session, pid, 1, "add")
+    return _timed(repo.checkout, session, "1 Bench St, Edmonton")
+
+
+def case_order_history(ctx, i):
+    repo = ctx["repo"]
+    return _timed(lambda: repo.get_orders_cursor(ctx["busiest"]).first())
+
+
+def case_sales_metrics(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(repo.sales_metrics, "2024-11-01", "2025-10-31", "month")
+
+
+def case_sales_metrics_raw(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(repo.sales_metrics, "2024-11-01", "2025-10-31", "month", "raw")
+
+
+def case_top_products(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(lambda: (repo.top_products_by_views(3), repo.top_products_by_distinct_orders(3)))
+
+
+def case_category_sales(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(repo.category_sales, "2024-11-01", "2025-10-31")
+
+
+def case_customer_analytics(ctx, i):
+    repo = ctx["repo"]
+    _cold(repo)
+    return _timed(repo.customer_analytics)
+
+
+def case_conversion_funnel(ctx, i):
+    return _timed(ctx["repo"].conversion_funnel)
+
+
+def _snapshot_root(ctx):
+    return os.path.join(os.path.dirname(ctx["path"]), "snapshots")
+
+
+def case_snapshot_build(ctx, i):
+    return _timed(build_snapshot, ctx["path"], _snapshot_root(ctx))
+
+
+def case_analytics_snapshot(ctx, i):
+    if open_snapshot(_snapshot_root(ctx)) is None:
+        build_snapshot(ctx["path"], _snapshot_root(ctx))
+    return _timed(lambda: customer_report(open_snapshot(_snapshot_root(ctx))))
+
+
+def case_export_orderlines(ctx, i):
+    out_dir = tempfile.mkdtemp(prefix="store_bench_export_")
+    try:
+        return _timed(export_table, ctx["path"], "orderlines", out_dir, "csv")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+CASES = {
+    "search_first_page": case_search_first_page,
+    "search_page_5": case_search_page_5,
+    "product_details": case_product_details,
+    "cart_add_and_list": case_cart_add_and_list,
+    "checkout": case_checkout,
+    "order_history": case_order_history,
+    "sales_metrics": case_sales_metrics,
+    "sales_metrics_raw": case_sales_metrics_raw,
+    "top_products": case_top_products,
+    "category_sales": case_category_sales,
+    "customer_analytics": case_customer_analytics,
+    "conversion_funnel": case_conversion_funnel,
+    "analytics_snapshot": case_analytics_snapshot,
+    "snapshot_build": case_snapshot_build,
+    "export_orderlines": case_export_orderlines,
+}
+SLOW_CASES = {"sales_metrics_raw", "customer_analytics", "conversion_funnel", "snapshot_build", "export_orderlines"}
+
+
+#   Path of the generated store for `scale`, generating it if needed.
+def store_for(scale, seed, cache_dir):
+    path = os.path.join(cache_dir, f"store_x{scale}_seed{seed}.db")
+    if not os.path.exists(path):
+        sizes = {name: n * scale for name, n in BASE_SIZES.items()}
+        print(f"generating x{scale}: " + ", ".join(f"{k}={v:,}" for k, v in sizes.items()))
+        generate(path + ".tmp", seed=seed, **sizes)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_scale(store, cases, repeat):
+    path = scratch_copy(store)
+    pool = ConnectionPool(path)
+    repo = dbFunctions(pool)
+    try:
+        with pool.reader() as conn:
+            rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t};").fetchone()[0]
+                    for t in ("products", "sessions", "search", "viewedProduct", "orders", "orderlines")}
+            busiest = conn.execute("SELECT cid FROM orders GROUP BY cid ORDER BY COUNT(*) DESC LIMIT 1;").fetchone()[0]
+            pids = [r[0] for r in conn.execute("SELECT pid FROM products ORDER BY pid LIMIT 50;")]
+        for pid in pids[:2]:
+            #   checkout must never run out of stock
+            repo.update_product_stock(pid, 10 ** 9)
+        ctx = {"repo": repo, "path": path, "cid": busiest, "busiest": busiest, "pids": pids,
+               "session": repo.create_session(busiest)}
+
+        results = {}
+        for name in cases:
+            n = min(repeat, SLOW_REPEAT) if name in SLOW_CASES else repeat
+            CASES[name](ctx, 0)             #   warm-up, not recorded
+            times = sorted(CASES[name](ctx, i) * 1000 for i in range(n))
+            results[name] = {
+                "runs": n,
+                "median_ms": round(statistics.median(times), 3),
+                "p95_ms": round(times[min(n - 1, int(0.95 * n))], 3),
+                "min_ms": round(times[0], 3),
+            }
+            print(f"  {name:<22}{results[name]['median_ms']:>10.3f}{results[name]['p95_ms']:>10.3f}{results[name]['min_ms']:>10.3f}")
+        return rows, results
+    finally:
+        repo.close()
+        cleanup(path)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#   Print old vs. new medians.
+#   Returns:
+#           list: (scale, case, ratio) of every regression.
+def compare(old, new, threshold):
+    regressions = []
+    print(f"\n{'scale':<7}{'case':<22}{'old ms':>10}{'new ms':>10}{'ratio':>8}")
+    print("-" * 57)
+    for scale, cases in new["results"].items():
+        for name, r in cases.items():
+            before = old.get("results", {}).get(scale, {}).get(name)
+            if before is None:
+                continue
+            ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            #   sub-50µs differences are timer noise
+            slower = ratio > threshold and r["median_ms"] - before["median_ms"] > 0.05
+            flag = "  << slower" if slower else ""
+            print(f"x{scale:<6}{name:<22}{before['median_ms']:>10.3f}{r['median_ms']:>10.3f}{ratio:>8.2f}{flag}")
+            if slower:
+                regressions.append((scale, name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repository hot-path latency at several store sizes")
+    parser.add_argument("--scales", default="1,10", help="comma-separated multiples of the base sizes")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--cache-dir", help="keep generated stores here and reuse them")
+    parser.add_argument("--out", help="results file (default benchmarks/results/repository-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.3, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(",")
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="store_bench_data_")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    report = {
+        "meta": {
+            "started": dt.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "base_sizes": BASE_SIZES,
+        },
+        "rows": {},
+        "results": {},
+    }
+    try:
+        for scale in [int(s) for s in args.scales.split(",")]:
+            store = store_for(scale, args.seed, cache_dir)
+            print(f"\nx{scale}  {'case':<20}{'median ms':>10}{'p95 ms':>10}{'min ms':>10}")
+            rows, results = run_scale(store, cases, args.repeat)
+            report["rows"][str(scale)] = rows
+            report["results"][str(scale)] = results
+    finally:
+        if not args.cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    out = args.out or os.path.join("benchmarks", "results",
+                                   f"repository-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[✓] Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            print(f"\n[X] {len(regressions)} case(s) slower than {args.threshold}x the baseline")
+            return 1
+        print("\n[✓] No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
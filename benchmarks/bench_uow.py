@@ -0,0 +1,171 @@
+import argparse
+import datetime as dt
+import threading
+import time
+
+from benchmarks.common import cleanup, scratch_copy
+from src.db.checkout import place_order
+from src.db.pool import ConnectionPool
+from src.db.repository import dbFunctions
+from src.domain.models import SessionInf
+
+#   Commits (and, with synchronous=FULL, fsyncs) per customer session:
+#   units of work vs. the previous commit-per-statement writes.
+#
+#   One simulated customer session: start a session, one search, three
+#   product views, three cart adds, checkout, one more add, logout. The
+#   legacy mode runs the writes dbFunctions used to run, each with its own
+#   commit (session number, session row, cart write-back, order, event
+#   flush, session end, cart delete); the unit mode calls today's methods.
+#   Commits are counted with a trace callback on the writer connection.
+#
+#   In WAL mode with the default synchronous=NORMAL a commit does not fsync
+#   (only checkpoints do), so the sessions are timed with synchronous=FULL,
+#   where every commit is one fsync of the WAL file. --threads runs that many
+#   customers at once, which is where group commit lets units share commits.
+#
+#   Usage: python -m benchmarks.bench_uow [data/store.db] [--sessions 200] [--threads 1,8]
+
+
+def _now():
+    return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class LegacySession:
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.pool = repo.pool
+
+    def start(self, cid):
+        sno = self.repo.ids.next_id("sessionNo", cid)
+        with self.pool.writer() as conn:
+            conn.execute("INSERT INTO sessions (cid,sessionNo,start_time,end_time) VALUES (?,?,?,NULL);",
+                         (cid, sno, _now()))
+            conn.commit()
+        return sno
+
+    def checkout(self, s):
+        ono = self.repo.ids.next_id("ono")
+        with self.pool.writer() as conn:
+            self.repo.carts.flush_locked(conn, s)
+            conn.commit()
+            result = place_order(conn, s, "1 Bench St", ono=ono)
+        self.repo.carts.drop(s)
+        return result
+
+    def logout(self, s):
+        self.repo.flush_events()
+        with self.pool.writer() as conn:
+            self.repo.carts.flush_locked(conn, s)
+            conn.execute("UPDATE sessions SET end_time = ? where cid = ? AND sessionNo = ? ;",
+                         (_now(), s.cid, s.sessionNo))
+            conn.commit()
+        self.repo.carts.drop(s)
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM cart WHERE cid = ? AND sessionNo = ?;", (s.cid, s.sessionNo))
+            conn.commit()
+
+
+class UnitSession:
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    def start(self, cid):
+        return self.repo.create_session(cid).sessionNo
+
+    def checkout(self, s):
+        return self.repo.checkout(s, "1 Bench St")
+
+    def logout(self, s):
+        self.repo.flush_events()
+        self.repo.end_session(s)
+
+
+def customer_session(repo, mode, cid, pids):
+    s = SessionInf(cid=cid, sessionNo=mode.start(cid))
+    repo.create_search("bench lamp", s)
+    for pid in pids[:3]:
+        repo.create_viewed_product(s, pid)
+        repo.add_to_cart(s, pid, 1, "add")
+    result = mode.checkout(s)
+    if result is None or result.ono is None:
+        raise RuntimeError("checkout failed")
+    repo.add_to_cart(s, pids[3], 1, "add")
+    mode.logout(s)
+
+
+#   Returns:
+#           tuple: (commits per session, sessions per second).
+def run(path, mode_cls, sessions, threads, synchronous):
+    pool = ConnectionPool(path, pragmas={"synchronous": synchronous})
+    repo = dbFunctions(pool)
+    commits = [0]
+
+    def trace(sql):
+        if sql.startswith("COMMIT"):
+            commits[0] += 1
+    pool._writer.set_trace_callback(trace)
+
+    with pool.reader() as conn:
+        cids = [r[0] for r in conn.execute("SELECT cid FROM customers ORDER BY cid LIMIT ?;", (threads,))]
+        pids = [r[0] for r in conn.execute("SELECT pid FROM products ORDER BY pid LIMIT 4;")]
+    with pool.writer() as conn:
+        #   plenty of stock, so every checkout succeeds
+        conn.execute(f"UPDATE products SET stock_count = 1000000 WHERE pid IN ({','.join('?' * len(pids))});", pids)
+    repo.products.invalidate(*pids)
+    mode = mode_cls(repo)
+    per_thread = max(1, sessions // threads)
+    errors = []
+
+    def customer(cid):
+        try:
+            for _ in range(per_thread):
+                customer_session(repo, mode, cid, pids)
+        except Exception as e:
+            errors.append(e)
+
+    commits[0] = 0
+    start = time.perf_counter()
+    workers = [threading.Thread(target=customer, args=(cids[i % len(cids)],)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    repo.close()
+    if errors:
+        raise errors[0]
+    done = per_thread * threads
+    return commits[0] / done, done / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Commits per customer session, legacy vs. unit of work")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--threads", default="1,8", help="comma-separated concurrent customers")
+    parser.add_argument("--synchronous", default="FULL", help="synchronous pragma for the timed runs")
+    args = parser.parse_args(argv)
+
+    print(f"synchronous={args.synchronous}")
+    print(f"{'mode':<10}{'threads':>8}{'commits/session':>17}{'sessions/s':>12}")
+    print("-" * 47)
+    for threads in [int(t) for t in args.threads.split(",")]:
+        results = {}
+        for name, mode_cls in (("legacy", LegacySession), ("unit", UnitSession)):
+            path = scratch_copy(args.db_path)
+            try:
+                results[name] = run(path, mode_cls, args.sessions, threads, args.synchronous)
+            finally:
+                cleanup(path)
+            per_session, rate = results[name]
+            print(f"{name:<10}{threads:>8}{per_session:>17.2f}{rate:>12.0f}")
+        print(f"{'':<10}{'':>8}{results['unit'][0] / results['legacy'][0]:>16.0%} of the commits, "
+              f"{results['unit'][1] / results['legacy'][1]:.1f}x the throughput")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
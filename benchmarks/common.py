@@ -0,0 +1,69 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from src.db.migrations import migrate
+from src.db.search_index import ensure_search_index
+
+#   Helpers shared by the benchmark scripts. Benchmarks never touch the
+#   source database: they run against a migrated copy in a temp directory.
+
+
+#   Copy `db_path` into a fresh temp directory and bring it to the latest schema.
+#   Returns:
+#           str: Path of the copy (caller removes it with cleanup()).
+def scratch_copy(db_path):
+    workdir = tempfile.mkdtemp(prefix="store_bench_")
+    dst = os.path.join(workdir, "store.db")
+    src = sqlite3.connect(db_path)
+    out = sqlite3.connect(dst)
+    src.backup(out)
+    src.close()
+    migrate(out)
+    ensure_search_index(out)
+    out.close()
+    return dst
+
+
+def cleanup(path):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+#   Run fn() `repeat` times and return the best wall-clock seconds.
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+#   Grow the event and order history of a scratch store `factor` times by
+#   copying the existing rows under shifted keys (sessionNo / ono offsets).
+#   Returns:
+#           dict: table -> row count afterwards.
+def scale_up(path, factor):
+    conn = sqlite3.connect(path)
+    with conn:
+        max_ono = conn.execute("SELECT COALESCE(MAX(ono), 0) FROM orders;").fetchone()[0]
+        max_sno = conn.execute("SELECT COALESCE(MAX(sessionNo), 0) FROM sessions;").fetchone()[0]
+        for k in range(1, factor):
+            shift = {"o": k * max_ono, "s": k * max_sno}
+            conn.execute("INSERT INTO sessions SELECT cid, sessionNo + :s, start_time, end_time "
+                         "FROM sessions WHERE sessionNo <= :base;", dict(shift, base=max_sno))
+            conn.execute("INSERT INTO viewedProduct SELECT cid, sessionNo + :s, ts, pid "
+                         "FROM viewedProduct WHERE sessionNo <= :base;", dict(shift, base=max_sno))
+            conn.execute("INSERT INTO search SELECT cid, sessionNo + :s, ts, query "
+                         "FROM search WHERE sessionNo <= :base;", dict(shift, base=max_sno))
+            conn.execute("INSERT INTO orders SELECT ono + :o, cid, sessionNo + :s, odate, shipping_address "
+                         "FROM orders WHERE ono <= :base;", dict(shift, base=max_ono))
+            conn.execute("INSERT INTO orderlines SELECT ono + :o, lineNo, pid, qty, uprice "
+                         "FROM orderlines WHERE ono <= :base;", dict(shift, base=max_ono))
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t};").fetchone()[0]
+              for t in ("sessions", "viewedProduct", "search", "orders", "orderlines")}
+    conn.close()
+    return counts
@@ -0,0 +1,194 @@
+import argparse
+import datetime as dt
+import itertools
+import os
+import random
+import sqlite3
+import time
+
+from src.db.migrations import migrate
+from src.db.search_index import ensure_search_index
+
+#   Deterministic synthetic store generator.
+#
+#   Builds a store of any size with the schema of the template database
+#   (data/store.db): the base tables are created empty, filled with bulk
+#   executemany() batches inside one transaction with journaling and syncing
+#   off, and only then migrated. Indexes, rollups, counters and the search
+#   index are therefore built once over the finished data instead of being
+#   maintained row by row, which keeps tens of millions of rows practical.
+#
+#   The same arguments and seed always give the same database. Products are
+#   chosen with a Zipf-like skew, so top-K, rollups and the cache see a few
+#   hot products and a long tail, as a real store would.
+#
+#   Usage: python -m benchmarks.generate_store out.db --customers 10000 --products 2000
+#              --sessions 50000 --searches 100000 --views 200000 --orders 20000 [--seed 1]
+
+BASE_TABLES = ("users", "customers", "products", "sessions", "viewedProduct",
+               "search", "cart", "orders", "orderlines")
+
+BATCH = 50000
+SALES_USERS = 3
+PERIOD_END = dt.datetime(2025, 10, 31)
+PERIOD_DAYS = 730
+
+CATEGORIES = ("Electronics", "Books", "Clothing", "Home", "Garden", "Toys", "Sports",
+              "Beauty", "Grocery", "Office", "Music", "Automotive")
+ADJECTIVES = ("smart", "portable", "classic", "wireless", "organic", "compact", "premium",
+              "vintage", "ergonomic", "waterproof", "handmade", "digital", "solar", "mini")
+NOUNS = ("phone", "lamp", "chair", "novel", "jacket", "speaker", "blender", "tent", "puzzle",
+         "watch", "camera", "backpack", "kettle", "keyboard", "guitar", "helmet", "mug", "drone")
+WORDS = ("durable", "lightweight", "gift", "fast", "quiet", "eco", "family", "travel", "pro",
+         "budget", "bestseller", "new", "stylish", "kids", "outdoor", "kitchen", "gaming")
+STREETS = ("Main St", "King St", "Jasper Ave", "Whyte Ave", "Oak Rd", "Lake Dr", "River Rd")
+CITIES = ("Edmonton", "Calgary", "Toronto", "Vancouver", "Montreal", "Ottawa")
+
+
+#   Stream `rows` into `table` in executemany batches.
+def _insert(conn, table, ncols, rows):
+    sql = f"INSERT INTO {table} VALUES ({', '.join('?' * ncols)});"
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH))
+        if not batch:
+            return total
+        conn.executemany(sql, batch)
+        total += len(batch)
+
+
+def _products(rng, n):
+    for pid in range(1, n + 1):
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        descr = f"{adjective} {noun} " + " ".join(rng.sample(WORDS, 3))
+        yield (pid, f"{adjective.title()} {noun.title()} {pid}", rng.choice(CATEGORIES),
+               round(rng.uniform(5, 2000), 2), rng.randint(0, 500), descr)
+
+
+#   Session i (0-based) belongs to customer i % customers, so every customer's
+#   sessions are numbered 1, 2, 3, ... and each session is placed by index alone.
+def _session_key(i, customers):
+    return i % customers + 1, i // customers + 1
+
+
+#   Spread `total` events over `sessions` sessions: how many go to session i.
+def _share(i, total, sessions):
+    return (i + 1) * total // sessions - i * total // sessions
+
+
+#   Build the database at `path` (must not exist).
+#   Returns:
+#           dict: table -> row count.
+def generate(path, customers, products, sessions, searches, views, orders,
+             lines_per_order=3, seed=1, template="data/store.db"):
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    sessions = max(sessions, customers)
+    rng = random.Random(seed)
+
+    src = sqlite3.connect(template)
+    ddl = dict(src.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table';").fetchall())
+    src.close()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF;")
+    conn.execute("PRAGMA synchronous = OFF;")
+    conn.execute("PRAGMA cache_size = -200000;")
+    conn.execute("BEGIN;")
+    for table in BASE_TABLES:
+        conn.execute(ddl[table])
+
+    _insert(conn, "users", 3, itertools.chain(
+        ((cid, f"c{cid}", "customer") for cid in range(1, customers + 1)),
+        ((uid, f"s{uid}", "sales") for uid in range(customers + 1, customers + SALES_USERS + 1))))
+    _insert(conn, "customers", 3, ((cid, f"Customer {cid}", f"customer{cid}@example.com")
+                                   for cid in range(1, customers + 1)))
+
+    catalog = list(_products(rng, products))
+    _insert(conn, "products", 6, catalog)
+    prices = [None] + [p[3] for p in catalog]
+    keywords = [p[1].split()[0].lower() for p in catalog] + list(NOUNS) + list(WORDS)
+    #   Zipf-like popularity: product k is picked with weight 1/k
+    pids = list(range(1, products + 1))
+    cum = list(itertools.accumulate(1.0 / k for k in pids))
+
+    starts = []
+    sess_rows, view_rows, search_rows, order_rows, line_rows = [], [], [], [], []
+    counts = dict.fromkeys(BASE_TABLES, 0)
+    ono = 0
+
+    def flush(force=False):
+        for table, ncols, rows in (("sessions", 4, sess_rows), ("viewedProduct", 4, view_rows),
+                                   ("search", 4, search_rows), ("orders", 5, order_rows),
+                                   ("orderlines", 5, line_rows)):
+            if rows and (force or len(rows) >= BATCH):
+                conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * ncols)});", rows)
+                counts[table] += len(rows)
+                rows.clear()
+
+    for i in range(sessions):
+        cid, sno = _session_key(i, customers)
+        start = PERIOD_END - dt.timedelta(seconds=rng.randrange(PERIOD_DAYS * 86400))
+        n_views, n_searches = _share(i, views, sessions), _share(i, searches, sessions)
+        n_orders = _share(i, orders, sessions)
+        length = 60 + 30 * (n_views + n_searches) + rng.randrange(600)
+        fmt = "%Y-%m-%d %H:%M:%S"
+        sess_rows.append((cid, sno, start.strftime(fmt), (start + dt.timedelta(seconds=length)).strftime(fmt)))
+        #   one event every 15 s keeps (cid, sessionNo, ts) unique
+        offsets = iter(range(15, 15 * (n_views + n_searches + 2), 15))
+        for pid in rng.choices(pids, cum_weights=cum, k=n_views):
+            view_rows.append((cid, sno, (start + dt.timedelta(seconds=next(offsets))).strftime(fmt), pid))
+        for _ in range(n_searches):
+            query = " ".join(rng.sample(keywords, rng.choice((1, 1, 2))))
+            search_rows.append((cid, sno, (start + dt.timedelta(seconds=next(offsets))).strftime(fmt), query))
+        for _ in range(n_orders):
+            ono += 1
+            odate = (start + dt.timedelta(seconds=length)).strftime("%Y-%m-%d")
+            address = f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+            order_rows.append((ono, cid, sno, odate, address))
+            n_lines = min(products, rng.randint(1, 2 * lines_per_order - 1))
+            chosen = set()
+            while len(chosen) < n_lines:
+                chosen.add(rng.choices(pids, cum_weights=cum)[0])
+            for line, pid in enumerate(sorted(chosen), start=1):
+                line_rows.append((ono, line, pid, rng.randint(1, 3), prices[pid]))
+        flush()
+    flush(force=True)
+    conn.execute("COMMIT;")
+
+    counts.update(users=customers + SALES_USERS, customers=customers, products=products)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.isolation_level = ""
+    migrate(conn)
+    ensure_search_index(conn)
+    conn.execute("ANALYZE;")
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic store database.")
+    parser.add_argument("out")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--searches", type=int, default=10000)
+    parser.add_argument("--views", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines-per-order", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--template", default="data/store.db")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.out, args.customers, args.products, args.sessions, args.searches,
+                      args.views, args.orders, args.lines_per_order, args.seed, args.template)
+    elapsed = time.perf_counter() - start
+    for table, n in counts.items():
+        print(f"{table:<15}{n:>12,}")
+    print(f"\n[✓] {args.out} generated in {elapsed:.1f}s ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
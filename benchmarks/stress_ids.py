@@ -0,0 +1,97 @@
+import argparse
+import multiprocessing as mp
+import sqlite3
+import threading
+import time
+
+from benchmarks.common import cleanup, scratch_copy
+from src.db.pool import ConnectionPool
+from src.db.repository import dbFunctions
+
+#   Concurrency check for the id allocator (src/db/sequences.py).
+#
+#   Several processes, each with several threads, register customers,
+#   open sessions for one shared customer and draw order numbers at the same
+#   time. Fails (exit code 1) if any id is handed out twice or any insert was
+#   lost to a primary-key conflict.
+#
+#   Usage: python -m benchmarks.stress_ids [data/store.db] [--procs 4] [--threads 4] [--n 200]
+
+
+def _worker(db_path, shared_cid, n, threads, out):
+    pool = ConnectionPool(db_path, readers=threads, busy_timeout=30.0)
+    repo = dbFunctions(pool)
+    ids = {"uid": [], "sessionNo": [], "ono": []}
+    lock = threading.Lock()
+
+    def run():
+        mine = {"uid": [], "sessionNo": [], "ono": []}
+        for i in range(n):
+            mine["uid"].append(repo.insert_customer("stress", f"stress-{time.time_ns()}@example.com", "x").uid)
+            mine["sessionNo"].append(repo.create_session(shared_cid).sessionNo)
+            mine["ono"].append(repo.ids.next_id("ono"))
+        with lock:
+            for k, v in mine.items():
+                ids[k].extend(v)
+
+    ts = [threading.Thread(target=run) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    pool.close()
+    out.put(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Id allocator uniqueness under concurrency")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--n", type=int, default=200, help="ids of each kind per thread")
+    args = parser.parse_args(argv)
+
+    path = scratch_copy(args.db_path)
+    try:
+        conn = sqlite3.connect(path)
+        shared_cid = conn.execute("SELECT MIN(cid) FROM customers;").fetchone()[0]
+        users_before = conn.execute("SELECT COUNT(*) FROM users;").fetchone()[0]
+        sessions_before = conn.execute("SELECT COUNT(*) FROM sessions WHERE cid = ?;", (shared_cid,)).fetchone()[0]
+        conn.close()
+        ConnectionPool(path).close()
+
+        start = time.perf_counter()
+        ctx = mp.get_context("spawn")
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(path, shared_cid, args.n, args.threads, out))
+                 for _ in range(args.procs)]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        conn = sqlite3.connect(path)
+        users_added = conn.execute("SELECT COUNT(*) FROM users;").fetchone()[0] - users_before
+        sessions_added = conn.execute("SELECT COUNT(*) FROM sessions WHERE cid = ?;", (shared_cid,)).fetchone()[0] - sessions_before
+        conn.close()
+    finally:
+        cleanup(path)
+
+    expected = args.procs * args.threads * args.n
+    ok = True
+    for kind in ("uid", "sessionNo", "ono"):
+        values = [v for r in results for v in r[kind]]
+        dupes = len(values) - len(set(values))
+        print(f"{kind:>10}: {len(values)} issued, {dupes} duplicates")
+        ok = ok and dupes == 0 and len(values) == expected
+    print(f"{'rows':>10}: {users_added} users, {sessions_added} sessions inserted (expected {expected} each)")
+    ok = ok and users_added == expected and sessions_added == expected
+    print(f"{'time':>10}: {elapsed:.2f}s")
+    print("[✓] All ids unique." if ok else "[X] Id allocation is not safe under concurrency!")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,11 @@
 import sys
 import os
 
-from src.db.connection import create_connection
+from src.db.instrumentation import configure_from_env
+from src.db.pool import ConnectionPool
 from src.db.repository import dbFunctions
+from src.db.migrations import migrate
+from src.db.search_index import ensure_search_index
 from src.services.auth_service import login, register
 from src.services.customer_service import customerFunctions
 from src.services.sales_service import SalesFunctions
@@ -24,8 +27,17 @@ def main():
     print(">>> Program started successfully!")
     print(f"\n[✓] Connected to database: {db_path}")
 
-    conn = create_connection(db_path)
-    repo = dbFunctions(conn)
+    pool = ConnectionPool(db_path)
+    with pool.writer() as conn:
+        migrate(conn)
+        ensure_search_index(conn)
+    #   STORE_SNAPSHOT_DIR: analytics read the columnar snapshots there (src/db/column_store.py)
+    #   STORE_REPORT_SNAPSHOT=backup: sales reports read an in-memory copy (src/db/report_snapshot.py)
+    repo = dbFunctions(pool, snapshot_dir=os.environ.get("STORE_SNAPSHOT_DIR"),
+                       report_mode=os.environ.get("STORE_REPORT_SNAPSHOT", "transaction"))
+    #   STORE_PROFILE=1 (table) or STORE_PROFILE=file.json: profile until exit
+    if configure_from_env():
+        print("[✓] Profiling enabled")
 
     while True:
         print("\n========= Login Page =========")
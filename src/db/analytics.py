@@ -0,0 +1,432 @@
+import datetime as dt
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.db.column_store import ColumnSnapshot
+from src.db.sales_metrics import as_date
+
+#   Customer analytics: RFM segments, monthly cohorts, basket sizes.
+#
+#   orders are read once into NumPy columns (load_orders()): a few
+#   fetchmany() batches, each converted by one np.array() call, no per-row
+#   Python work beyond that. Order lines are reduced to per-order totals by SQLite while it
+#   walks the orderlines primary key, so Python never builds a tuple per line
+#   (that, not the arithmetic, was most of the cost). Every metric is then
+#   computed with whole-array operations (bincount, ufunc.at, unique,
+#   quantile, searchsorted), so the cost grows with the number of orders but
+#   stays in C.
+#
+#   Dates are read as whole days since 1970-01-01 (julianday() in SQL), which
+#   accepts both 'YYYY-MM-DD' and 'YYYY-MM-DD HH:MM:SS'. Orders whose date
+#   cannot be parsed are skipped, and so are their lines.
+#
+#   The same report can be computed from a columnar snapshot
+#   (src/db/column_store.py) instead of the live store: snapshot_orders()
+#   builds the same OrderData from the memory-mapped columns, so the
+#   analytics never touch store.db and its locks.
+#
+#   Usage: python -m src.db.analytics <db_path> [--start 2025-01-01] [--end 2025-12-31]
+#              [--as-of 2025-12-31] [--customers rfm.csv] [--json report.json]
+#          python -m src.db.analytics --snapshot <snapshot root> [same options]
+
+_NO_DATE = -(2 ** 31)
+_DAY = f"IFNULL(CAST(julianday(substr(odate, 1, 10)) - 2440587.5 AS INTEGER), {_NO_DATE})"
+
+_ORDERS = "SELECT ono, cid, " + _DAY + " FROM orders{where};"
+#   lines, items and revenue per order (TOTAL() skips NULLs)
+_LINES = "SELECT ono, COUNT(*), TOTAL(qty), TOTAL(qty * uprice) FROM orderlines GROUP BY ono;"
+_LINES_IN_RANGE = """
+    SELECT ol.ono, COUNT(*), TOTAL(ol.qty), TOTAL(ol.qty * ol.uprice)
+    FROM orders o
+    JOIN orderlines ol ON ol.ono = o.ono
+    WHERE o.odate >= :start AND o.odate < :end
+    GROUP BY ol.ono;
+"""
+
+FETCH_BATCH = 65536
+
+#   (segment, recency scores, frequency scores); the first match wins
+SEGMENTS = (
+    ("Champions", (4, 5), (4, 5)),
+    ("Loyal", (3, 5), (3, 5)),
+    ("New", (4, 5), (1, 1)),
+    ("Promising", (3, 5), (1, 2)),
+    ("At risk", (1, 2), (3, 5)),
+    ("Hibernating", (1, 2), (1, 2)),
+)
+
+#   items-per-order histogram: lower bounds and labels
+BASKET_BINS = (1, 2, 3, 4, 5, 6, 11, 21)
+BASKET_LABELS = ("1", "2", "3", "4", "5", "6-10", "11-20", "21+")
+PERCENTILES = (50, 75, 90, 99)
+
+
+class OrderData:
+
+    #   Orders as parallel columns, sorted by ono.
+    #   Args:
+    #       ono, cid, day (np.ndarray): Order number, customer, days since 1970-01-01.
+    #       lines, items, revenue (np.ndarray): Order lines, sum of qty and of
+    #           qty * uprice of each order (0 for an order without lines).
+    def __init__(self, ono, cid, day, lines, items, revenue):
+        self.ono = ono
+        self.cid = cid
+        self.day = day
+        self.lines = lines
+        self.items = items
+        self.revenue = revenue
+
+    def __len__(self):
+        return len(self.ono)
+
+
+#   Run `sql` and return its result columns as NumPy arrays of one dtype.
+def _columns(conn, sql, params, dtype):
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    blocks = []
+    while True:
+        rows = cur.fetchmany(FETCH_BATCH)
+        if not rows:
+            break
+        #   one C-level conversion per batch
+        blocks.append(np.array(rows, dtype=dtype))
+    table = np.concatenate(blocks) if blocks else np.empty((0, len(cur.description)), dtype=dtype)
+    return list(table.T)
+
+
+#   Load the orders of start..end (both inclusive; whole history by default).
+#   Returns:
+#           OrderData
+def load_orders(conn, start=None, end=None):
+    if start is None and end is None:
+        where, params = "", {}
+        lines_sql = _LINES
+    else:
+        params = {
+            "start": as_date(start).isoformat() if start is not None else "",
+            #   exclusive upper bound, as in sales_metrics.py
+            "end": (as_date(end) + dt.timedelta(days=1)).isoformat() if end is not None else "9999",
+        }
+        where = " WHERE odate >= :start AND odate < :end"
+        lines_sql = _LINES_IN_RANGE
+
+    ono, cid, day = _columns(conn, _ORDERS.format(where=where), params, np.int64)
+    keep = day != _NO_DATE
+    order = np.argsort(ono[keep], kind="stable")
+    ono, cid, day = ono[keep][order], cid[keep][order], day[keep][order]
+
+    line_ono, count, qty, amount = _columns(conn, lines_sql, params, np.float64)
+    line_ono = line_ono.astype(np.int64)
+    idx = np.searchsorted(ono, line_ono)
+    idx[idx == len(ono)] = 0
+    known = (ono[idx] == line_ono) if len(ono) else np.zeros(len(line_ono), dtype=bool)
+    idx = idx[known]
+    lines = np.zeros(len(ono), dtype=np.int64)
+    items = np.zeros(len(ono))
+    revenue = np.zeros(len(ono))
+    lines[idx], items[idx], revenue[idx] = count[known], qty[known], amount[known]
+    return OrderData(ono, cid, day, lines, items, revenue)
+
+
+#   load_orders() from a columnar snapshot instead of the live store.
+#   Returns:
+#           OrderData
+def snapshot_orders(snapshot: ColumnSnapshot, start=None, end=None):
+    orders = snapshot.table("orders")
+    lines = snapshot.table("orderlines")
+
+    day = orders["odate"] // 86400
+    keep = ~orders.nulls("odate")
+    if start is not None:
+        keep &= day >= _day_number(start)
+    if end is not None:
+        keep &= day <= _day_number(end)
+    ono = orders["ono"][keep]
+    order = np.argsort(ono, kind="stable")
+    ono, cid, day = ono[order], orders["cid"][keep][order], day[keep][order]
+
+    line_ono = lines["ono"]
+    idx = np.searchsorted(ono, line_ono)
+    idx[idx == len(ono)] = 0
+    known = (ono[idx] == line_ono) if len(ono) else np.zeros(len(line_ono), dtype=bool)
+    idx = idx[known]
+    #   NULLs are stored as 0, which is what TOTAL() makes of them
+    qty = lines["qty"][known].astype(np.float64)
+    amount = qty * lines["uprice"][known]
+    return OrderData(ono, cid, day,
+                     np.bincount(idx, minlength=len(ono)),
+                     np.bincount(idx, weights=qty, minlength=len(ono)),
+                     np.bincount(idx, weights=amount, minlength=len(ono)))
+
+
+#   Quantile scores 1..5. Values tied with a quintile edge get the lower score,
+#   so e.g. the many one-time buyers all get frequency 1.
+def _scores(values, higher_is_better=True, bins=5):
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    edges = np.quantile(values, np.arange(1, bins) / bins)
+    score = np.searchsorted(edges, values, side="left") + 1
+    return score if higher_is_better else bins + 1 - score
+
+
+#   Recency/frequency/monetary values, scores and segment of every customer.
+#   Args:
+#       data (OrderData): Orders to score.
+#       as_of (date): Day recency is measured from; default the last order day.
+#   Returns:
+#           pandas.DataFrame: cid, recency_days, orders, monetary, r, f, m, segment.
+def rfm_table(data: OrderData, as_of=None):
+    customers, codes = np.unique(data.cid, return_inverse=True)
+    last = np.full(len(customers), np.iinfo(np.int64).min)
+    np.maximum.at(last, codes, data.day)
+    reference = _day_number(as_of) if as_of is not None else (int(data.day.max()) if len(data) else 0)
+    recency = reference - last
+    frequency = np.bincount(codes, minlength=len(customers))
+    monetary = np.bincount(codes, weights=data.revenue, minlength=len(customers))
+
+    r = _scores(recency, higher_is_better=False)
+    f = _scores(frequency)
+    m = _scores(monetary)
+    conditions = [(r >= rlo) & (r <= rhi) & (f >= flo) & (f <= fhi) for _, (rlo, rhi), (flo, fhi) in SEGMENTS]
+    segment = np.select(conditions, [name for name, _, _ in SEGMENTS], default="Other")
+    return pd.DataFrame({"cid": customers, "recency_days": recency, "orders": frequency,
+                         "monetary": monetary.round(2), "r": r, "f": f, "m": m, "segment": segment})
+
+
+#   Per-segment summary of rfm_table().
+#   Returns:
+#           list[dict]: segment, customers, share, median recency_days, avg orders,
+#                       avg monetary and revenue_share, in SEGMENTS order.
+def rfm_segments(table):
+    total_customers = len(table)
+    total_revenue = float(table["monetary"].sum())
+    grouped = table.groupby("segment").agg(customers=("cid", "size"), recency_days=("recency_days", "median"),
+                                           orders=("orders", "mean"), monetary=("monetary", "mean"),
+                                           revenue=("monetary", "sum"))
+    out = []
+    for name in [s for s, _, _ in SEGMENTS] + ["Other"]:
+        if name not in grouped.index:
+            continue
+        g = grouped.loc[name]
+        out.append({
+            "segment": name,
+            "customers": int(g["customers"]),
+            "share": round(float(g["customers"]) / total_customers, 4),
+            "recency_days": float(g["recency_days"]),
+            "orders": round(float(g["orders"]), 2),
+            "monetary": round(float(g["monetary"]), 2),
+            "revenue_share": round(float(g["revenue"]) / total_revenue, 4) if total_revenue else 0.0,
+        })
+    return out
+
+
+#   Monthly acquisition cohorts and their retention.
+#   A customer belongs to the month of their first order; month k of a cohort
+#   counts the customers who ordered again k months later.
+#   Args:
+#       data (OrderData): Orders to analyse.
+#       months (int): Months after acquisition to report (0 = acquisition month).
+#   Returns:
+#           list[dict]: {cohort 'YYYY-MM', customers, active [k=0..], retention [k=0..]}
+def cohorts(data: OrderData, months=12):
+    if not len(data):
+        return []
+    month = data.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    customers, codes = np.unique(data.cid, return_inverse=True)
+    first = np.full(len(customers), np.iinfo(np.int64).max)
+    np.minimum.at(first, codes, month)
+    offset = month - first[codes]
+    keep = offset <= months
+    #   one entry per (customer, month offset) with at least one order
+    pairs = np.unique(codes[keep] * (months + 1) + offset[keep])
+    pair_cohort = first[pairs // (months + 1)]
+    pair_offset = pairs % (months + 1)
+
+    labels, cohort_idx = np.unique(pair_cohort, return_inverse=True)
+    active = np.bincount(cohort_idx * (months + 1) + pair_offset,
+                         minlength=len(labels) * (months + 1)).reshape(len(labels), months + 1)
+    sizes = active[:, 0]
+    #   months that have not happened yet (after the last order) stay out of the table
+    last_month = int(month.max())
+    out = []
+    for i, label in enumerate(labels):
+        span = min(months, last_month - int(label)) + 1
+        out.append({
+            "cohort": str(np.datetime64(int(label), "M")),
+            "customers": int(sizes[i]),
+            "active": active[i, :span].tolist(),
+            "retention": np.round(active[i, :span] / sizes[i], 4).tolist(),
+        })
+    return out
+
+
+#   Distribution of basket sizes (orders without lines are left out).
+#   Returns:
+#           dict: orders, mean/percentiles of lines, items and revenue per order,
+#                 and an items-per-order histogram.
+def basket_stats(data: OrderData):
+    has_lines = data.lines > 0
+    stats = {"orders": int(has_lines.sum())}
+    for name, values in (("lines", data.lines[has_lines]), ("items", data.items[has_lines]),
+                         ("revenue", data.revenue[has_lines])):
+        if not len(values):
+            stats[name] = None
+            continue
+        q = np.percentile(values, PERCENTILES)
+        stats[name] = {"mean": round(float(values.mean()), 2), "max": round(float(values.max()), 2),
+                       **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, q)}}
+    bins = np.searchsorted(BASKET_BINS, data.items[has_lines], side="right") - 1
+    counts = np.bincount(bins[bins >= 0], minlength=len(BASKET_BINS))
+    stats["histogram"] = [{"items": label, "orders": int(c)} for label, c in zip(BASKET_LABELS, counts)]
+    return stats
+
+
+def _day_number(value):
+    return (as_date(value) - dt.date(1970, 1, 1)).days
+
+
+#   Everything above for start..end, with the time each step took.
+#   Args:
+#       source (sqlite3.Connection | ColumnSnapshot): The store, or a snapshot of it.
+#       start, end: Date range (both inclusive); whole history when None.
+#       as_of: Reference day for recency; default the last order day.
+#       months (int): Cohort months to report.
+#   Returns:
+#           dict: {start, end, as_of, orders, customers, segments, cohorts, basket,
+#                  timings_ms {load, rfm, cohorts, basket}, snapshot (name and
+#                  created_at, None for the live store)}
+def customer_report(source, start=None, end=None, as_of=None, months=12):
+    report, _ = _report(source, start, end, as_of, months)
+    return report
+
+
+def _report(source, start, end, as_of, months):
+    started = time.perf_counter()
+    if isinstance(source, ColumnSnapshot):
+        data = snapshot_orders(source, start, end)
+    else:
+        data = load_orders(source, start, end)
+    loaded = time.perf_counter() - started
+    report, table = analyse(data, start, end, as_of, months)
+    report["timings_ms"] = {"load": round(loaded * 1000, 2), **report["timings_ms"]}
+    report["snapshot"] = ({"name": source.name, "created_at": source.manifest["created_at"]}
+                          if isinstance(source, ColumnSnapshot) else None)
+    return report, table
+
+
+#   customer_report() on already loaded orders.
+#   Returns:
+#           tuple[dict, pandas.DataFrame]: The report and the rfm_table() it was built from.
+def analyse(data: OrderData, start=None, end=None, as_of=None, months=12):
+    timings = {}
+    started = time.perf_counter()
+    table = rfm_table(data, as_of)
+    segments = rfm_segments(table) if len(table) else []
+    timings["rfm"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cohort_rows = cohorts(data, months)
+    timings["cohorts"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    basket = basket_stats(data)
+    timings["basket"] = time.perf_counter() - started
+
+    if as_of is None and len(data):
+        as_of = dt.date(1970, 1, 1) + dt.timedelta(days=int(data.day.max()))
+    report = {
+        "start": as_date(start).isoformat() if start is not None else None,
+        "end": as_date(end).isoformat() if end is not None else None,
+        "as_of": as_date(as_of).isoformat() if as_of is not None else None,
+        "orders": len(data),
+        "customers": len(table),
+        "segments": segments,
+        "cohorts": cohort_rows,
+        "basket": basket,
+        "timings_ms": {k: round(v * 1000, 2) for k, v in timings.items()},
+    }
+    return report, table
+
+
+#   Print a customer_report() dict as text tables.
+def print_report(report, cohort_months=6):
+    if report.get("snapshot"):
+        print(f"\nFrom snapshot {report['snapshot']['name']} (taken {report['snapshot']['created_at']})")
+    print(f"\nOrders: {report['orders']}   Customers: {report['customers']}   "
+          f"Recency as of: {report['as_of'] or '-'}")
+
+    print(f"\n{'Segment':<13}{'Customers':>10}{'Share':>8}{'Recency':>9}{'Orders':>8}{'Avg spent':>11}{'Revenue':>9}")
+    print("-" * 68)
+    for s in report["segments"]:
+        print(f"{s['segment']:<13}{s['customers']:>10}{s['share']:>8.1%}{s['recency_days']:>9.0f}"
+              f"{s['orders']:>8.2f}{s['monetary']:>11.2f}{s['revenue_share']:>9.1%}")
+
+    print(f"\n{'Cohort':<9}{'Size':>6}" + "".join(f"{'M' + str(k):>7}" for k in range(cohort_months + 1)))
+    print("-" * (15 + 7 * (cohort_months + 1)))
+    for c in report["cohorts"]:
+        cells = "".join(f"{r:>7.0%}" for r in c["retention"][:cohort_months + 1])
+        print(f"{c['cohort']:<9}{c['customers']:>6}{cells}")
+
+    basket = report["basket"]
+    print(f"\nBaskets ({basket['orders']} orders with lines)")
+    for name in ("lines", "items", "revenue"):
+        s = basket[name]
+        if s:
+            print(f"  {name:<8} mean {s['mean']:>9}  " + "  ".join(f"p{p} {s[f'p{p}']:>8}" for p in PERCENTILES)
+                  + f"  max {s['max']:>9}")
+    print("  items/order: " + ", ".join(f"{h['items']}: {h['orders']}" for h in basket["histogram"]))
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import os
+
+    from src.db.column_store import open_snapshot
+    from src.db.connection import create_connection
+
+    parser = argparse.ArgumentParser(description="Customer analytics: RFM segments, cohorts, basket sizes")
+    parser.add_argument("db_path", nargs="?")
+    parser.add_argument("--snapshot", help="read a columnar snapshot root (src/db/column_store.py) instead")
+    parser.add_argument("--start", help="first order day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last order day (YYYY-MM-DD)")
+    parser.add_argument("--as-of", help="reference day for recency (default: last order day)")
+    parser.add_argument("--months", type=int, default=12, help="cohort months to compute")
+    parser.add_argument("--customers", help="write every customer's RFM scores to this CSV file")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        source = open_snapshot(args.snapshot)
+        if source is None:
+            print(f"[X] No snapshot in {args.snapshot}")
+            return 1
+        report, table = _report(source, args.start, args.end, args.as_of, args.months)
+    else:
+        if not args.db_path or not os.path.exists(args.db_path):
+            print(f"[X] Database file not found: {args.db_path}")
+            return 1
+        conn = create_connection(args.db_path)
+        try:
+            report, table = _report(conn, args.start, args.end, args.as_of, args.months)
+        finally:
+            conn.close()
+    if args.customers:
+        table.to_csv(args.customers, index=False)
+        print(f"[✓] Customer scores written to {args.customers}")
+
+    print_report(report)
+    print("\nTimings (ms): " + ", ".join(f"{k} {v}" for k, v in report["timings_ms"].items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[✓] Report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
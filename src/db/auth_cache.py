@@ -0,0 +1,77 @@
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+
+#   Short-lived cache of resolved users (uid -> User).
+#
+#   A login spike re-resolves the same few accounts over and over; within
+#   `ttl` seconds they are answered from memory. Entries expire instead of
+#   being invalidated by other processes: nothing else in the store changes
+#   a user's password, role or name, so the worst case is a change made
+#   outside the app becoming visible `ttl` seconds late. Unknown uids are
+#   not cached, so an account registered by another process can log in at
+#   once. Callers get a copy of the cached User.
+
+_LOGIN = """
+    SELECT u.uid, u.pwd, u.role, c.name
+    FROM users u
+    LEFT JOIN customers c ON c.cid = u.uid
+    WHERE u.uid = ?;
+"""
+
+
+class AuthCache:
+
+    #   Args:
+    #       ttl (float): Seconds a resolved user is served from memory.
+    #       capacity (int): Maximum number of cached users.
+    def __init__(self, ttl=30.0, capacity=4096):
+        self.ttl = ttl
+        self.capacity = capacity
+        self._users = OrderedDict()     #   uid -> (expires_at, User)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #   Cached user, or load(uid) on a miss (None results are not cached).
+    def get(self, uid, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(uid)
+            if entry is not None and entry[0] > now:
+                self._users.move_to_end(uid)
+                self.hits += 1
+                return _copy(entry[1])
+            self.misses += 1
+        user = load(uid)
+        if user is not None and self.ttl:
+            with self._lock:
+                self._users[uid] = (now + self.ttl, user)
+                self._users.move_to_end(uid)
+                while len(self._users) > self.capacity:
+                    self._users.popitem(last=False)
+        return _copy(user)
+
+    #   Drop one user (all of them when called without arguments).
+    def invalidate(self, uid=None):
+        with self._lock:
+            if uid is None:
+                self._users.clear()
+            else:
+                self._users.pop(uid, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+def _copy(user):
+    return None if user is None else dataclasses.replace(user)
+
+
+#   Resolve a user and their customer profile with one query.
+#   Returns:
+#           sqlite3.Row or None: uid, pwd, role, name (name is None for non-customers).
+def fetch_login(conn, uid):
+    return conn.execute(_LOGIN, (uid,)).fetchone()
@@ -0,0 +1,319 @@
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+
+#   Bulk product import: inserts and price/stock/text updates from a supplier
+#   feed (CSV with a header row, or JSONL with one object per line).
+#
+#   Each record has a pid and any of name, category, price, stock_count,
+#   descr. A known pid gets the fields present in the record (missing or
+#   empty fields keep their value); an unknown pid is inserted and needs
+#   all of name, category, price and stock_count.
+#
+#   The file is streamed: records are validated as they are read, and
+#   invalid ones are reported as rejects (line number, reason, record)
+#   without stopping the import. Valid records are applied with one upsert
+#   executemany per chunk, each chunk in its own BEGIN IMMEDIATE transaction
+#   on the pool's writer. The writer (and SQLite's write lock) is released
+#   between chunks, and the chunk size adapts so one transaction stays
+#   around `target_ms`. So a checkout waits for at most one chunk, never for
+#   the whole feed. Records that would not change anything are skipped by
+#   the upsert's WHERE clause, so an unchanged SKU costs no write and no
+#   change_log entry. Cache invalidation is handled by the change_log
+#   triggers (migration 7); `on_commit` lets an in-process caller evict
+#   right away.
+#
+#   Usage: python -m src.db.catalog_import <db_path> <feed.csv|feed.jsonl> [--rejects rejects.csv]
+#              [--target-ms 50] [--dry-run]
+
+FIELDS = ("pid", "name", "category", "price", "stock_count", "descr")
+REQUIRED_FOR_INSERT = ("name", "category", "price", "stock_count")
+
+#   pause between two chunks, so writers waiting on the busy timeout get the lock
+YIELD_SECONDS = 0.002
+MIN_CHUNK = 50
+MAX_CHUNK = 20000
+
+_UPSERT = """
+    INSERT INTO products (pid, name, category, price, stock_count, descr)
+    VALUES (:pid, :name, :category, :price, :stock_count, :descr)
+    ON CONFLICT (pid) DO UPDATE SET
+        name = COALESCE(excluded.name, name),
+        category = COALESCE(excluded.category, category),
+        price = COALESCE(excluded.price, price),
+        stock_count = COALESCE(excluded.stock_count, stock_count),
+        descr = COALESCE(excluded.descr, descr)
+    WHERE name IS NOT COALESCE(excluded.name, name)
+       OR category IS NOT COALESCE(excluded.category, category)
+       OR price IS NOT COALESCE(excluded.price, price)
+       OR stock_count IS NOT COALESCE(excluded.stock_count, stock_count)
+       OR descr IS NOT COALESCE(excluded.descr, descr);
+"""
+
+
+class Reject(ValueError):
+    pass
+
+
+#   Records of the feed as (line number, dict of raw values).
+#   Raises:
+#           ValueError: If the file has no pid column or unknown columns.
+def read_records(path, fmt=None):
+    fmt = fmt or ("jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    if fmt == "csv":
+        f = open(path, newline="", encoding="utf-8-sig")
+        try:
+            reader = csv.DictReader(f)
+            _check_columns(reader.fieldnames or [])
+        except BaseException:
+            #   the generator below never runs, so its `with f` can't close it
+            f.close()
+            raise
+
+        def records():
+            with f:
+                for row in reader:
+                    yield reader.line_num, row
+        return records()
+    if fmt == "jsonl":
+        return _jsonl_records(path)
+    raise ValueError("format must be csv or jsonl")
+
+
+def _jsonl_records(path):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, Reject(f"invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_no, Reject("not a JSON object")
+                continue
+            yield line_no, record
+
+
+def _check_columns(columns):
+    unknown = [c for c in columns if c not in FIELDS]
+    if "pid" not in columns or unknown:
+        raise ValueError(f"feed columns must include pid and be among {FIELDS}"
+                         + (f"; unknown: {', '.join(unknown)}" if unknown else ""))
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+#   One raw record as upsert parameters.
+#   Raises:
+#           Reject: With the reason the record is invalid.
+def validate(record):
+    #   csv.DictReader puts the values past the last header column under None
+    if None in record:
+        raise Reject("too many fields for the header")
+    unknown = [k for k in record if k not in FIELDS]
+    if unknown:
+        raise Reject(f"unknown field(s): {', '.join(map(str, unknown))}")
+    out = {name: _text(record.get(name)) for name in FIELDS}
+    try:
+        out["pid"] = int(out["pid"])
+    except (TypeError, ValueError):
+        raise Reject("pid must be an integer")
+    if out["pid"] <= 0:
+        raise Reject("pid must be positive")
+    if out["price"] is not None:
+        try:
+            out["price"] = float(out["price"])
+        except ValueError:
+            raise Reject("price must be a number")
+        if not math.isfinite(out["price"]) or out["price"] < 0:
+            raise Reject("price must be a non-negative number")
+    if out["stock_count"] is not None:
+        try:
+            out["stock_count"] = int(out["stock_count"])
+        except ValueError:
+            raise Reject("stock_count must be an integer")
+        if out["stock_count"] < 0:
+            raise Reject("stock_count cannot be negative")
+    return out
+
+
+#   Apply one chunk in its own transaction, or in a savepoint of the
+#   caller's when `nested` (import_catalog() called inside a unit of work:
+#   the caller's transaction decides whether the chunk is kept).
+#   Returns:
+#           tuple: (inserted, products written, rejected [(line, reason, record)], pids applied).
+def _apply_chunk(conn, chunk, dry_run, nested=False):
+    pids = sorted({params["pid"] for _, params, _ in chunk})
+    if nested:
+        conn.execute("SAVEPOINT import_chunk;")
+    else:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE;")
+    try:
+        existing = set()
+        for start in range(0, len(pids), 500):
+            part = pids[start:start + 500]
+            existing.update(r[0] for r in conn.execute(
+                f"SELECT pid FROM products WHERE pid IN ({','.join('?' * len(part))});", part))
+        rows, rejected, new = [], [], set()
+        for line_no, params, raw in chunk:
+            if params["pid"] not in existing and params["pid"] not in new:
+                missing = [f for f in REQUIRED_FOR_INSERT if params[f] is None]
+                if missing:
+                    rejected.append((line_no, f"new product needs {', '.join(missing)}", raw))
+                    continue
+                new.add(params["pid"])
+            rows.append(params)
+        #   rowcount counts products inserted or updated, not trigger writes
+        written = conn.executemany(_UPSERT, rows).rowcount if rows else 0
+        if nested:
+            if dry_run:
+                conn.execute("ROLLBACK TO import_chunk;")
+            conn.execute("RELEASE import_chunk;")
+        elif dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            if nested:
+                conn.execute("ROLLBACK TO import_chunk;")
+                conn.execute("RELEASE import_chunk;")
+            else:
+                conn.rollback()
+        raise
+    changed = {p["pid"] for p in rows}
+    return len(new), written, rejected, changed
+
+
+#   Stream a feed into the products table.
+#   Args:
+#       pool (ConnectionPool): Pool whose writer applies the chunks.
+#       path (str): Feed file (.csv or .jsonl).
+#       rejects_path (str): Optional CSV file receiving every rejected record.
+#       target_ms (float): Aimed-for duration of one write transaction.
+#       chunk_size (int): Records in the first chunk.
+#       dry_run (bool): Validate and apply, but roll every chunk back.
+#       on_commit (callable): Called with the pids of each committed chunk.
+#   Returns:
+#           dict: Counts (read, inserted, updated, unchanged, rejected), chunks,
+#                 longest transaction in ms, seconds, and the first rejects.
+#   Raises:
+#           ValueError: If the feed's columns are not valid.
+def import_catalog(pool, path, rejects_path=None, target_ms=50.0, chunk_size=500,
+                   dry_run=False, on_commit=None, fmt=None):
+    report = {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0,
+              "chunks": 0, "max_lock_ms": 0.0, "seconds": 0.0, "rejects": []}
+    rejects_file = open(rejects_path, "w", newline="", encoding="utf-8") if rejects_path else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(["line", "reason", "record"])
+
+    def reject(line_no, reason, raw):
+        report["rejected"] += 1
+        if len(report["rejects"]) < 100:
+            report["rejects"].append({"line": line_no, "reason": reason})
+        if rejects_writer:
+            rejects_writer.writerow([line_no, reason, json.dumps(raw, default=str)])
+
+    def flush(chunk):
+        nonlocal chunk_size
+        nested = pool.current_writer() is not None
+        with pool.writer() as conn:
+            started = time.perf_counter()
+            inserted, written, rejected, pids = _apply_chunk(conn, chunk, dry_run, nested)
+            held = (time.perf_counter() - started) * 1000
+        for line_no, reason, raw in rejected:
+            reject(line_no, reason, raw)
+        applied = len(chunk) - len(rejected)
+        report["inserted"] += inserted
+        report["updated"] += written - inserted
+        report["unchanged"] += applied - written
+        report["chunks"] += 1
+        report["max_lock_ms"] = max(report["max_lock_ms"], round(held, 2))
+        if on_commit and pids and not dry_run:
+            on_commit(pids)
+        #   steer the next chunk towards target_ms
+        if held > target_ms:
+            chunk_size = max(MIN_CHUNK, chunk_size // 2)
+        elif held < target_ms / 2:
+            chunk_size = min(MAX_CHUNK, chunk_size * 2)
+        time.sleep(YIELD_SECONDS)
+
+    started = time.perf_counter()
+    try:
+        chunk = []
+        for line_no, raw in read_records(path, fmt):
+            report["read"] += 1
+            if isinstance(raw, Reject):
+                reject(line_no, str(raw), None)
+                continue
+            try:
+                chunk.append((line_no, validate(raw), raw))
+            except Reject as e:
+                reject(line_no, str(e), raw)
+                continue
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    from src.db.migrations import migrate
+    from src.db.pool import ConnectionPool
+
+    parser = argparse.ArgumentParser(description="Import a product feed (CSV or JSONL)")
+    parser.add_argument("db_path")
+    parser.add_argument("feed")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument("--rejects", help="write rejected records to this CSV file")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="aimed-for length of one write transaction")
+    parser.add_argument("--dry-run", action="store_true", help="validate and apply, then roll back")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db_path):
+        print(f"[X] Database file not found: {args.db_path}")
+        return 1
+    pool = ConnectionPool(args.db_path)
+    try:
+        with pool.writer() as conn:
+            migrate(conn)
+        report = import_catalog(pool, args.feed, args.rejects, args.target_ms, dry_run=args.dry_run, fmt=args.format)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"[X] Import failed: {e}")
+        return 1
+    finally:
+        pool.close()
+
+    for key in ("read", "inserted", "updated", "unchanged", "rejected", "chunks", "max_lock_ms", "seconds"):
+        print(f"{key:<12}{report[key]:>12}")
+    for r in report["rejects"][:20]:
+        print(f"  line {r['line']}: {r['reason']}")
+    if report["rejected"] > 20 and not args.rejects:
+        print(f"  ... {report['rejected'] - 20} more (use --rejects to save them all)")
+    print("[✓] Dry run: nothing was committed." if args.dry_run else "[✓] Import finished.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
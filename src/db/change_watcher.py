@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+import time
+
+#   Invalidate caches after writes made by other connections or processes.
+#
+#   `PRAGMA data_version` on one fixed connection changes whenever any other
+#   connection (this process's writer or another process) commits, and costs
+#   no disk I/O, so it is checked before every cached read. Only when it has
+#   changed are the change tables read (migration 7):
+#       change_log      one row per changed product (triggers on products)
+#       change_topics   a version per report topic (triggers on orders, viewedProduct)
+#   and exactly the products and report topics that changed are evicted. If
+#   this process has fallen so far behind that the pruned log no longer
+#   reaches back to it, the whole product cache is cleared instead.
+
+
+class ChangeWatcher:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool of the store; the watcher opens its own reader.
+    #       products (ProductCache): Product cache to evict from.
+    #       reports (ReportCache): Report cache to evict from.
+    #       min_interval (float): Seconds between two data_version checks (0: every read).
+    def __init__(self, pool, products, reports, min_interval=0.0):
+        self.products = products
+        self.reports = reports
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.polls = 0
+        self.changes = 0
+        self._conn = pool.open_dedicated_reader()
+        if self._conn is None:
+            #   single-connection mode: there is no other connection to watch
+            return
+        self._version = self._data_version()
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log;").fetchone()[0]
+        self._topics = self._topic_versions()
+        products.watcher = self
+        reports.watcher = self
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version;").fetchone()[0]
+
+    def _topic_versions(self):
+        return dict(self._conn.execute("SELECT topic, version FROM change_topics;").fetchall())
+
+    #   Evict whatever other connections changed since the last poll.
+    #   Returns:
+    #           bool: True if anything had changed.
+    def poll(self):
+        if self._conn is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if self.min_interval and now - self._checked_at < self.min_interval:
+                return False
+            self._checked_at = now
+            self.polls += 1
+            try:
+                version = self._data_version()
+                if version == self._version:
+                    return False
+                self._version = version
+                self._evict_products()
+                self._evict_reports()
+            except sqlite3.Error as e:
+                #   cannot tell what changed: drop everything rather than serve stale rows
+                print("\n[X] SQL Error in ChangeWatcher.poll()\n")
+                print(e)
+                self.products.invalidate()
+                self.reports.invalidate()
+            self.changes += 1
+            return True
+
+    def _evict_products(self):
+        oldest = self._conn.execute("SELECT MIN(seq) FROM change_log;").fetchone()[0]
+        rows = self._conn.execute("SELECT seq, pid FROM change_log WHERE seq > ? ORDER BY seq;", (self._seq,)).fetchall()
+        if oldest is not None and oldest > self._seq + 1:
+            #   entries we never saw were pruned
+            self.products.invalidate()
+            self.reports.invalidate()
+        elif rows:
+            self.products.invalidate(*{r[1] for r in rows})
+        if rows:
+            #   top-product reports show product names
+            self.reports.invalidate()
+            self._seq = rows[-1][0]
+
+    def _evict_reports(self):
+        topics = self._topic_versions()
+        changed = [t for t, v in topics.items() if self._topics.get(t) != v]
+        if changed:
+            self.reports.invalidate(*changed)
+        self._topics = topics
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,119 @@
+import sqlite3
+import datetime as dt
+
+from src.db.rollup import apply_order
+from src.domain.models import CheckoutResult, SessionInf, Shortage
+
+#   Set-based checkout.
+#
+#   Everything that touches stock happens inside one BEGIN IMMEDIATE
+#   transaction, so no other writer can change stock between the check and
+#   the decrement:
+#       1. one guarded UPDATE decrements stock only where stock >= cart qty
+#          and RETURNs the products it changed;
+#       2. if any cart line was not decremented the transaction is rolled
+#          back and the short products are reported;
+#       3. otherwise the order header, all order lines (one INSERT ... SELECT)
+#          and the cart delete are written, the daily sales rollup is
+#          updated (src/db/rollup.py) and everything is committed.
+#   Timestamps and the shipping address are prepared before the lock is taken
+#   to keep the write-lock hold time to a handful of statements.
+
+_DECREMENT_STOCK = """
+    UPDATE products
+    SET stock_count = stock_count - (
+        SELECT ct.qty FROM cart ct
+        WHERE ct.cid = :cid AND ct.sessionNo = :sno AND ct.pid = products.pid)
+    WHERE pid IN (SELECT pid FROM cart WHERE cid = :cid AND sessionNo = :sno)
+      AND stock_count >= (
+        SELECT ct.qty FROM cart ct
+        WHERE ct.cid = :cid AND ct.sessionNo = :sno AND ct.pid = products.pid)
+    RETURNING pid, stock_count;
+"""
+
+_INSERT_ORDER = """
+    INSERT INTO orders (ono, cid, sessionNo, odate, shipping_address)
+    VALUES (:ono, :cid, :sno, :odate, :addr);
+"""
+
+#   Line numbers follow the cart's primary-key order (by pid), as before.
+_INSERT_LINES = """
+    INSERT INTO orderlines (ono, lineNo, pid, qty, uprice)
+    SELECT :ono, ROW_NUMBER() OVER (ORDER BY ct.pid), ct.pid, ct.qty, p.price
+    FROM cart ct
+    JOIN products p ON p.pid = ct.pid
+    WHERE ct.cid = :cid AND ct.sessionNo = :sno;
+"""
+
+_CLEAR_CART = "DELETE FROM cart WHERE cid = :cid AND sessionNo = :sno;"
+
+_CART_PIDS = "SELECT pid FROM cart WHERE cid = :cid AND sessionNo = :sno;"
+
+_SHORT_LINES = """
+    SELECT ct.pid, p.name, ct.qty, COALESCE(p.stock_count, 0) AS stock_count
+    FROM cart ct
+    LEFT JOIN products p ON p.pid = ct.pid
+    WHERE ct.cid = ? AND ct.sessionNo = ? AND ct.pid IN ({marks})
+    ORDER BY ct.pid;
+"""
+
+
+#   Next order number, read inside the write transaction.
+def _next_ono(conn):
+    return conn.execute("SELECT COALESCE(MAX(ono), 0) + 1 FROM orders;").fetchone()[0]
+
+
+#   Turn the session's cart into an order.
+#   Must be called on the writer connection. A transaction the caller already
+#   opened there with BEGIN IMMEDIATE (e.g. writing back the cart) becomes part
+#   of the order: it is committed on success and rolled back otherwise.
+#   Args:
+#       conn (sqlite3.Connection): Writer connection.
+#       sessionInformation (SessionInf): Session whose cart is checked out.
+#       shipping_address (str): Address for shipment.
+#       ono (int): Order number to use; default MAX(ono)+1 read inside the transaction.
+#   Returns:
+#           CheckoutResult: ono and the new stock levels on success; shortages or empty=True otherwise.
+#   Raises:
+#           sqlite3.Error: After rolling back, on any database error.
+def place_order(conn: sqlite3.Connection, sessionInformation: SessionInf, shipping_address, ono=None):
+
+    params = {
+        "cid": sessionInformation.cid,
+        "sno": sessionInformation.sessionNo,
+        "odate": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "addr": shipping_address,
+    }
+
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE;")
+    try:
+        cart_pids = {r[0] for r in conn.execute(_CART_PIDS, params)}
+        if not cart_pids:
+            conn.rollback()
+            return CheckoutResult(empty=True)
+
+        #   pid -> stock after the decrement
+        decremented = dict(conn.execute(_DECREMENT_STOCK, params).fetchall())
+        short = sorted(cart_pids - decremented.keys())
+        if short:
+            sql = _SHORT_LINES.format(marks=",".join("?" * len(short)))
+            #   Read before the rollback (the cart lines may be part of this
+            #   transaction); the short products were never decremented
+            rows = conn.execute(sql, [params["cid"], params["sno"], *short]).fetchall()
+            conn.rollback()
+            return CheckoutResult(shortages=[
+                Shortage(pid=r[0], name=r[1], requested=r[2], available=r[3]) for r in rows
+            ])
+
+        params["ono"] = ono if ono is not None else _next_ono(conn)
+        conn.execute(_INSERT_ORDER, params)
+        conn.execute(_INSERT_LINES, params)
+        apply_order(conn, params["ono"], params["cid"], params["odate"])
+        conn.execute(_CLEAR_CART, params)
+        conn.commit()
+        return CheckoutResult(ono=params["ono"], stock=decremented)
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
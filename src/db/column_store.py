@@ -0,0 +1,346 @@
+import datetime as dt
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.export_to_excel import open_readonly
+
+#   Columnar snapshots of the order and clickstream tables, for reporting.
+#
+#   build_snapshot() copies orders, orderlines, viewedProduct, search and
+#   products out of the live store in one read transaction (a consistent
+#   point in time that never blocks checkouts in WAL mode) and writes every
+#   column as its own .npy file:
+#       - numbers in the narrowest type that fits them by the schema
+#         (int32 ids and quantities, float64 prices);
+#       - timestamps as int64 seconds since 1970-01-01 (UTC, as stored);
+#       - text dictionary-encoded: int32 codes plus a JSON list of the
+#         distinct values (search queries, names, categories repeat a lot);
+#       - NULLs in a separate <column>.null.npy mask, only where there are any.
+#   No general-purpose compression: it would force a decompressed copy on
+#   every read. Instead readers memory-map the files (np.load(mmap_mode="r")),
+#   so a report touches only the pages of the columns it uses and several
+#   processes share one copy in the OS page cache.
+#
+#   Layout under `root`:
+#       CURRENT                     name of the newest complete snapshot
+#       20251027T185525Z/           one directory per snapshot
+#           manifest.json           source, created_at, tables, rows, column types
+#           orders/ono.npy ...
+#   A snapshot is written to a hidden directory and renamed into place, then
+#   CURRENT is replaced atomically, so readers never see a partial one. Older
+#   snapshots beyond `keep` are removed (a reader that still has one open
+#   keeps its mapped pages on POSIX; on Windows the removal is retried by the
+#   next build).
+#
+#   Usage: python -m src.db.column_store build <db_path> <root> [--every SECONDS] [--keep 2]
+#          python -m src.db.column_store info <root>
+
+#   table -> [(column, kind, select expression)]; kinds: int32, int64, float64, time, text
+TABLES = {
+    "orders": [
+        ("ono", "int64", "ono"),
+        ("cid", "int64", "cid"),
+        ("sessionNo", "int32", "sessionNo"),
+        ("odate", "time", "odate"),
+        ("shipping_address", "text", "shipping_address"),
+    ],
+    "orderlines": [
+        ("ono", "int64", "ono"),
+        ("lineNo", "int32", "lineNo"),
+        ("pid", "int32", "pid"),
+        ("qty", "int32", "qty"),
+        ("uprice", "float64", "uprice"),
+    ],
+    "viewedProduct": [
+        ("cid", "int64", "cid"),
+        ("sessionNo", "int32", "sessionNo"),
+        ("ts", "time", "ts"),
+        ("pid", "int32", "pid"),
+    ],
+    "search": [
+        ("cid", "int64", "cid"),
+        ("sessionNo", "int32", "sessionNo"),
+        ("ts", "time", "ts"),
+        ("query", "text", "query"),
+    ],
+    "products": [
+        ("pid", "int32", "pid"),
+        ("name", "text", "name"),
+        ("category", "text", "category"),
+        ("price", "float64", "price"),
+        ("stock_count", "int32", "stock_count"),
+        ("descr", "text", "descr"),
+    ],
+}
+
+FETCH_BATCH = 65536
+_DTYPES = {"int32": np.int32, "int64": np.int64, "float64": np.float64, "time": np.int64, "text": np.int32}
+
+
+def _select(kind, expr):
+    if kind == "time":
+        return f"CAST(strftime('%s', {expr}) AS INTEGER)"
+    return expr
+
+
+class _ColumnWriter:
+
+    def __init__(self, directory, name, kind, rows):
+        self.directory = directory
+        self.name = name
+        self.kind = kind
+        self.dtype = _DTYPES[kind]
+        self.values = np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+",
+                                                dtype=self.dtype, shape=(rows,))
+        self.nulls = None
+        self.dictionary = {}        #   text -> code
+
+    #   Store one batch (an object array slice) at rows [start, start + len(batch)).
+    def write(self, start, batch):
+        end = start + len(batch)
+        if self.kind == "text":
+            codes, uniques = pd.factorize(batch)
+            #   codes of this batch -> codes of the whole column; NULL stays -1
+            mapping = np.array([self.dictionary.setdefault(u, len(self.dictionary)) for u in uniques] + [-1],
+                               dtype=np.int32)
+            self.values[start:end] = mapping[codes]
+            missing = codes < 0
+        else:
+            numbers = batch.astype(np.float64)
+            missing = np.isnan(numbers)
+            if missing.any():
+                numbers[missing] = 0
+            self.values[start:end] = numbers
+        if missing.any():
+            if self.nulls is None:
+                self.nulls = np.zeros(len(self.values), dtype=bool)
+            self.nulls[start:end] = missing
+
+    #   Flush to disk. Returns the column's manifest entry.
+    def close(self):
+        self.values.flush()
+        del self.values
+        if self.nulls is not None:
+            np.save(os.path.join(self.directory, self.name + ".null.npy"), self.nulls)
+        entry = {"kind": self.kind, "dtype": np.dtype(self.dtype).name, "nulls": self.nulls is not None}
+        if self.kind == "text":
+            with open(os.path.join(self.directory, self.name + ".dict.json"), "w", encoding="utf-8") as f:
+                json.dump([str(v) for v in self.dictionary], f, ensure_ascii=False)
+            entry["distinct"] = len(self.dictionary)
+        return entry
+
+
+def _copy_table(conn, table, columns, directory):
+    os.makedirs(directory)
+    rows = conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+    writers = [_ColumnWriter(directory, name, kind, rows) for name, kind, _ in columns]
+    sql = f'SELECT {", ".join(_select(kind, expr) for _, kind, expr in columns)} FROM "{table}";'
+    cur = conn.execute(sql)
+    start = 0
+    while True:
+        batch = cur.fetchmany(FETCH_BATCH)
+        if not batch:
+            break
+        block = np.array(batch, dtype=object).reshape(len(batch), len(columns))
+        for j, writer in enumerate(writers):
+            writer.write(start, block[:, j])
+        start += len(batch)
+    return {"rows": rows, "columns": {w.name: w.close() for w in writers}}
+
+
+#   Copy the reporting tables into a new columnar snapshot under `root`.
+#   Args:
+#       db_path (str): Store to copy (opened read-only).
+#       root (str): Directory holding the snapshots.
+#       keep (int): Complete snapshots to keep, the new one included.
+#   Returns:
+#           str: Path of the new snapshot.
+def build_snapshot(db_path, root, keep=2):
+    started = time.perf_counter()
+    created = dt.datetime.now(dt.timezone.utc)
+    name = created.strftime("%Y%m%dT%H%M%S%fZ")
+    os.makedirs(root, exist_ok=True)
+    building = os.path.join(root, "." + name)
+    manifest = {"source": os.path.abspath(db_path), "created_at": created.isoformat(timespec="seconds"),
+                "tables": {}}
+
+    conn = open_readonly(db_path)
+    try:
+        #   one read transaction: every table as of the same moment
+        conn.execute("BEGIN;")
+        for table, columns in TABLES.items():
+            manifest["tables"][table] = _copy_table(conn, table, columns, os.path.join(building, table))
+        conn.rollback()
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    manifest["build_seconds"] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(building, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    path = os.path.join(root, name)
+    os.rename(building, path)
+    tmp = os.path.join(root, "CURRENT.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+    _prune(root, keep)
+    return path
+
+
+def _prune(root, keep):
+    names = sorted(n for n in os.listdir(root) if not n.startswith(".") and os.path.isdir(os.path.join(root, n)))
+    for old in names[:-max(1, keep)]:
+        try:
+            shutil.rmtree(os.path.join(root, old))
+        except OSError:
+            pass        #   still mapped by a reader (Windows); removed by a later build
+
+
+class ColumnTable:
+
+    def __init__(self, directory, info):
+        self.directory = directory
+        self.info = info
+        self._dictionaries = {}
+
+    def __len__(self):
+        return self.info["rows"]
+
+    @property
+    def columns(self):
+        return list(self.info["columns"])
+
+    #   The stored column, memory-mapped (read-only, no copy). Text columns are
+    #   their int32 codes (-1 for NULL); see text().
+    def column(self, name):
+        if name not in self.info["columns"]:
+            raise KeyError(f"no column {name!r}")
+        return np.load(os.path.join(self.directory, name + ".npy"), mmap_mode="r")
+
+    __getitem__ = column
+
+    #   Boolean NULL mask of a column (all False if it has no NULLs).
+    def nulls(self, name):
+        if not self.info["columns"][name]["nulls"]:
+            return np.zeros(len(self), dtype=bool)
+        return np.load(os.path.join(self.directory, name + ".null.npy"), mmap_mode="r")
+
+    #   Distinct values of a text column, indexed by code.
+    def dictionary(self, name):
+        if name not in self._dictionaries:
+            with open(os.path.join(self.directory, name + ".dict.json"), encoding="utf-8") as f:
+                self._dictionaries[name] = np.array(json.load(f), dtype=object)
+        return self._dictionaries[name]
+
+    #   Decoded values of a text column (None for NULL), optionally only at `rows`.
+    def text(self, name, rows=None):
+        codes = self.column(name)
+        codes = np.asarray(codes if rows is None else codes[rows])
+        values = np.append(self.dictionary(name), None)
+        return values[codes]
+
+    #   Timestamp column as datetime64[s].
+    def times(self, name):
+        return self.column(name).view("datetime64[s]")
+
+    #   Selected columns as a pandas DataFrame (a copy; text decoded).
+    def frame(self, columns=None):
+        data = {}
+        for name in columns or self.columns:
+            kind = self.info["columns"][name]["kind"]
+            if kind == "text":
+                data[name] = self.text(name)
+            elif kind == "time":
+                data[name] = self.times(name)
+            else:
+                data[name] = np.asarray(self.column(name))
+        return pd.DataFrame(data)
+
+
+class ColumnSnapshot:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.name = os.path.basename(path)
+        self.created_at = dt.datetime.fromisoformat(self.manifest["created_at"])
+
+    #   Seconds since the snapshot was taken.
+    def age(self):
+        return (dt.datetime.now(dt.timezone.utc) - self.created_at).total_seconds()
+
+    def table(self, name):
+        if name not in self.manifest["tables"]:
+            raise KeyError(f"snapshot has no table {name!r}")
+        return ColumnTable(os.path.join(self.path, name), self.manifest["tables"][name])
+
+
+#   The newest complete snapshot under `root`, or None if there is none.
+def open_snapshot(root):
+    try:
+        with open(os.path.join(root, "CURRENT"), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return ColumnSnapshot(os.path.join(root, name))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Columnar snapshots of the reporting tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="take a snapshot (repeatedly with --every)")
+    build.add_argument("db_path")
+    build.add_argument("root")
+    build.add_argument("--every", type=float, help="seconds between snapshots; runs until interrupted")
+    build.add_argument("--keep", type=int, default=2, help="snapshots to keep")
+    info = sub.add_parser("info", help="describe the current snapshot")
+    info.add_argument("root")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        snapshot = open_snapshot(args.root)
+        if snapshot is None:
+            print(f"[X] No snapshot in {args.root}")
+            return 1
+        print(f"{snapshot.name}  taken {snapshot.manifest['created_at']} ({snapshot.age():.0f}s ago) "
+              f"from {snapshot.manifest['source']}")
+        for table, t in snapshot.manifest["tables"].items():
+            print(f"  {table:<14}{t['rows']:>12} rows  " + ", ".join(t["columns"]))
+        return 0
+
+    if not os.path.exists(args.db_path):
+        print(f"[X] Database file not found: {args.db_path}")
+        return 1
+    while True:
+        try:
+            path = build_snapshot(args.db_path, args.root, keep=args.keep)
+        except (OSError, sqlite3.Error) as e:
+            print(f"[X] Snapshot failed: {e}")
+            if not args.every:
+                return 1
+        else:
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+                seconds = json.load(f)["build_seconds"]
+            print(f"[✓] Snapshot {os.path.basename(path)} written in {seconds}s")
+        if not args.every:
+            return 0
+        try:
+            time.sleep(args.every)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
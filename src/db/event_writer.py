@@ -0,0 +1,153 @@
+import atexit
+import datetime as dt
+import sqlite3
+import threading
+import time
+
+#   Buffered writer for clickstream events (search and viewedProduct rows).
+#
+#   Events are queued in memory with the timestamp of the moment they happen
+#   and written with one executemany per table, in one transaction, when
+#       - `max_events` events are pending, or
+#       - the oldest pending event is `max_delay` seconds old (checked by a
+#         background thread), or
+#       - flush()/close() is called (logout, exit, before reading views).
+#   close() is also registered with atexit so a clean sys.exit() loses nothing.
+#   A flush from a thread that holds the writer (inside a unit of work) is
+#   deferred: committing there would commit the caller's transaction too.
+#   The events stay queued for the timer or the next flush.
+#
+#   INSERT OR IGNORE: two events with the same (cid, sessionNo, ts) key would
+#   previously fail one by one; in a batch they must not sink the others.
+#   The dropped duplicates are counted (`ignored`) and reported by flush().
+
+_INSERT_SEARCH = "INSERT OR IGNORE INTO search (cid,sessionNo,ts,query) VALUES (?,?,?,?);"
+_INSERT_VIEW = "INSERT OR IGNORE INTO viewedProduct (cid,sessionNo,ts,pid) VALUES (?,?,?,?);"
+
+
+class EventWriter:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool whose writer receives the batches.
+    #       max_events (int): Flush once this many events are pending.
+    #       max_delay (float): Flush once the oldest event is this many seconds old.
+    def __init__(self, pool, max_events=100, max_delay=2.0):
+        self.pool = pool
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self._searches = []
+        self._views = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self.flushes = 0
+        self.written = 0
+        self.ignored = 0
+        atexit.register(self.close)
+
+    #   Queue one search event.
+    def record_search(self, sessionInformation, query):
+        self._add("search", (sessionInformation.cid, sessionInformation.sessionNo, self._now(), query))
+
+    #   Queue one product-view event.
+    def record_view(self, sessionInformation, pid):
+        self._add("view", (sessionInformation.cid, sessionInformation.sessionNo, self._now(), pid))
+
+    #   Number of events waiting to be written.
+    def pending(self):
+        with self._lock:
+            return len(self._searches) + len(self._views)
+
+    @staticmethod
+    def _now():
+        return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _add(self, kind, row):
+        with self._lock:
+            #   pick the list under the lock: flush() swaps them
+            (self._searches if kind == "search" else self._views).append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            #   after close() there is no timer any more: write straight through
+            due = self._closed or len(self._searches) + len(self._views) >= self.max_events
+            if not self._closed:
+                self._start_timer()
+        if due:
+            self.flush()
+
+    #   Start the background thread that enforces max_delay (lock held).
+    def _start_timer(self):
+        if self._thread is None and self.max_delay:
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.max_delay / 2)
+            self._wake.clear()
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay
+            if due:
+                self.flush()
+
+    #   Write every pending event in one transaction (committed when writer() returns).
+    #   Returns:
+    #           int: Number of events stored, without the duplicates that were
+    #           ignored (0 on error or when deferred; the events stay queued).
+    def flush(self):
+        if self.pool.current_writer() is not None:
+            return 0
+        with self._lock:
+            searches, views = self._searches, self._views
+            self._searches, self._views = [], []
+            self._oldest = None
+        if not searches and not views:
+            return 0
+        ignored = self._write(searches, views)
+        if ignored is not None:
+            if ignored:
+                print(f"\n[!] {ignored} duplicate search/view event(s) dropped "
+                      "(same customer, session and second)")
+            return len(searches) + len(views) - ignored
+        with self._lock:
+            #   put them back in front so order is kept
+            self._searches = searches + self._searches
+            self._views = views + self._views
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        return 0
+
+    #   Returns:
+    #           int or None: Rows ignored as duplicates, None if the batch failed.
+    def _write(self, searches, views):
+        try:
+            with self.pool.writer() as conn:
+                #   rowcount sums the rows each execution inserted (trigger writes
+                #   excluded), so the difference is the ignored duplicates
+                stored = 0
+                if searches:
+                    stored += conn.executemany(_INSERT_SEARCH, searches).rowcount
+                if views:
+                    stored += conn.executemany(_INSERT_VIEW, views).rowcount
+                ignored = len(searches) + len(views) - stored
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in EventWriter.flush()\n")
+            print(e)
+            return None
+        with self._lock:
+            self.flushes += 1
+            self.written += len(searches) + len(views) - ignored
+            self.ignored += ignored
+        return ignored
+
+    #   Flush and stop the background thread. Safe to call more than once.
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.max_delay + 1)
+        self.flush()
@@ -0,0 +1,330 @@
+import datetime as dt
+import itertools
+import time
+
+from src.db.sales_metrics import as_date
+
+#   Search-to-purchase conversion funnel.
+#
+#   Sessions that searched, viewed a product, carted and ordered, the time
+#   from session start to purchase, and conversion per search query.
+#
+#   Computed in one ordered pass: the sessions table and four event streams
+#   (searches, views per session, carted sessions, orders per session)
+#   are each read in (cid, sessionNo) order, off their primary keys (orders off
+#   idx_orders_cid_session), and merged like sorted lists. Each session is
+#   folded into the counters when the merge leaves it, so memory holds one
+#   session at a time plus one counter per distinct query, never a row
+#   per session. No statement is run per session, and every stream is
+#   read once in fetchmany() batches.
+#
+#   The cart table can't tell who carted: checkout and logout both empty it.
+#   "Carted" reads cartedSession instead, which records every session that
+#   put a product in its cart (migration 10, see session_cart.py). Sessions
+#   from before that migration only count as carted if their cart was still
+#   in the table then, or if they ordered. On a store without cartedSession
+#   at all (not migrated yet) carted falls back to ordered, and the report
+#   says so ("carts_recorded": false). Time to purchase runs from the
+#   session start to its first order. Orders dated without a time of day (older
+#   data) use the session end instead, since the order was placed before it;
+#   those are counted as "estimated". Events of sessions outside the date
+#   range (or missing from sessions) are skipped.
+#
+#   All streams read one snapshot: the pass runs in a read transaction,
+#   the caller's if one is open.
+#
+#   Usage: python -m src.db.funnel <db_path> [--start 2025-01-01] [--end 2025-12-31]
+#              [--queries 20] [--json funnel.json]
+
+_SESSIONS = "SELECT cid, sessionNo, start_time, end_time FROM sessions{where} ORDER BY cid, sessionNo;"
+_SEARCHES = "SELECT cid, sessionNo, lower(trim(query)) FROM search ORDER BY cid, sessionNo;"
+_VIEWS = "SELECT cid, sessionNo, COUNT(*) FROM viewedProduct GROUP BY cid, sessionNo ORDER BY cid, sessionNo;"
+_CARTS = "SELECT cid, sessionNo FROM cartedSession ORDER BY cid, sessionNo;"
+#   NULL keys would not compare with the session keys (orders has no NOT NULL on them)
+_ORDERS = """
+    SELECT cid, sessionNo, MIN(odate), COUNT(*) FROM orders
+    WHERE cid IS NOT NULL AND sessionNo IS NOT NULL
+    GROUP BY cid, sessionNo ORDER BY cid, sessionNo;
+"""
+
+FETCH_BATCH = 8192
+STAGES = ("searched", "viewed", "carted", "ordered")
+
+#   time-to-purchase histogram: upper bounds in seconds and labels
+TTP_BINS = (60, 300, 900, 1800, 3600, 6 * 3600, 24 * 3600)
+TTP_LABELS = ("<1m", "1-5m", "5-15m", "15-30m", "30-60m", "1-6h", "6-24h", "1d+")
+
+_END = (float("inf"), float("inf"))
+
+
+#   Rows of `sql` in fetchmany() batches, as plain tuples.
+def _stream(conn, sql, params=()):
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    return itertools.chain.from_iterable(iter(lambda: cur.fetchmany(FETCH_BATCH), []))
+
+
+class _Merge:
+
+    #   One ordered stream, advanced to each session key in turn.
+    def __init__(self, rows):
+        self._rows = rows
+        self._advance()
+
+    def _advance(self):
+        self.row = row = next(self._rows, None)
+        self.key = _END if row is None else row[:2]
+
+    #   Rows of session `key`; rows of earlier keys (sessions not in the report) are dropped.
+    def take(self, key):
+        while self.key < key:
+            self._advance()
+        if self.key != key:
+            return ()
+        rows = []
+        while self.key == key:
+            rows.append(self.row)
+            self._advance()
+        return rows
+
+    #   The one row of session `key` (streams grouped by session), or None.
+    def one(self, key):
+        while self.key < key:
+            self._advance()
+        if self.key != key:
+            return None
+        row = self.row
+        self._advance()
+        return row
+
+
+def _time(value):
+    try:
+        return dt.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Funnel:
+
+    def __init__(self):
+        self.sessions = 0
+        #   sessions with each kind of event, in STAGES order
+        self.stages = [0] * len(STAGES)
+        #   sessions that reached every stage up to i, in STAGES order
+        self.steps = [0] * len(STAGES)
+        self.ordered_without_search = 0
+        self.orders = 0
+        self.queries = {}
+        self.ttp_hist = [0] * len(TTP_LABELS)
+        self.ttp_sum = 0.0
+        self.ttp_max = 0.0
+        self.ttp_count = 0
+        self.ttp_estimated = 0
+        self.ttp_unknown = 0
+
+    #   Fold one session into the counters.
+    def add(self, start_time, end_time, queries, viewed, carted, ordered):
+        self.sessions += 1
+        searched = bool(queries)
+        reached = (searched, viewed, carted or ordered is not None, ordered is not None)
+        stages = self.stages
+        steps = self.steps
+        for i, hit in enumerate(reached):
+            if hit:
+                stages[i] += 1
+        for i, hit in enumerate(reached):
+            if not hit:
+                break
+            steps[i] += 1
+        for q in queries:
+            counts = self.queries.get(q)
+            if counts is None:
+                counts = self.queries[q] = [0, 0, 0, 0]
+            for i, hit in enumerate(reached):
+                if hit:
+                    counts[i] += 1
+        if ordered is not None:
+            self.orders += ordered[3]
+            if not searched:
+                self.ordered_without_search += 1
+            self._time_to_purchase(start_time, end_time, ordered[2])
+
+    def _time_to_purchase(self, start_time, end_time, odate):
+        started = _time(start_time)
+        bought = _time(odate) if odate and len(odate) > 10 else None
+        estimated = bought is None
+        if estimated:
+            bought = _time(end_time)
+        if started is None or bought is None or bought < started:
+            self.ttp_unknown += 1
+            return
+        seconds = (bought - started).total_seconds()
+        self.ttp_estimated += estimated
+        self.ttp_count += 1
+        self.ttp_sum += seconds
+        self.ttp_max = max(self.ttp_max, seconds)
+        i = 0
+        while i < len(TTP_BINS) and seconds >= TTP_BINS[i]:
+            i += 1
+        self.ttp_hist[i] += 1
+
+    def report(self, top):
+        first = self.steps[0]
+        steps = []
+        for i, stage in enumerate(STAGES):
+            prev = self.steps[i - 1] if i else first
+            steps.append({
+                "stage": stage,
+                "sessions": self.steps[i],
+                "of_previous": round(self.steps[i] / prev, 4) if prev else 0.0,
+                "of_searched": round(self.steps[i] / first, 4) if first else 0.0,
+            })
+        ranked = sorted(self.queries.items(), key=lambda kv: (-kv[1][0], -kv[1][3], kv[0]))[:top]
+        return {
+            "sessions": self.sessions,
+            "orders": self.orders,
+            "stages": dict(zip(STAGES, self.stages)),
+            "funnel": steps,
+            "ordered_without_search": self.ordered_without_search,
+            "conversion": round(self.stages[-1] / self.sessions, 4) if self.sessions else 0.0,
+            "time_to_purchase": {
+                "sessions": self.ttp_count,
+                "estimated": self.ttp_estimated,
+                "unknown": self.ttp_unknown,
+                "mean_minutes": round(self.ttp_sum / self.ttp_count / 60, 2) if self.ttp_count else None,
+                "max_minutes": round(self.ttp_max / 60, 2) if self.ttp_count else None,
+                "histogram": [{"within": label, "sessions": n} for label, n in zip(TTP_LABELS, self.ttp_hist)],
+            },
+            "distinct_queries": len(self.queries),
+            "queries": [
+                {"query": q, "sessions": c[0], "viewed": c[1], "carted": c[2], "ordered": c[3],
+                 "conversion": round(c[3] / c[0], 4)}
+                for q, c in ranked
+            ],
+        }
+
+
+#   Conversion funnel of the sessions started in start..end (both inclusive;
+#   every session by default).
+#   Args:
+#       conn (sqlite3.Connection): Connection to read from.
+#       queries (int): Number of search queries listed (most searched first).
+#   Returns:
+#           dict: {sessions, orders, stages, funnel, ordered_without_search, conversion,
+#                  time_to_purchase, distinct_queries, queries, carts_recorded, seconds, ...}
+#   Raises:
+#           sqlite3.Error: If a query fails.
+def funnel_report(conn, start=None, end=None, queries=20):
+    started = time.perf_counter()
+    if start is None and end is None:
+        where, params = "", {}
+    else:
+        params = {
+            "start": as_date(start).isoformat() if start is not None else "",
+            #   exclusive upper bound, as in sales_metrics.py
+            "end": (as_date(end) + dt.timedelta(days=1)).isoformat() if end is not None else "9999",
+        }
+        where = " WHERE start_time >= :start AND start_time < :end"
+
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN;")
+    try:
+        searches = _Merge(_stream(conn, _SEARCHES))
+        views = _Merge(_stream(conn, _VIEWS))
+        carts_recorded = conn.execute("PRAGMA table_info(cartedSession);").fetchone() is not None
+        carts = _Merge(_stream(conn, _CARTS) if carts_recorded else iter(()))
+        orders = _Merge(_stream(conn, _ORDERS))
+        funnel = _Funnel()
+        for cid, sno, start_time, end_time in _stream(conn, _SESSIONS.format(where=where), params):
+            key = (cid, sno)
+            funnel.add(
+                start_time, end_time,
+                {row[2] for row in searches.take(key) if row[2]},
+                views.one(key) is not None,
+                carts.one(key) is not None,
+                orders.one(key),
+            )
+    finally:
+        if own and conn.in_transaction:
+            conn.rollback()
+
+    report = funnel.report(queries)
+    report["start"] = as_date(start).isoformat() if start is not None else None
+    report["end"] = as_date(end).isoformat() if end is not None else None
+    report["carts_recorded"] = carts_recorded
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+#   Print a funnel_report() dict as text tables.
+def print_funnel(report):
+    print(f"\nSessions: {report['sessions']}   Orders: {report['orders']}   "
+          f"Session conversion: {report['conversion']:.1%}")
+
+    print(f"\n{'Stage':<10}{'Sessions':>10}{'Of prev':>9}{'Of searched':>13}   {'Any path':>9}")
+    print("-" * 54)
+    for step in report["funnel"]:
+        print(f"{step['stage']:<10}{step['sessions']:>10}{step['of_previous']:>9.1%}{step['of_searched']:>13.1%}"
+              f"   {report['stages'][step['stage']]:>9}")
+    print(f"Ordered without searching: {report['ordered_without_search']}")
+    if report.get("carts_recorded", True):
+        print("(carted: put a product in the cart; recorded from schema version 10 on,"
+              " older sessions count only if they ordered)")
+    else:
+        print("(carted: carts are not recorded in this store (run the migrations), so carted = ordered)")
+
+    ttp = report["time_to_purchase"]
+    print(f"\nTime to purchase ({ttp['sessions']} sessions, {ttp['estimated']} from session end, "
+          f"{ttp['unknown']} unknown)")
+    if ttp["sessions"]:
+        print(f"  mean {ttp['mean_minutes']} min, max {ttp['max_minutes']} min")
+        print("  " + ", ".join(f"{h['within']}: {h['sessions']}" for h in ttp["histogram"]))
+
+    print(f"\n{'Query':<24}{'Sessions':>9}{'Viewed':>8}{'Carted':>8}{'Ordered':>9}{'Conv':>8}")
+    print("-" * 66)
+    for q in report["queries"]:
+        print(f"{q['query'][:23]:<24}{q['sessions']:>9}{q['viewed']:>8}{q['carted']:>8}{q['ordered']:>9}"
+              f"{q['conversion']:>8.1%}")
+    print(f"({report['distinct_queries']} distinct queries)")
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import os
+
+    from src.db.connection import create_connection
+    from src.db.migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Search-to-purchase conversion funnel")
+    parser.add_argument("db_path")
+    parser.add_argument("--start", help="first session day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last session day (YYYY-MM-DD)")
+    parser.add_argument("--queries", type=int, default=20, help="search queries to list")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db_path):
+        print(f"[X] Database file not found: {args.db_path}")
+        return 1
+    conn = create_connection(args.db_path)
+    try:
+        migrate(conn)
+        report = funnel_report(conn, args.start, args.end, args.queries)
+    finally:
+        conn.close()
+
+    print_funnel(report)
+    print(f"\nComputed in {report['seconds']}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[✓] Report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+import atexit
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+#   Per-method and per-statement profiling for the repository.
+#
+#   Two hooks feed one process-wide `profiler`:
+#       - @instrument_methods wraps every public dbFunctions method and records
+#         calls, latency and rows returned;
+#       - every pooled connection has profiler.trace as its trace callback,
+#         which sees each statement (BEGIN/COMMIT included) as it starts.
+#   A statement's latency is the time until the next statement on the same
+#   thread or the end of the enclosing method, so it includes fetching its
+#   rows. COMMIT time is also summed per method (and its callers). Statements are grouped by
+#   their text with literals replaced by "?".
+#
+#   Off by default; when off the hooks return immediately. Switch at runtime
+#   with profiler.enable()/disable(), or at start-up with STORE_PROFILE=1
+#   (summary table on exit) or STORE_PROFILE=profile.json (JSON file on exit).
+
+#   Upper bounds (ms) of the latency histogram buckets; the last one is open.
+BUCKETS_MS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    return _SPACES.sub(" ", _LITERALS.sub("?", sql)).strip()[:300]
+
+
+#   Latency and row statistics for one method or statement.
+class Stat:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.rows = 0
+        self.commit = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, seconds, rows=0):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        ms = seconds * 1000
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.histogram[i] += 1
+
+    #   Upper bound (ms) of the bucket holding quantile q; the max for the open bucket.
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        seen = 0
+        for i, n in enumerate(self.histogram):
+            seen += n
+            if seen >= q * self.count:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max * 1000
+        return self.max * 1000
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "min_ms": round((self.min or 0.0) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "rows": self.rows,
+            "commit_ms": round(self.commit * 1000, 3),
+            "histogram": dict(zip([f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], self.histogram)),
+        }
+
+
+#   Rows a repository method handed back: list length, 1 for a single row, 0 for None.
+def count_rows(result):
+    if result is None or isinstance(result, bool):
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    rows = getattr(result, "rows", None)
+    if isinstance(rows, list):
+        return len(rows)
+    return 1
+
+
+class Instrumentation:
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.methods = {}
+        self.statements = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.statements = {}
+
+    #   Trace callback for sqlite3 connections.
+    def trace(self, sql):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        local = self._local
+        self._close_statement(local, now)
+        stack = tuple(getattr(local, "stack", ()))
+        local.statement = (stack, normalize_sql(sql), now)
+
+    def _close_statement(self, local, now):
+        current = getattr(local, "statement", None)
+        if current is None:
+            return
+        local.statement = None
+        stack, sql, started = current
+        elapsed = now - started
+        with self._lock:
+            self.statements.setdefault((stack[-1] if stack else "-", sql), Stat()).add(elapsed)
+            if sql.upper().startswith("COMMIT"):
+                #   a commit inside commit() also counts for the method that called it
+                for method in set(stack):
+                    #   setdefault: reset() may have run since the method started
+                    self.methods.setdefault(method, Stat()).commit += elapsed
+
+    #   Run fn(*args, **kwargs) as repository method `name`, recording it if enabled.
+    def call(self, name, fn, args, kwargs):
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        local = self._local
+        if not hasattr(local, "stack"):
+            local.stack = []
+        local.stack.append(name)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        finally:
+            now = time.perf_counter()
+            self._close_statement(local, now)
+            local.stack.pop()
+            with self._lock:
+                self.methods.setdefault(name, Stat()).add(now - started, count_rows(result))
+
+    #   Summary as a JSON-serializable dict.
+    def report(self):
+        with self._lock:
+            return {
+                "methods": {name: s.as_dict() for name, s in sorted(
+                    self.methods.items(), key=lambda kv: kv[1].total, reverse=True)},
+                "statements": [dict(method=m, sql=sql, **s.as_dict()) for (m, sql), s in sorted(
+                    self.statements.items(), key=lambda kv: kv[1].total, reverse=True)],
+            }
+
+    #   Text table of the methods and the `top` most expensive statements.
+    def summary(self, top=15):
+        report = self.report()
+        lines = [f"{'Method':<34}{'Calls':>7}{'Total ms':>11}{'Mean':>9}{'p50':>8}{'p95':>8}{'Max':>9}{'Rows':>8}{'Commit':>9}",
+                 "-" * 103]
+        for name, s in report["methods"].items():
+            lines.append(f"{name:<34}{s['count']:>7}{s['total_ms']:>11.2f}{s['mean_ms']:>9.3f}{s['p50_ms']:>8}"
+                         f"{s['p95_ms']:>8}{s['max_ms']:>9.2f}{s['rows']:>8}{s['commit_ms']:>9.2f}")
+        lines += ["", f"{'Statement (method)':<80}{'Calls':>7}{'Total ms':>11}{'Mean':>9}", "-" * 107]
+        for s in report["statements"][:top]:
+            label = f"{s['sql'][:60]} ({s['method']})"
+            lines.append(f"{label[:80]:<80}{s['count']:>7}{s['total_ms']:>11.2f}{s['mean_ms']:>9.3f}")
+        return "\n".join(lines)
+
+    #   Print the summary, or write the report to `path` as JSON.
+    def dump(self, path=None):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=2)
+            print(f"[✓] Profile written to {path}")
+        else:
+            print("\n" + self.summary())
+
+
+profiler = Instrumentation()
+
+
+#   Class decorator: route every public method through profiler.call().
+def instrument_methods(cls):
+    for name, fn in list(vars(cls).items()):
+        if name.startswith("_") or not callable(fn):
+            continue
+
+        def wrap(fn, name):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                return profiler.call(name, fn, args, kwargs)
+            return wrapper
+
+        setattr(cls, name, wrap(fn, name))
+    return cls
+
+
+#   Enable profiling from STORE_PROFILE and dump the results at exit.
+#   "1"/"true" prints the summary table; any other value is a JSON file path.
+def configure_from_env(environ=os.environ):
+    value = environ.get("STORE_PROFILE", "").strip()
+    if not value or value.lower() in ("0", "false", "no"):
+        return False
+    profiler.enable()
+    path = None if value.lower() in ("1", "true", "yes") else value
+    atexit.register(profiler.dump, path)
+    return True
@@ -0,0 +1,280 @@
+import sqlite3
+
+from src.db import rollup, top_products
+
+#   Versioned schema migrations.
+#
+#   The schema version lives in `PRAGMA user_version` (0 for the original
+#   store.db). Each migration is (version, description, steps); a step is
+#   either a SQL string or a callable taking the connection. Pending
+#   migrations run in order, each inside its own BEGIN IMMEDIATE transaction
+#   together with the user_version bump, so a failed step leaves the database
+#   at the previous version.
+#   Never edit a migration that has shipped — append a new one instead.
+
+MIGRATIONS = [
+    (1, "secondary and expression indexes for hot repository queries", [
+        #   get_orders: WHERE cid = ? ORDER BY odate DESC
+        "CREATE INDEX IF NOT EXISTS idx_orders_cid_odate ON orders(cid, odate);",
+        #   range filters on the order date
+        "CREATE INDEX IF NOT EXISTS idx_orders_odate ON orders(odate);",
+        #   weekly_sales_metrics filters on date(odate)
+        "CREATE INDEX IF NOT EXISTS idx_orders_odate_day ON orders(date(odate));",
+        #   top_products_by_distinct_orders: GROUP BY pid, COUNT(DISTINCT ono) (covering)
+        "CREATE INDEX IF NOT EXISTS idx_orderlines_pid_ono ON orderlines(pid, ono);",
+        #   top_products_by_views: GROUP BY pid
+        "CREATE INDEX IF NOT EXISTS idx_viewedProduct_pid ON viewedProduct(pid);",
+        #   check_email: LOWER(email) = ?
+        "CREATE INDEX IF NOT EXISTS idx_customers_email_lower ON customers(LOWER(email));",
+    ]),
+    (2, "id_sequences table for the id allocator", [
+        #   rows are created and seeded lazily by src/db/sequences.py
+        """
+        CREATE TABLE IF NOT EXISTS id_sequences (
+          name		text,
+          scope		int,
+          next_value	int not null,
+          primary key (name, scope)
+        );
+        """,
+    ]),
+    (3, "drop date(odate) index; sales metrics filter on odate directly", [
+        "DROP INDEX IF EXISTS idx_orders_odate_day;",
+    ]),
+    (4, "daily sales rollup tables, backfilled from the order history", [
+        #   maintained by checkout (src/db/rollup.py)
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily (
+          day		text,
+          orders	int not null,
+          units		int not null,
+          total_sales	float not null,
+          primary key (day)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_product (
+          day		text,
+          pid		int,
+          category	text,
+          orders	int not null,
+          units		int not null,
+          total_sales	float not null,
+          primary key (day, pid)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_customer (
+          day		text,
+          cid		int,
+          orders	int not null,
+          total_sales	float not null,
+          primary key (day, cid)
+        );
+        """,
+        rollup.rebuild,
+    ]),
+    (5, "per-product order/view counters for top-K queries", [
+        """
+        CREATE TABLE IF NOT EXISTS product_counters (
+          pid		int,
+          orders	int not null default 0,
+          views		int not null default 0,
+          primary key (pid)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_product_counters_orders ON product_counters(orders DESC, pid);",
+        "CREATE INDEX IF NOT EXISTS idx_product_counters_views ON product_counters(views DESC, pid);",
+        #   an order counts once per product, however many of its lines carry it
+        """
+        CREATE TRIGGER IF NOT EXISTS product_counters_ol_ai AFTER INSERT ON orderlines
+        WHEN NOT EXISTS (SELECT 1 FROM orderlines
+                         WHERE pid = new.pid AND ono = new.ono AND lineNo <> new.lineNo)
+        BEGIN
+            INSERT INTO product_counters (pid, orders) VALUES (new.pid, 1)
+            ON CONFLICT (pid) DO UPDATE SET orders = orders + 1;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_counters_ol_ad AFTER DELETE ON orderlines
+        WHEN NOT EXISTS (SELECT 1 FROM orderlines WHERE pid = old.pid AND ono = old.ono)
+        BEGIN
+            UPDATE product_counters SET orders = orders - 1 WHERE pid = old.pid;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_counters_v_ai AFTER INSERT ON viewedProduct BEGIN
+            INSERT INTO product_counters (pid, views) VALUES (new.pid, 1)
+            ON CONFLICT (pid) DO UPDATE SET views = views + 1;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_counters_v_ad AFTER DELETE ON viewedProduct BEGIN
+            UPDATE product_counters SET views = views - 1 WHERE pid = old.pid;
+        END;
+        """,
+        top_products.rebuild_counters,
+    ]),
+    (6, "order history index with the ono tie-breaker for keyset pagination", [
+        #   get_orders_cursor: WHERE cid = ? AND (odate, ono) < (?, ?) ORDER BY odate DESC, ono DESC
+        "CREATE INDEX IF NOT EXISTS idx_orders_cid_odate_ono ON orders(cid, odate, ono);",
+        "DROP INDEX IF EXISTS idx_orders_cid_odate;",
+    ]),
+    (7, "change log and topic versions for cross-process cache invalidation", [
+        #   one row per changed product; read by src/db/change_watcher.py
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+          seq		integer primary key,
+          pid		int not null
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS change_topics (
+          topic		text,
+          version	int not null,
+          primary key (topic)
+        );
+        """,
+        "INSERT OR IGNORE INTO change_topics (topic, version) VALUES ('sales', 0), ('views', 0);",
+        """
+        CREATE TRIGGER IF NOT EXISTS change_log_products_ai AFTER INSERT ON products BEGIN
+            INSERT INTO change_log (pid) VALUES (new.pid);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS change_log_products_au AFTER UPDATE ON products BEGIN
+            INSERT INTO change_log (pid) VALUES (old.pid);
+            INSERT INTO change_log (pid) SELECT new.pid WHERE new.pid <> old.pid;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS change_log_products_ad AFTER DELETE ON products BEGIN
+            INSERT INTO change_log (pid) VALUES (old.pid);
+        END;
+        """,
+        #   keep the log bounded; a reader that falls further behind clears its whole cache
+        """
+        CREATE TRIGGER IF NOT EXISTS change_log_prune AFTER INSERT ON change_log BEGIN
+            DELETE FROM change_log WHERE seq <= new.seq - 10000;
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS change_topics_orders_ai AFTER INSERT ON orders BEGIN
+            UPDATE change_topics SET version = version + 1 WHERE topic = 'sales';
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS change_topics_views_ai AFTER INSERT ON viewedProduct BEGIN
+            UPDATE change_topics SET version = version + 1 WHERE topic = 'views';
+        END;
+        """,
+    ]),
+    (8, "normalized email key index for registration and login", [
+        #   check_email / insert_customer: lower(trim(email)) = lower(trim(?))
+        "CREATE INDEX IF NOT EXISTS idx_customers_email_key ON customers(lower(trim(email)));",
+        "DROP INDEX IF EXISTS idx_customers_email_lower;",
+    ]),
+    (9, "orders by session for the conversion funnel", [
+        #   funnel.py reads orders per (cid, sessionNo) in key order, like the event tables
+        "CREATE INDEX IF NOT EXISTS idx_orders_cid_session ON orders(cid, sessionNo, odate);",
+    ]),
+    (10, "durable record of the sessions that put something in their cart", [
+        #   cart rows are deleted at checkout and logout; the funnel (funnel.py) reads this instead
+        """
+        CREATE TABLE IF NOT EXISTS cartedSession (
+          cid		int,
+          sessionNo	int,
+          ts		timestamp,
+          primary key (cid, sessionNo),
+          foreign key (cid, sessionNo) references sessions
+        );
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS carted_session_ai AFTER INSERT ON cart BEGIN
+            INSERT OR IGNORE INTO cartedSession (cid, sessionNo, ts)
+            VALUES (new.cid, new.sessionNo, datetime('now', 'localtime'));
+        END;
+        """,
+        #   carts still in the table; earlier ones are gone (the funnel counts their orders)
+        """
+        INSERT OR IGNORE INTO cartedSession (cid, sessionNo, ts)
+        SELECT DISTINCT c.cid, c.sessionNo, s.start_time
+        FROM cart c LEFT JOIN sessions s ON s.cid = c.cid AND s.sessionNo = c.sessionNo;
+        """,
+    ]),
+]
+
+
+#   Read the schema version of the database.
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+#   Latest version known to this code.
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+#   Apply every pending migration up to `target` (default: latest).
+#   Args:
+#       conn (sqlite3.Connection): Open connection to the store.
+#       target (int): Version to migrate to.
+#       verbose (bool): Print one line per applied migration.
+#   Returns:
+#           int: Schema version after migrating.
+def migrate(conn: sqlite3.Connection, target=None, verbose=False) -> int:
+
+    if target is None:
+        target = latest_version()
+    version = current_version(conn)
+
+    for number, description, steps in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE;")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            #   PRAGMA does not accept parameters; number is an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(number)};")
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"\n[X] SQL Error in migration {number} ({description})\n")
+            print(e)
+            if conn.in_transaction:
+                conn.rollback()
+            return current_version(conn)
+        version = number
+        if verbose:
+            print(f"[✓] Migration {number}: {description}")
+
+    return version
+
+
+#   Command line: python -m src.db.migrations data/store.db [target]
+def main(argv=None):
+    import sys
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python -m src.db.migrations <db_path> [target_version]")
+        return 1
+
+    from src.db.connection import create_connection
+
+    conn = create_connection(argv[0])
+    target = int(argv[1]) if len(argv) > 1 else None
+    before = current_version(conn)
+    after = migrate(conn, target, verbose=True)
+    conn.close()
+    print(f"Schema version: {before} -> {after} (latest {latest_version()})")
+    return 0 if after == (latest_version() if target is None else target) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
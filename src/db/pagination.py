@@ -0,0 +1,112 @@
+from src.domain.models import Page
+
+#   Keyset (seek) pagination.
+#
+#   A cursor never uses OFFSET: each page is fetched with
+#       <query> AND (k1, k2, ...) > (last k1, last k2, ...) ORDER BY k1, k2 ... LIMIT n + 1
+#   (or < / DESC for descending keys), starting from the last row of the
+#   page before. The extra row only tells whether another page exists. Going
+#   back runs the same seek from the first row of the current page in the
+#   opposite direction. With an index on the key every page costs the same,
+#   however deep into the result it is, and only one page is ever in memory.
+#   The total row count is a separate COUNT(*) run on first request only.
+#
+#   The key must be unique per row (end it with a primary key column).
+
+
+class KeysetCursor:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool to read from.
+    #       select (str): SELECT ... FROM ... WHERE <filter> (no ORDER BY / LIMIT).
+    #       params (list): Positional parameters of `select`.
+    #       key (list[str]): Key expressions, most significant first.
+    #       descending (bool): Order all key columns descending.
+    #       page_size (int): Rows per page.
+    #       key_columns (list[str]): Result columns holding the key values
+    #           (default: the part of each key expression after the last '.').
+    def __init__(self, pool, select, params, key, descending=False, page_size=5, key_columns=None):
+        self.pool = pool
+        self.select = select
+        self.params = list(params)
+        self.key = list(key)
+        self.descending = descending
+        self.page_size = page_size
+        self.key_columns = key_columns or [k.rsplit(".", 1)[-1] for k in self.key]
+        self.page = None
+        self._total = None
+
+    #   Build the seek statement.
+    #   Args:
+    #       after (list): Key of the row to continue from, or None for the first page.
+    #       forward (bool): Walk in the cursor's order (True) or against it.
+    def _sql(self, after, forward):
+        ascending = forward != self.descending
+        sql = self.select
+        params = list(self.params)
+        if after is not None:
+            key = ", ".join(self.key)
+            marks = ", ".join("?" * len(after))
+            sql += f" AND ({key}) {'>' if ascending else '<'} ({marks})"
+            params += list(after)
+        direction = "ASC" if ascending else "DESC"
+        sql += " ORDER BY " + ", ".join(f"{k} {direction}" for k in self.key)
+        sql += " LIMIT ?;"
+        params.append(self.page_size + 1)
+        return sql, params
+
+    def _fetch(self, after, forward):
+        sql, params = self._sql(after, forward)
+        with self.pool.reader() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+        return rows, more
+
+    def _key_of(self, row):
+        return [row[c] for c in self.key_columns]
+
+    #   First page of the result.
+    def first(self) -> Page:
+        rows, more = self._fetch(None, True)
+        self.page = Page(rows=rows, number=0, has_prev=False, has_next=more)
+        return self.page
+
+    #   Page after the current one; stays on the last page when there is none.
+    def next(self) -> Page:
+        if self.page is None:
+            return self.first()
+        if not self.page.has_next:
+            return self.page
+        rows, more = self._fetch(self._key_of(self.page.rows[-1]), True)
+        if not rows:
+            #   the rows after this page were deleted meanwhile
+            self.page.has_next = False
+            return self.page
+        self.page = Page(rows=rows, number=self.page.number + 1, has_prev=True, has_next=more)
+        return self.page
+
+    #   Page before the current one; stays on the first page when there is none.
+    def prev(self) -> Page:
+        if self.page is None:
+            return self.first()
+        if not self.page.has_prev:
+            return self.page
+        rows, more = self._fetch(self._key_of(self.page.rows[0]), False)
+        if not rows:
+            return self.first()
+        self.page = Page(rows=rows, number=self.page.number - 1, has_prev=more, has_next=True)
+        return self.page
+
+    #   Total number of rows in the result (counted once, on first call).
+    def total(self) -> int:
+        if self._total is None:
+            with self.pool.reader() as conn:
+                self._total = conn.execute(f"SELECT COUNT(*) FROM ({self.select});", self.params).fetchone()[0]
+        return self._total
+
+    #   Number of pages (0 for an empty result).
+    def page_count(self) -> int:
+        return -(-self.total() // self.page_size)
@@ -0,0 +1,344 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.db.instrumentation import profiler
+
+#   Connection pool for the store.
+#
+#   One writer connection (WAL journal) and a small set of read-only reader
+#   connections. In WAL mode readers never block the writer and the writer
+#   never blocks readers, so checkouts and browsing can run side by side.
+#
+#       pool = ConnectionPool("data/store.db")
+#       with pool.reader() as conn:     # read-only, shared by many threads
+#           ...
+#       with pool.writer() as conn:     # exclusive within the process
+#           ...                         # committed on exit, rolled back on error
+#
+#   writer() is re-entrant per thread, and reader() called while the thread
+#   holds the writer returns the writer connection, so a method running
+#   inside a write transaction sees its own uncommitted changes.
+#
+#   Group commit: writer(group=True) (used by src/db/unit_of_work.py) does
+#   not commit on exit. The open transaction becomes a Batch that the next
+#   units of work join; it is committed once for all of them by
+#   commit_batch(), or by the next plain writer() call before it starts.
+
+#   Pragmas applied to every connection.
+DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,       #   ms to wait for a lock held by another process
+    "synchronous": "NORMAL",    #   durable at checkpoint; safe with WAL
+    "temp_store": "MEMORY",
+    "cache_size": -16000,       #   16 MB page cache per connection
+}
+
+#   Seconds a pooled connection may sit idle before it is health-checked again.
+HEALTH_CHECK_AFTER = 30.0
+
+
+#   URI that opens `db_path` read-only. Path.as_uri() percent-encodes the
+#   path, so names with '?', '#' or '%' can't be taken for URI syntax.
+def readonly_uri(db_path):
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+#   Raised when no connection becomes free in time. Subclasses
+#   sqlite3.OperationalError so the repository's `except sqlite3.Error` handles it.
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+#   Units of work sharing one pending commit.
+class Batch:
+
+    def __init__(self):
+        self.units = 0
+        self.done = threading.Event()
+        self.error = None           #   set if the commit (or the transaction) failed
+
+
+class ConnectionPool:
+
+    #   Args:
+    #       db_path (str): Database file.
+    #       readers (int): Maximum number of read-only connections.
+    #       busy_timeout (float): Seconds to wait for a lock / a free connection.
+    #       pragmas (dict): Extra or overriding per-connection pragmas.
+    def __init__(self, db_path, readers=4, busy_timeout=5.0, pragmas=None):
+        self.db_path = str(db_path)
+        self.max_readers = max(1, readers)
+        self.busy_timeout = busy_timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas["busy_timeout"] = int(busy_timeout * 1000)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._single = None
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._last_used = {}
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._batch = None
+        self.batches = 0
+
+        self._writer = self._open(read_only=False)
+        self._writer.execute("PRAGMA journal_mode = WAL;")
+        self._last_used[id(self._writer)] = time.monotonic()
+
+    #   Wrap an existing connection (e.g. ":memory:") as a pool where reader()
+    #   and writer() both hand out that one connection.
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection):
+        pool = cls.__new__(cls)
+        pool.db_path = None
+        pool.max_readers = 1
+        pool.busy_timeout = 5.0
+        pool.pragmas = {}
+        pool._single = conn
+        pool._readers = None
+        pool._reader_count = 0
+        pool._reader_lock = threading.Lock()
+        pool._last_used = {}
+        pool._write_lock = threading.Lock()
+        pool._local = threading.local()
+        pool._closed = False
+        pool._batch = None
+        pool.batches = 0
+        pool._writer = conn
+        #   as in _open(): no-op unless profiling is on
+        conn.set_trace_callback(profiler.trace)
+        return pool
+
+    #   Open and configure a new connection.
+    def _open(self, read_only):
+        if read_only:
+            conn = sqlite3.connect(readonly_uri(self.db_path), uri=True, timeout=self.busy_timeout, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value};")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1;")
+        #   no-op unless profiling is on (src/db/instrumentation.py)
+        conn.set_trace_callback(profiler.trace)
+        return conn
+
+    #   A read-only connection of its own, outside the pool, for a caller that
+    #   needs the same connection on every call (e.g. PRAGMA data_version).
+    #   The caller closes it. None in single-connection mode.
+    def open_dedicated_reader(self):
+        if self._single is not None:
+            return None
+        return self._open(read_only=True)
+
+    #   True if the connection still answers a trivial query.
+    @staticmethod
+    def ping(conn) -> bool:
+        try:
+            conn.execute("SELECT 1;").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    #   Check a connection that has been idle for a while; reopen it if broken.
+    def _checked(self, conn, read_only):
+        last = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last < HEALTH_CHECK_AFTER or self.ping(conn):
+            return conn
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        return self._open(read_only)
+
+    #   The writer connection held by the calling thread, or None.
+    def current_writer(self):
+        if getattr(self._local, "depth", 0) > 0:
+            return self._writer
+        return None
+
+    #   Borrow the writer connection. Exclusive within this process;
+    #   other processes are serialized by SQLite's busy timeout.
+    #   The outermost exit commits any open transaction, or rolls it back on error.
+    #   With group=True the outermost exit leaves the transaction open and adds
+    #   the caller to the pending Batch instead (see joined_batch()).
+    @contextmanager
+    def writer(self, group=False):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            if not self._write_lock.acquire(timeout=self.busy_timeout):
+                raise PoolTimeout("timed out waiting for the writer connection")
+            self._local.batch = None
+            if self._batch is not None and not group:
+                #   commit the pending units before anything else runs on the connection
+                self._end_batch()
+            if self._single is None and self._batch is None:
+                self._writer = self._checked(self._writer, read_only=False)
+        self._local.depth = depth + 1
+        try:
+            yield self._writer
+            if depth == 0:
+                if group:
+                    self._join_batch()
+                elif self._writer.in_transaction:
+                    self._writer.commit()
+        except BaseException:
+            if depth == 0:
+                if group:
+                    #   the unit has undone its own work; the batch stays valid
+                    self._join_batch()
+                elif self._writer.in_transaction:
+                    self._writer.rollback()
+            raise
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._last_used[id(self._writer)] = time.monotonic()
+                self._write_lock.release()
+
+    #   Add the calling unit to the pending batch. Call with the writer held.
+    def _join_batch(self):
+        batch = self._batch
+        if not self._writer.in_transaction:
+            #   SQLite rolled the transaction back (e.g. disk full): so are the earlier units
+            if batch is not None:
+                self._batch = None
+                batch.error = sqlite3.OperationalError("group commit transaction was rolled back")
+                batch.done.set()
+            return
+        if batch is None:
+            batch = self._batch = Batch()
+        batch.units += 1
+        self._local.batch = batch
+
+    #   Commit (or fail) the pending batch. Call with the writer held.
+    def _end_batch(self):
+        batch, self._batch = self._batch, None
+        error = None
+        try:
+            if self._writer.in_transaction:
+                self._writer.commit()
+        except sqlite3.Error as e:
+            error = e
+            if self._writer.in_transaction:
+                self._writer.rollback()
+        self.batches += 1
+        batch.error = error
+        batch.done.set()
+
+    #   The batch the calling thread's last writer(group=True) joined, or None
+    #   if it left no transaction open.
+    def joined_batch(self):
+        return getattr(self._local, "batch", None)
+
+    #   Commit `batch` now unless another thread already has.
+    def commit_batch(self, batch):
+        if batch.done.is_set():
+            return
+        with self.writer():
+            #   entering writer() commits whatever batch is pending
+            pass
+
+    #   Borrow a read-only connection (the writer if this thread holds it).
+    @contextmanager
+    def reader(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        held = self.current_writer()
+        if held is not None:
+            yield held
+            return
+        if self._single is not None:
+            with self.writer() as conn:
+                yield conn
+            return
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._readers.put(conn)
+
+    def _acquire_reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < self.max_readers:
+                    self._reader_count += 1
+                    try:
+                        conn = self._open(read_only=True)
+                    except sqlite3.Error:
+                        self._reader_count -= 1
+                        raise
+            if conn is None:
+                try:
+                    conn = self._readers.get(timeout=self.busy_timeout)
+                except queue.Empty:
+                    raise PoolTimeout("timed out waiting for a reader connection")
+        return self._checked(conn, read_only=True)
+
+    #   Ping every idle connection, replacing broken ones.
+    #   Returns:
+    #           dict: {"writer": bool, "readers": int healthy, "replaced": int}
+    def health_check(self):
+        status = {"writer": False, "readers": 0, "replaced": 0}
+        with self.writer() as conn:
+            status["writer"] = self.ping(conn)
+        if self._readers is None:
+            return status
+        idle = []
+        while True:
+            try:
+                idle.append(self._readers.get_nowait())
+            except queue.Empty:
+                break
+        for conn in idle:
+            if self.ping(conn):
+                status["readers"] += 1
+            else:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = self._open(read_only=True)
+                status["replaced"] += 1
+            self._readers.put(conn)
+        return status
+
+    #   Close every connection. Borrowed readers are closed as they come back.
+    def close(self):
+        if self._closed:
+            return
+        if self._batch is not None and self._write_lock.acquire(timeout=self.busy_timeout):
+            try:
+                if self._batch is not None:
+                    self._end_batch()
+            finally:
+                self._write_lock.release()
+        self._closed = True
+        if self._readers is not None:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+        self._writer.close()
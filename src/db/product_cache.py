@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+
+#   Read-through LRU cache of product rows (pid, name, category, price,
+#   stock_count, descr), shared by every thread of one dbFunctions.
+#
+#   Entries are plain dicts; callers get a copy, so nothing outside can
+#   change a cached row. Writes made through the repository keep the cache
+#   exact: they call invalidate()/update() after their transaction commits.
+#
+#   A miss reads the row outside the lock. If a write invalidates anything
+#   while that read is in flight, the row it read may predate the write, so
+#   it is returned to the caller but not cached (the `_epoch` check).
+#   Writes by other processes are picked up through `watcher`, a
+#   ChangeWatcher polled before every lookup (src/db/change_watcher.py).
+#
+#   A miss inside a unit of work reads on the writer, which may see the unit's
+#   uncommitted writes. Such rows are returned but never cached: a rollback
+#   does not change PRAGMA data_version, so nothing would evict them.
+
+PRODUCT_COLUMNS = ("pid", "name", "category", "price", "stock_count", "descr")
+
+_SELECT_ONE = "SELECT pid, name, category, price, stock_count, descr FROM products WHERE pid = ?;"
+_SELECT_MANY = "SELECT pid, name, category, price, stock_count, descr FROM products WHERE pid IN ({marks});"
+
+
+class ProductCache:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool that misses are read from.
+    #       capacity (int): Maximum number of cached products (least recently used go first).
+    def __init__(self, pool, capacity=1024):
+        self.pool = pool
+        self.capacity = capacity
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.watcher = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    #   One product by pid.
+    #   Returns:
+    #           dict or None: Product row, None if there is no such product.
+    #   Raises:
+    #           sqlite3.Error: On a database error during a miss.
+    def get(self, pid):
+        if self.watcher is not None:
+            self.watcher.poll()
+        with self._lock:
+            row = self._rows.get(pid)
+            if row is not None:
+                self._rows.move_to_end(pid)
+                self.hits += 1
+                return dict(row)
+            self.misses += 1
+            epoch = self._epoch
+
+        with self.pool.reader() as conn:
+            found = conn.execute(_SELECT_ONE, (pid,)).fetchone()
+            committed = self._committed(conn)
+        if found is None:
+            return None
+        row = dict(zip(PRODUCT_COLUMNS, found))
+        if committed:
+            self._store({pid: row}, epoch)
+        return dict(row)
+
+    #   Several products at once; one query for all the misses.
+    #   Returns:
+    #           dict: pid -> product row, for the pids that exist.
+    def get_many(self, pids):
+        if self.watcher is not None:
+            self.watcher.poll()
+        found = {}
+        missing = []
+        with self._lock:
+            for pid in pids:
+                row = self._rows.get(pid)
+                if row is not None:
+                    self._rows.move_to_end(pid)
+                    self.hits += 1
+                    found[pid] = dict(row)
+                else:
+                    self.misses += 1
+                    missing.append(pid)
+            epoch = self._epoch
+
+        if missing:
+            sql = _SELECT_MANY.format(marks=",".join("?" * len(missing)))
+            with self.pool.reader() as conn:
+                loaded = {r[0]: dict(zip(PRODUCT_COLUMNS, r)) for r in conn.execute(sql, missing)}
+                committed = self._committed(conn)
+            if committed:
+                self._store(loaded, epoch)
+            found.update({pid: dict(row) for pid, row in loaded.items()})
+        return found
+
+    #   False if `conn` is the calling thread's writer with a transaction open.
+    def _committed(self, conn):
+        return not (conn is self.pool.current_writer() and conn.in_transaction)
+
+    def _store(self, rows, epoch):
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            for pid, row in rows.items():
+                self._rows[pid] = row
+                self._rows.move_to_end(pid)
+            while len(self._rows) > self.capacity:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+    #   Drop the given products (all of them when called without arguments).
+    def invalidate(self, *pids):
+        with self._lock:
+            self._epoch += 1
+            if not pids:
+                self.invalidations += len(self._rows)
+                self._rows.clear()
+                return
+            for pid in pids:
+                if self._rows.pop(pid, None) is not None:
+                    self.invalidations += 1
+
+    #   Apply a committed change to a cached product, e.g. update(pid, stock_count=3).
+    #   Products that are not cached are left alone.
+    def update(self, pid, **fields):
+        with self._lock:
+            self._epoch += 1
+            row = self._rows.get(pid)
+            if row is not None:
+                row.update(fields)
+
+    #   Hit/miss statistics.
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._rows),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,263 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from src.db.migrations import migrate
+from src.db.repository import dbFunctions
+from src.db.search_index import ensure_search_index
+from src.domain.models import SessionInf
+
+#   Query-plan regression check for the repository.
+#
+#   Copies the store into memory, applies the migrations, then drives every
+#   dbFunctions method once while a trace callback records the SQL it sends.
+#   Each recorded statement is run through EXPLAIN QUERY PLAN; a plain
+#   "SCAN <table>" (no index) in a hot method fails the check.
+#
+#   Usage: python -m src.db.query_plan data/store.db
+
+#   Every SCAN walks the whole table: "SCAN orders", "SCAN o", and also the
+#   index walks "SCAN ol USING INDEX ..." / "SCAN ol USING COVERING INDEX ..."
+#   (an index only avoids a sort there, not reading every row). Only SEARCH
+#   (an index seek on col=? or a range) and virtual tables (FTS) don't count.
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \S+)?$")
+_DERIVED = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)")
+
+#   Methods whose statements may scan a whole table on purpose.
+#   Keep this list short; every entry needs a reason.
+ALLOWED_SCANS = {
+    #   loads every order and order line once for the vectorized analytics
+    "customer_analytics": {"orders", "orderlines"},
+    #   1-2 character keywords are too short for the FTS trigrams and fall back to
+    #   LIKE on every product (plans name the table by its alias, products p)
+    "search_product": {"p"},
+    "search_product_cursor": {"p"},
+    #   one ordered pass over every session and its events, in primary-key order
+    "conversion_funnel": {"sessions", "search", "viewedProduct", "cartedSession"},
+}
+
+#   Methods that issue no SQL of their own worth planning.
+_SKIP_METHODS = {"close", "commit", "rollback", "transaction"}
+
+_DML = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+#   Copy the database file into a private in-memory connection.
+def _memory_copy(db_path):
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(":memory:")
+    src.backup(dst)
+    src.close()
+    dst.row_factory = sqlite3.Row
+    return dst
+
+
+#   Build the list of (method, call) steps that exercise the repository.
+#   Steps run in order and share state through `ctx`.
+def _scenario(repo: dbFunctions, conn: sqlite3.Connection):
+
+    cid = conn.execute("SELECT cid FROM customers ORDER BY cid LIMIT 1;").fetchone()[0]
+    pid = conn.execute("SELECT pid FROM products WHERE stock_count > 0 ORDER BY pid LIMIT 1;").fetchone()[0]
+    email = conn.execute("SELECT email FROM customers WHERE cid = ?;", (cid,)).fetchone()[0]
+    ctx = {}
+
+    def new_customer():
+        ctx["user"] = repo.insert_customer("Plan Check", "plan.check@example.com", "pw")
+        return ctx["user"]
+
+    def new_session():
+        ctx["session"] = repo.create_session(ctx["user"].uid)
+        return ctx["session"]
+
+    def new_order():
+        ctx["ono"] = repo.create_order(ctx["session"], "1 Plan St")
+        return ctx["ono"]
+
+    #   every statement a cursor can send: first page, seek forward, seek back, count
+    def walk(cursor):
+        cursor.first()
+        cursor.next()
+        cursor.prev()
+        return cursor.total()
+
+    #   one update of an existing product and one insert
+    def import_feed():
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "feed.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"pid": pid, "price": 2.5}) + "\n")
+                f.write(json.dumps({"pid": 999999, "name": "Plan Lamp", "category": "Home",
+                                    "price": 5, "stock_count": 1}) + "\n")
+            return repo.import_products(path)
+
+    #   the report methods again, uncached, inside one read snapshot
+    def reports_in_snapshot():
+        with repo.report_snapshot() as snap:
+            repo.weekly_sales_metrics("day")
+            repo.top_products_by_distinct_orders()
+            repo.top_products_by_views()
+            return snap
+
+    return [
+        ("get_user_inf", lambda: repo.get_user_inf(cid)),
+        ("get_customer_inf", lambda: repo.get_customer_inf(cid)),
+        ("login_verify", lambda: repo.login_verify(cid)),
+        ("check_email", lambda: repo.check_email(email.lower())),
+        ("insert_customer", new_customer),
+        ("create_session", new_session),
+        ("create_search", lambda: repo.create_search("plan check", ctx["session"])),
+        ("search_product", lambda: repo.search_product(["phone"], SessionInf(ctx["user"].uid, ctx["session"].sessionNo + 1))),
+        ("search_product_cursor", lambda: walk(repo.search_product_cursor(["phone"], SessionInf(ctx["user"].uid, ctx["session"].sessionNo + 2), page_size=1))),
+        ("search_product_cursor", lambda: walk(repo.search_product_cursor(["phone"], SessionInf(ctx["user"].uid, ctx["session"].sessionNo + 3), page_size=1, ranked=False))),
+        ("search_product", lambda: repo.search_product(["tv"], SessionInf(ctx["user"].uid, ctx["session"].sessionNo + 4))),
+        ("search_product_cursor", lambda: walk(repo.search_product_cursor(["tv"], SessionInf(ctx["user"].uid, ctx["session"].sessionNo + 5), page_size=1))),
+        ("get_product_details", lambda: repo.get_product_details(pid)),
+        ("get_product_by_pid", lambda: repo.get_product_by_pid(pid)),
+        ("create_viewed_product", lambda: repo.create_viewed_product(ctx["session"], pid)),
+        ("flush_events", lambda: repo.flush_events()),
+        ("check_add_to_cart", lambda: repo.check_add_to_cart(ctx["session"], pid)),
+        ("check_stock", lambda: repo.check_stock(pid)),
+        ("add_to_cart", lambda: repo.add_to_cart(ctx["session"], pid, 1, "add")),
+        ("get_cart_items", lambda: repo.get_cart_items(ctx["session"])),
+        ("create_order", new_order),
+        ("checkout", lambda: repo.checkout(ctx["session"], "1 Plan St")),
+        ("get_orders", lambda: repo.get_orders(ctx["user"].uid)),
+        ("get_orders_cursor", lambda: walk(repo.get_orders_cursor(cid, page_size=1))),
+        ("get_order_details", lambda: repo.get_order_details(ctx["ono"])),
+        ("delete_cart_items", lambda: repo.delete_cart_items(ctx["session"], pid)),
+        ("clear_cart", lambda: repo.clear_cart(ctx["session"])),
+        ("update_session", lambda: repo.update_session(ctx["session"])),
+        ("end_session", lambda: repo.end_session(ctx["session"])),
+        ("update_product_price", lambda: repo.update_product_price(pid, 1.0)),
+        ("update_product_stock", lambda: repo.update_product_stock(pid, 10)),
+        ("import_products", import_feed),
+        ("weekly_sales_metrics", lambda: repo.weekly_sales_metrics()),
+        ("sales_metrics", lambda: repo.sales_metrics("2025-01-01", "2025-12-31", "week")),
+        ("sales_metrics", lambda: repo.sales_metrics("2025-01-01", "2025-12-31", "week", source="raw")),
+        ("category_sales", lambda: repo.category_sales("2025-01-01", "2025-12-31")),
+        ("customer_analytics", lambda: repo.customer_analytics()),
+        ("customer_analytics", lambda: repo.customer_analytics("2025-01-01", "2025-12-31")),
+        ("conversion_funnel", lambda: repo.conversion_funnel()),
+        ("conversion_funnel", lambda: repo.conversion_funnel("2025-01-01", "2025-12-31")),
+        ("top_products_by_distinct_orders", lambda: repo.top_products_by_distinct_orders()),
+        ("top_products_by_views", lambda: repo.top_products_by_views()),
+        ("report_snapshot", reports_in_snapshot),
+    ]
+
+
+#   Run the scenario and capture the statements each method sent.
+#   Returns:
+#           tuple[list[tuple[str, str]], list[str]]: (method, sql) in execution
+#           order, and the names of all methods called.
+def collect_statements(conn: sqlite3.Connection):
+
+    repo = dbFunctions(conn)
+    steps = _scenario(repo, conn)
+    captured = []
+    current = [None]
+
+    def trace(sql):
+        if current[0] and sql.lstrip().upper().startswith(_DML):
+            captured.append((current[0], sql))
+
+    conn.set_trace_callback(trace)
+    try:
+        for method, call in steps:
+            current[0] = method
+            call()
+    finally:
+        current[0] = None
+        conn.set_trace_callback(None)
+    return captured, [method for method, _ in steps]
+
+
+#   EXPLAIN QUERY PLAN one statement.
+#   Returns:
+#           list[str]: Plan detail lines.
+def explain(conn: sqlite3.Connection, sql):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+#   Names of the full-table scans in a plan. Scans of CTEs and subqueries
+#   (built by a CO-ROUTINE or MATERIALIZE step of the same plan) don't count.
+def full_scans(plan):
+    derived = {"CONSTANT"}
+    for detail in plan:
+        m = _DERIVED.match(detail.strip())
+        if m:
+            derived.add(m.group(1))
+    tables = []
+    for detail in plan:
+        m = _FULL_SCAN.match(detail.strip())
+        if m and m.group(1) not in derived:
+            tables.append(m.group(1))
+    return tables
+
+
+#   Public repository methods the scenario never called.
+def uncovered_methods(called):
+    public = {name for name in vars(dbFunctions)
+              if callable(getattr(dbFunctions, name)) and not name.startswith("_")}
+    return sorted(public - set(called) - _SKIP_METHODS)
+
+
+#   Check every statement of the repository against its query plan.
+#   Args:
+#       db_path (str): Database to copy and check (not modified).
+#       verbose (bool): Print the plan of every statement.
+#   Returns:
+#           list[tuple[str, str, list[str]]]: (method, sql, plan) of each regression.
+def check(db_path, verbose=False):
+
+    conn = _memory_copy(db_path)
+    migrate(conn)
+    ensure_search_index(conn)
+
+    captured, called = collect_statements(conn)
+    failures = []
+    seen = set()
+    for method, sql in captured:
+        key = (method, sql)
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            print(f"[!] Could not explain statement from {method}(): {e}")
+            continue
+        scans = [t for t in full_scans(plan) if t not in ALLOWED_SCANS.get(method, ())]
+        if verbose or scans:
+            status = "FULL SCAN" if scans else "ok"
+            print(f"\n[{status}] {method}()\n  {' '.join(sql.split())}")
+            for detail in plan:
+                print("    " + detail)
+        if scans:
+            failures.append((method, sql, plan))
+
+    missing = uncovered_methods(called)
+    if missing:
+        print("\n[!] Not exercised by the plan check: " + ", ".join(missing))
+
+    conn.close()
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python -m src.db.query_plan <db_path> [-v]")
+        return 1
+    failures = check(argv[0], verbose="-v" in argv[1:])
+    if failures:
+        print(f"\n[X] {len(failures)} statement(s) regressed to a full table scan.")
+        return 1
+    print("\n[✓] No full table scans in repository queries.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
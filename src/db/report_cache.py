@@ -0,0 +1,64 @@
+import copy
+import threading
+from collections import OrderedDict
+
+#   Small LRU cache for report results (sales metrics, top products, ...).
+#
+#   Every entry belongs to a topic ("sales", "views"); a write that affects a
+#   topic drops all of its entries at once (see src/db/change_watcher.py).
+#   Results are deep-copied in and out so callers may modify what they get.
+#   As in ProductCache, a result computed while its topic was invalidated is
+#   returned but not stored.
+#   Only writes seen by a ChangeWatcher invalidate entries, so without one
+#   (single-connection mode) nothing is cached and get() always computes.
+
+TOPICS = ("sales", "views")
+
+
+class ReportCache:
+
+    #   Args:
+    #       capacity (int): Maximum number of cached results over all topics.
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epochs = dict.fromkeys(TOPICS, 0)
+        self.watcher = None
+        self.hits = 0
+        self.misses = 0
+
+    #   Cached result for (topic, key), computing it with compute() on a miss.
+    #   Exceptions from compute() propagate and nothing is cached.
+    def get(self, topic, key, compute):
+        if self.watcher is None:
+            return compute()
+        self.watcher.poll()
+        with self._lock:
+            if (topic, key) in self._entries:
+                self._entries.move_to_end((topic, key))
+                self.hits += 1
+                return copy.deepcopy(self._entries[(topic, key)])
+            self.misses += 1
+            epoch = self._epochs[topic]
+
+        value = compute()
+        with self._lock:
+            if self._epochs[topic] == epoch:
+                self._entries[(topic, key)] = copy.deepcopy(value)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return value
+
+    #   Drop every entry of the given topics (all topics when called without arguments).
+    def invalidate(self, *topics):
+        with self._lock:
+            topics = topics or TOPICS
+            for topic in topics:
+                self._epochs[topic] += 1
+            for entry in [k for k in self._entries if k[0] in topics]:
+                del self._entries[entry]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
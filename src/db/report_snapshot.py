@@ -0,0 +1,103 @@
+import datetime as dt
+import sqlite3
+import time
+from contextlib import contextmanager
+
+#   Frozen views of the store for reports.
+#
+#   A report made of several queries (the weekly metrics, the two top-product
+#   lists, ...) must not see a checkout that commits between two of them.
+#   read_snapshot() gives every query of a report the same point in time:
+#
+#       "transaction"  a read transaction on a pooled WAL reader. Free to take;
+#                      the queries see the store as of the first read and
+#                      writers are never blocked. The reader (and the WAL
+#                      frames the snapshot needs) stay pinned until the block ends.
+#       "backup"       an online, incremental copy into memory with
+#                      Connection.backup(), `pages` pages per step. The source
+#                      reader is pinned in a read transaction while it copies:
+#                      without it SQLite restarts the backup every time another
+#                      connection commits, and a busy store never finishes.
+#                      Afterwards the reader goes back to the pool, so a long
+#                      report holds nothing on the store. Costs memory
+#                      and time proportional to the database size.
+#
+#   The snapshot's taken_at / age() are shown in the report headers.
+
+MODES = ("transaction", "backup")
+
+
+class ReportSnapshot:
+
+    #   Args:
+    #       conn (sqlite3.Connection): Connection every report query runs on.
+    #       mode (str): "transaction" or "backup".
+    #       copy_seconds (float): Time the backup took (0 for "transaction").
+    def __init__(self, conn, mode, copy_seconds=0.0):
+        self.conn = conn
+        self.mode = mode
+        self.copy_seconds = copy_seconds
+        self.taken_at = dt.datetime.now()
+        self._taken = time.monotonic()
+
+    #   Seconds since the snapshot was taken.
+    def age(self):
+        return time.monotonic() - self._taken
+
+    #   One line for a report header.
+    def describe(self):
+        how = "read transaction" if self.mode == "transaction" else f"backup copy, {self.copy_seconds:.2f}s"
+        return f"Snapshot taken {self.taken_at:%Y-%m-%d %H:%M:%S} ({self.age():.1f}s ago, {how})"
+
+
+#   Open a read transaction on `conn` and pin its snapshot with a first read
+#   (BEGIN alone takes no snapshot; reading the header does).
+def _pin(conn):
+    if not conn.in_transaction:
+        conn.execute("BEGIN;")
+    conn.execute("PRAGMA schema_version;").fetchone()
+
+
+#   Give a block one consistent view of the store.
+#   Args:
+#       pool (ConnectionPool): Pool to read from.
+#       mode (str): "transaction" or "backup" (see above).
+#       pages (int): Pages copied per backup step.
+#   Yields:
+#           ReportSnapshot
+#   Raises:
+#           sqlite3.Error: If the snapshot cannot be taken.
+@contextmanager
+def read_snapshot(pool, mode="transaction", pages=1024):
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+
+    if mode == "transaction":
+        with pool.reader() as conn:
+            own = not conn.in_transaction
+            _pin(conn)
+            try:
+                yield ReportSnapshot(conn, mode)
+            finally:
+                if own and conn.in_transaction:
+                    conn.rollback()
+        return
+
+    copy = sqlite3.connect(":memory:", check_same_thread=False)
+    copy.row_factory = sqlite3.Row
+    try:
+        with pool.reader() as conn:
+            own = not conn.in_transaction
+            _pin(conn)
+            #   the copy shows the store as of the pin, not as of the last step
+            snap = ReportSnapshot(copy, mode)
+            started = time.perf_counter()
+            try:
+                conn.backup(copy, pages=pages)
+            finally:
+                if own and conn.in_transaction:
+                    conn.rollback()
+            snap.copy_seconds = time.perf_counter() - started
+        yield snap
+    finally:
+        copy.close()
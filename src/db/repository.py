@@ -1,83 +1,137 @@
 import sqlite3
+import threading
 import datetime as dt
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Any
 
 from src.domain.models import User, SessionInf
-
+from src.db.analytics import customer_report
+from src.db.auth_cache import AuthCache, fetch_login
+from src.db.catalog_import import import_catalog
+from src.db.change_watcher import ChangeWatcher
+from src.db.checkout import place_order
+from src.db.column_store import open_snapshot
+from src.db.event_writer import EventWriter
+from src.db.funnel import funnel_report
+from src.db.instrumentation import instrument_methods
+from src.db.pagination import KeysetCursor
+from src.db.pool import ConnectionPool
+from src.db.product_cache import ProductCache
+from src.db.rollup import category_sales, rollup_sales_metrics
+from src.db.report_cache import ReportCache
+from src.db.report_snapshot import read_snapshot
+from src.db.sales_metrics import as_date, compute_sales_metrics
+from src.db.search_index import build_search_select, build_search_sql, has_search_index
+from src.db.sequences import IdAllocator
+from src.db.session_cart import CartStore
+from src.db.top_products import top_k
+from src.db.unit_of_work import UnitOfWork
+
+#   Raised inside insert_customer()'s unit of work to undo it.
+class _EmailTaken(Exception):
+    pass
+
+
+#   All data access for the app. Methods borrow a connection from the pool
+#   for the duration of one call: reads use a read-only connection, writes
+#   use the single writer connection (see src/db/pool.py). Writes that belong
+#   together run in one unit of work and are committed once (transaction()).
+#   Every public method is timed when profiling is on (src/db/instrumentation.py).
+@instrument_methods
 class dbFunctions:
-    def __init__(self, conn: sqlite3.Connection):
-        self.conn = conn
+
+    #   Args:
+    #       pool (ConnectionPool | sqlite3.Connection): Pool to borrow from; a bare
+    #           connection is wrapped so reads and writes share it.
+    #       cache_size (int): Products kept in the product cache.
+    #       snapshot_dir (str): Root of the columnar snapshots (src/db/column_store.py)
+    #           that customer analytics read instead of the live store, if given.
+    #       report_mode (str): Default report_snapshot() mode, "transaction" or "backup".
+    def __init__(self, pool, cache_size=1024, snapshot_dir=None, report_mode="transaction"):
+        if isinstance(pool, sqlite3.Connection):
+            pool = ConnectionPool.from_connection(pool)
+        self.pool = pool
+        self.ids = IdAllocator(pool)
+        self.uow = UnitOfWork(pool)
+        self.events = EventWriter(pool)
+        self.products = ProductCache(pool, cache_size)
+        self.reports = ReportCache()
+        self.users = AuthCache()
+        self.snapshot_dir = snapshot_dir
+        #   the report snapshot the calling thread is inside, if any (report_snapshot())
+        self._snapshot = threading.local()
+        self.report_mode = report_mode
+        #   carts live in memory and are written back in batches (src/db/session_cart.py)
+        self.carts = CartStore(pool)
+        #   evicts cache entries changed by other connections and processes
+        self.watcher = ChangeWatcher(pool, self.products, self.reports)
+        with self.pool.reader() as conn:
+            self.use_fts = has_search_index(conn)
 
     def close(self):
+        self.events.close()
+        self.carts.close()
+        self.watcher.close()
         try:
-            self.conn.close()
+            self.pool.close()
         except sqlite3.Error as e:
             print("\n[X] SQL Error in close database!\n")
             print(e)
 
+    #   Group several writes into one commit (see src/db/unit_of_work.py):
+    #       with repo.transaction():
+    #           repo.update_session(session)
+    #           repo.clear_cart(session)
+    #   Repository writes made inside join it as savepoints. Don't call
+    #   checkout() inside one: the order commits or rolls back on its own.
+    #   Yields:
+    #           sqlite3.Connection: The writer connection.
+    def transaction(self):
+        return self.uow.transaction()
+
+    #   Run several reports against one point in time (see src/db/report_snapshot.py):
+    #       with repo.report_snapshot() as snap:
+    #           metrics = repo.weekly_sales_metrics()
+    #           top = repo.top_products_by_distinct_orders()
+    #   Report methods called inside read the snapshot and skip the report
+    #   cache, whose entries may come from other moments. Buffered view/search
+    #   events are written first. Read-only: don't write inside the block.
+    #   Args:
+    #       mode (str): "transaction" (a pinned read transaction) or "backup"
+    #           (an in-memory copy made with the online backup API); report_mode if None.
+    #   Yields:
+    #           ReportSnapshot: The snapshot; a nested call yields the outer one.
+    @contextmanager
+    def report_snapshot(self, mode=None):
+        current = getattr(self._snapshot, "current", None)
+        if current is not None:
+            yield current
+            return
+        self.flush_events()
+        with read_snapshot(self.pool, mode or self.report_mode) as snap:
+            self._snapshot.current = snap
+            try:
+                yield snap
+            finally:
+                self._snapshot.current = None
+
+    #   Roll back the writer connection if the calling thread holds it.
+    #   Inside a unit of work the failed block's savepoint has already been undone.
+    def rollback(self):
+        conn = self.pool.current_writer()
+        if conn is not None and conn.in_transaction and not self.uow.depth():
+            conn.rollback()
+
+    #   Commit the writer connection if the calling thread holds it
+    #   (inside a unit of work, the unit commits).
     def commit(self):
         try:
-            self.conn.commit()
+            conn = self.pool.current_writer()
+            if conn is not None and not self.uow.depth():
+                conn.commit()
         except sqlite3.Error as e:
             print("\n[X] SQL Error in update database!\n")
             print(e)
-    #   Retrieve the next available user ID.
-    #   Returns:
-    #           int: Next uid (max(uid)+1) or 1 if table is empty.
-    def get_max_uid(self):
-
-        try:
-            cur = self.conn.execute("SELECT MAX(uid) FROM users;")
-            rs = cur.fetchone()[0]
-        except sqlite3.Error as e:
-            print("\n[X] SQL Error in get_max_uid()\n")
-            print(e)
-        
-        if rs is None:
-            uid = 1
-        else:
-            uid = rs + 1
-        return uid
-
-    #   Retrieve the next available session number for a customer.
-    #   Args:
-    #       cid (int): Customer ID.
-    #   Returns:
-    #           int: Next session number (max+1) or 1 if first login.
-    def get_max_sessionNo(self,cid):
-
-        try:
-            cur = self.conn.execute("SELECT MAX(sessionNo) FROM sessions WHERE cid = ?;",(cid,))
-            rs = cur.fetchone()[0]
-        except sqlite3.Error as e:
-            print("\n[X] SQL Error in get_max_sessionNo()\n")
-            print(e)
-
-        if rs is None:
-            sessionNo = 1
-        else:
-            sessionNo = rs + 1
-        return sessionNo
-    
-   
-    #   Retrieve the next available order number.
-    #   Returns:
-    #           int: Next order number (max+1) or 1 if table is empty.
-    def get_max_orderNo(self):
-
-        try:
-            cur = self.conn.execute("SELECT MAX(ono) FROM orders;")
-            rs = cur.fetchone()[0]
-        except sqlite3.Error as e:
-            print("\n[X] SQL Error in get_max_orderNo()\n")
-            print(e)
-        
-        if rs is None:
-            ono = 1
-        else:
-            ono = rs + 1
-        return ono
-   
     #   Get basic user information (uid, password, role).
     #   Args:
     #       uid (int): User ID.
@@ -86,11 +140,13 @@ class dbFunctions:
     def get_user_inf(self,uid):
 
         try:
-            cur = self.conn.execute("SELECT uid, pwd, role FROM users WHERE uid = ?;", (uid,))
+            with self.pool.reader() as conn:
+                cur = conn.execute("SELECT uid, pwd, role FROM users WHERE uid = ?;", (uid,))
+                return cur.fetchone()
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_user_inf()\n")
             print(e)
-        return cur.fetchone()
+            return None
     
     #   Get customer name by customer ID.
     #   Args:
@@ -100,21 +156,34 @@ class dbFunctions:
     def get_customer_inf(self,uid):
 
         try:
-            cur = self.conn.execute("SELECT name FROM customers WHERE cid = ?;", (uid,))
+            with self.pool.reader() as conn:
+                cur = conn.execute("SELECT name FROM customers WHERE cid = ?;", (uid,))
+                return cur.fetchone()
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_customer_inf()\n")
             print(e)
-        return cur.fetchone()
+            return None
     
     #   Verify user credentials.
+    #   The user and the customer profile are read with one query, and
+    #   resolved users are kept for a short time (see src/db/auth_cache.py).
     #   Args:
     #       uid (int): User ID to verify.
     #   Returns:
     #           User: A User object with uid, name, role, and password (plain text).
     def login_verify(self,uid):
-        
-        #   Get related user information according to entered uid
-        rs = self.get_user_inf(uid)
+
+        return self.users.get(uid, self._load_user)
+
+    def _load_user(self,uid):
+
+        try:
+            with self.pool.reader() as conn:
+                rs = fetch_login(conn, uid)
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in login_verify()\n")
+            print(e)
+            return None
 
         #   If uid does not have related user
         if rs is None:
@@ -123,16 +192,13 @@ class dbFunctions:
         pw = rs["pwd"]              #   Plain-text password from DB
         role = rs["role"].lower()
         name = 'Sales'              #   Default for salesperson
-
-        #   Retrieve customer name if role is 'customer'
         if role == 'customer':
-            #   Get customer information
-            rs2 = self.get_customer_inf(uid)
-            name = rs2["name"]
+            name = rs["name"]
 
         return User(uid = uid, name = name, role = role, psw = pw)
     
     #   Check if an email already exists in the customers table.
+    #   Emails are compared by their normalized key lower(trim(email)) (indexed, migration 8).
     #   Args:
     #       email (str): Email address to check.
     #   Returns:
@@ -140,40 +206,55 @@ class dbFunctions:
     def check_email(self,email):
         
         try:
-            cur = self.conn.execute("SELECT cid FROM customers WHERE LOWER(email) = ?;", (email,))
+            with self.pool.reader() as conn:
+                cur = conn.execute("SELECT cid FROM customers WHERE lower(trim(email)) = lower(trim(?));", (email,))
+                return cur.fetchone()
         except sqlite3.Error as e:
             print("\n[X] SQL Error in check_email()\n")
             print(e)
-
-        return cur.fetchone()
+            return None
     
     #   Register a new customer by inserting into both 'users' and 'customers'.
+    #   The email is stored trimmed and lower-cased. The customer row is only
+    #   inserted if no customer has the same email key, checked in the same
+    #   write transaction, so two concurrent sign-ups cannot both get it.
+    #   The uid reservation and both rows are committed together.
     #   Args:
     #       userName (str): Customer name.
     #       email (str): Email address.
     #       password (str): Plain-text password (per TA’s requirement).
     #   Returns:
-    #           User: Newly created User object.
+    #           User or None: Newly created User object, None if the email is already registered.
     def insert_customer(self,userName,email,password):
 
-        #   Get uid
-        uid = self.get_max_uid()
         role = 'customer'       #   Default set role as customer
+        email = email.strip().lower()
+        uid = None
         try:
-            #   Insert user login info
-            cur = self.conn.execute("INSERT INTO users (uid,pwd,role) VALUES (?,?,?);", (uid,password,role))
-            #  Insert customer info
-            cur = self.conn.execute("INSERT INTO customers (cid,name,email) VALUES (?,?,?);", (uid,userName,email,))
-            self.commit()
+            with self.transaction() as conn:
+                #   Get uid
+                uid = self.ids.next_id("uid")
+                #   Insert user login info
+                cur = conn.execute("INSERT INTO users (uid,pwd,role) VALUES (?,?,?);", (uid,password,role))
+                #  Insert customer info
+                cur = conn.execute("""INSERT INTO customers (cid,name,email)
+                                      SELECT ?,?,? WHERE NOT EXISTS (
+                                          SELECT 1 FROM customers WHERE lower(trim(email)) = lower(trim(?)));""",
+                                   (uid,userName,email,email))
+                if cur.rowcount == 0:
+                    raise _EmailTaken()
+        except _EmailTaken:
+            return None
         except sqlite3.Error as e:
             print("\n[X] SQL Error in insert_customer()\n")
             print(e)
-            self.conn.rollback()
+            self.rollback()
 
         return User(uid = uid, name = userName, role = role, psw = password)
 
     #   Create a new session record for the given customer.
-    #   The end_time remains NULL until logout.
+    #   The end_time remains NULL until logout. The session number is
+    #   reserved and the row inserted in one commit.
     #   Args:
     #       cid (int): Customer ID.
     #   Returns:
@@ -182,17 +263,19 @@ class dbFunctions:
         
         #   Set up all required values before insert into sessions tables
         ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        session = self.get_max_sessionNo(cid)
+        session = None
         try:
-            cur = self.conn.execute("INSERT INTO sessions (cid,sessionNo,start_time,end_time) VALUES (?,?,?,NULL);",(cid,session,ts,))
-            self.commit()
+            with self.transaction() as conn:
+                session = self.ids.next_id("sessionNo", cid)
+                cur = conn.execute("INSERT INTO sessions (cid,sessionNo,start_time,end_time) VALUES (?,?,?,NULL);",(cid,session,ts,))
         except sqlite3.Error as e:
             print("\n[X] SQL Error in create_session()\n")
             print(e)
-            self.conn.rollback()            
+            self.rollback()            
         return SessionInf(cid = cid,sessionNo = session)
     
-    #   Update the end_time for the specified session (called at logout).
+    #   Update the end_time for the specified session (called at logout)
+    #   and write back its cart, in one commit.
     #   Args:
     #       sessionInformation (SessionInf): Object with cid and sessionNo.
     def update_session(self,sessionInformation):
@@ -201,56 +284,85 @@ class dbFunctions:
         session = sessionInformation.sessionNo
         cid = sessionInformation.cid
         try:
-            cur = self.conn.execute("UPDATE sessions SET end_time = ? where cid = ? AND sessionNo = ? ;",(ts,cid,session,))
-            self.commit()
+            with self.transaction() as conn:
+                try:
+                    self.carts.flush_locked(conn, sessionInformation)
+                    cur = conn.execute("UPDATE sessions SET end_time = ? where cid = ? AND sessionNo = ? ;",(ts,cid,session,))
+                except BaseException:
+                    self.carts.resync(sessionInformation)
+                    raise
+            self.carts.drop(sessionInformation)
         except sqlite3.Error as e:
             print("\n[X] SQL Error in update_session()\n")
-            self.conn.rollback()
+            self.carts.resync(sessionInformation)
+            self.rollback()
+            print(e)
+
+    #   End a session (logout, exit): empty its cart and set its end_time,
+    #   committed together.
+    #   Args:
+    #       sessionInformation (SessionInf): Session to end.
+    def end_session(self,sessionInformation):
+
+        try:
+            with self.transaction():
+                #   cleared first, so update_session() has no cart lines left to write
+                self.clear_cart(sessionInformation)
+                self.update_session(sessionInformation)
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in end_session()\n")
             print(e)
 
     #   Record a customer's search activity in the 'search' table.
+    #   The row is buffered and written in a batch (see src/db/event_writer.py).
     #   Args:
     #       search (str): Search query string.
     #       sessionInformation (SessionInf): Current session details.
     def create_search(self,search,sessionInformation):
-        
-        ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            cur = self.conn.execute("INSERT INTO search (cid,sessionNo,ts,query) VALUES (?,?,?,?);",(sessionInformation.cid,sessionInformation.sessionNo,ts,search))
-            self.commit()
-        except sqlite3.Error as e:
-            print("\n[X]SQL Error in create_search()\n")
-            self.conn.rollback()
-            print(e)
+
+        self.events.record_search(sessionInformation,search)
 
     #   Perform a case-insensitive keyword search on products.
+    #   Every keyword must occur in the product name or description.
+    #   Uses the products_fts full-text index when available (see search_index).
     #   Records the search in the database.
     #   Args:
-    #       conditions (list): List of SQL WHERE conditions.
-    #       params (list): List of parameters for prepared statement.
+    #       keywords (list[str]): Search keywords.
     #       sessionInformation (SessionInf): Current session info.
+    #       ranked (bool): True orders by relevance, False keeps the old pid order.
     #   Returns:
     #          list[sqlite3.Row]: Matching product records.
-    def search_product(self,conditions,params,sessionInformation):
+    def search_product(self,keywords,sessionInformation,ranked=True):
 
-        words = " ".join([p.strip('%') for p in params[::2]])
+        words = " ".join(keywords)
         self.create_search(words,sessionInformation)
-        where_clause = " AND ".join(conditions)
 
-        sql = (
-            "SELECT pid, name, category, price, stock_count "
-            "FROM products "
-            "WHERE " + where_clause + ";"
-        )
+        sql, params = build_search_sql(keywords, ranked=ranked, use_fts=self.use_fts)
         try:
-            cur = self.conn.execute(sql, params)
-            rs = cur.fetchall()
-            return rs
+            with self.pool.reader() as conn:
+                cur = conn.execute(sql, params)
+                rs = cur.fetchall()
+                return rs
         except sqlite3.Error as e:
             print("\n[X] SQL Error in search_product()\n")
             print(e)
             return None   
     
+    #   Search products page by page instead of fetching every match.
+    #   The search is recorded once, like search_product().
+    #   Args:
+    #       keywords (list[str]): Search keywords.
+    #       sessionInformation (SessionInf): Current session information.
+    #       page_size (int): Products per page.
+    #       ranked (bool): Order by relevance (bm25) instead of by pid.
+    #   Returns:
+    #           KeysetCursor: call first()/next()/prev() for pages, total() for the match count.
+    def search_product_cursor(self,keywords,sessionInformation,page_size=5,ranked=True):
+
+        self.create_search(" ".join(keywords),sessionInformation)
+        sql, params, key, key_columns = build_search_select(keywords, ranked=ranked, use_fts=self.use_fts)
+        return KeysetCursor(self.pool, sql, params, key, page_size=page_size, key_columns=key_columns)
+
     #   Retrieve detailed product information by product ID.
     #   Args:
     #       pid (int): Product ID.
@@ -259,41 +371,38 @@ class dbFunctions:
     def get_product_details(self,pid):
 
         try:
-            cur = self.conn.execute("SELECT name, category, price, stock_count,descr FROM products WHERE pid = ? ;",(pid,))
-            rs = cur.fetchone()
-            return rs
+            return self.products.get(pid)
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_product_details()\n")
             print(e)
             return None
         
     #   Record that the customer viewed a specific product.
+    #   The row is buffered and written in a batch (see src/db/event_writer.py).
     #   Args:
     #       sessionInformation (SessionInf): Current session information.
     #       pid (int): ID of the viewed product.
     def create_viewed_product(self,sessionInformation,pid):
-        
-        ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            cur = self.conn.execute("INSERT INTO viewedProduct (cid,sessionNo,ts,pid) VALUES (?,?,?,?);",(sessionInformation.cid,sessionInformation.sessionNo,ts,pid))
-            self.commit()
-        except sqlite3.Error as e:
-            print("\n[X] SQL Error in create_viewed_product()\n")
-            print(e)
-            self.conn.rollback()
+
+        self.events.record_view(sessionInformation,pid)
+
+    #   Write all buffered search/view events now (logout, exit, before reports).
+    #   Returns:
+    #           int: Events stored (duplicates dropped by the batch insert not included).
+    def flush_events(self):
+        return self.events.flush()
 
     #   Check if the given product is already in the customer's cart.
     #   Args:
     #       sessionInformation (SessionInf): Current session details.
     #       pid (int): Product ID.
     #   Returns:
-    #           sqlite3.Row or None: Existing cart record if present.
+    #           dict or None: {'qty': ...} if the product is in the cart.
     def check_add_to_cart(self,sessionInformation,pid):
 
         try:
-            cur = self.conn.execute("SELECT qty FROM cart WHERE cid = ? and sessionNo = ? and pid = ?;",(sessionInformation.cid,sessionInformation.sessionNo,pid,))
-            rs = cur.fetchone()
-            return rs
+            qty = self.carts.qty(sessionInformation,pid)
+            return None if qty is None else {'qty': qty}
         except sqlite3.Error as e:
             print("\n[X] SQL Error in check_add_to_cart()\n")
             print(e)
@@ -308,15 +417,15 @@ class dbFunctions:
     def check_stock(self,pid):
 
         try:
-            cur = self.conn.execute("SELECT stock_count FROM products WHERE pid = ?;",(pid,))
-            rs = cur.fetchone()
-            return rs
+            row = self.products.get(pid)
+            return None if row is None else {'stock_count': row['stock_count']}
         except sqlite3.Error as e:
             print("\n[X] SQL Error in check_stock()\n")
             print(e)
             return None
         
     #   Add or update a product in the customer's cart.
+    #   The change is made in memory and written back later (see src/db/session_cart.py).
     #   Args:
     #       sessionInformation (SessionInf): Current session information.
     #       pid (int): Product ID.
@@ -334,15 +443,8 @@ class dbFunctions:
         if mode == "add":
             #   Add new item if not already in cart
             if rs is None and (rs2["stock_count"] > 0):
-                try:
-                    cur = self.conn.execute("INSERT INTO cart (cid,sessionNo,pid,qty) VALUES (?,?,?,?);",(sessionInformation.cid,sessionInformation.sessionNo,pid,new_qty))
-                    self.commit()
-                    return True
-                except sqlite3.Error as e:
-                    print("\n[X] SQL Error in add_to_cart() for new item add to cart\n")
-                    print(e)
-                    self.conn.rollback()
-                    return False
+                self.carts.set_qty(sessionInformation,pid,new_qty)
+                return True
             else:
                 #   Item already exists; increment quantity
                 new_qty = rs["qty"] + qty
@@ -355,13 +457,7 @@ class dbFunctions:
             return True
         #   Update cart quantity if stock is sufficient
         if new_qty <= rs2["stock_count"]:
-            try:
-                cur = self.conn.execute("UPDATE cart SET qty = ? WHERE cid = ? and sessionNo = ? and pid = ? ;",(new_qty,sessionInformation.cid,sessionInformation.sessionNo,pid))
-                self.commit()
-            except sqlite3.Error as e:
-                print("\n[X] SQL Error in add_to_cart() for update qty\n")
-                print(e)
-                self.conn.rollback()
+            self.carts.set_qty(sessionInformation,pid,new_qty)
             return True
         else:         
             print("\nNot enough stock!")
@@ -371,18 +467,19 @@ class dbFunctions:
     #   Args:
     #       sessionInformation (SessionInf): Current session information.
     #   Returns:
-    #           list[sqlite3.Row]: List of cart items joined with product info.
+    #           list[dict]: Cart lines (by pid) with product info.
     def get_cart_items(self,sessionInformation):
 
         try:
-            cur = self.conn.execute("""
-                SELECT ct.pid, p.name, p.price, ct.qty, p.stock_count,
-                       (p.price * ct.qty) AS total
-                FROM cart ct
-                JOIN products p ON ct.pid = p.pid
-                WHERE ct.cid = ? AND ct.sessionNo = ?;
-            """, (sessionInformation.cid, sessionInformation.sessionNo))
-            rs = cur.fetchall()
+            cart = self.carts.lines(sessionInformation)
+            #   product columns come from the cache; lines of unknown products are dropped, as with the join
+            products = self.products.get_many(list(cart))
+            rs = []
+            for pid, qty in cart.items():
+                p = products.get(pid)
+                if p is not None:
+                    rs.append({'pid': pid, 'name': p['name'], 'price': p['price'], 'qty': qty,
+                               'stock_count': p['stock_count'], 'total': p['price'] * qty})
             return rs
         except sqlite3.Error as e:
             print("\n[X] SQL Error get_cart_items()\n")
@@ -398,17 +495,17 @@ class dbFunctions:
     def delete_cart_items(self,sessionInformation,pid):
 
         try:
-            cur = self.conn.execute("DELETE FROM cart WHERE cid = ? AND sessionNo = ? AND pid = ?;", (sessionInformation.cid, sessionInformation.sessionNo,pid))
-            self.commit()
+            self.carts.set_qty(sessionInformation,pid,0)
             return True
         except sqlite3.Error as e:
             print("\n[X] SQL Error delete_cart_items()\n")
             print(e)
-            self.conn.rollback()         
             return False 
    
     #   Generate a new order from the current customer's cart.
-    #   Performs stock checks and uses a transaction to ensure consistency.
+    #   The stock check, stock decrement, order lines and cart delete run as one
+    #   guarded, set-based transaction (see src/db/checkout.py), so concurrent
+    #   checkouts cannot oversell.
     #   Args:
     #       sessionInformation (SessionInf): Current session details.
     #       shipping_address (str): Address for shipment.
@@ -416,62 +513,58 @@ class dbFunctions:
     #           int or None: The order number if successful, or None if failed.
     def create_order(self,sessionInformation,shipping_address):
 
-        rs = self.get_cart_items(sessionInformation)
-        if not rs:
+        result = self.checkout(sessionInformation,shipping_address)
+        if result is None:
+            print("\n[X] Transaction rolled back. No changes were made.")
+            return None
+        if result.empty:
             print("\n[X] Your cart is empty!")
             return None
-        
-        odate = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ono = self.get_max_orderNo()
-        shipping_address = shipping_address
+        if result.shortages:
+            for s in result.shortages:
+                print("\n[X] Not enough stock for product: ", s.name)
+                print("\n[X] Avaliable in store: ",s.available)
+            print("\n[X] Checkout cancelled. Please try again later.")
+            return None
+        return result.ono
+
+    #   Checkout returning the full outcome instead of printing it.
+    #   Args:
+    #       sessionInformation (SessionInf): Current session details.
+    #       shipping_address (str): Address for shipment.
+    #   Returns:
+    #           CheckoutResult or None: None on a database error.
+    def checkout(self,sessionInformation,shipping_address):
 
         try:
-            #   Begin transaction
-            if not self.conn.in_transaction:
-                self.conn.execute("BEGIN IMMEDIATE;")
-            #   Insert order header
-            cur = self.conn.execute("INSERT INTO orders (ono,cid, sessionNo, odate, shipping_address) VALUES (?,?, ?, ?, ?);",
-                (ono,sessionInformation.cid, sessionInformation.sessionNo, odate, shipping_address)
-            )
-            index = 1
-            for row in rs:
-                pid = row['pid']
-                qty = row['qty']
-                stock = row['stock_count']
-                price = row['price']
-                name = row['name']
-
-                #   Check stock before inserting order line
-                if stock < qty:
-                    print("\n[X] Not enough stock for product: ", name)
-                    print("\n[X] Avaliable in store: ",stock)
-                    self.conn.execute("ROLLBACK;")
-                    print("\n[X] Checkout cancelled. Please try again later.")
-                    return None
-                
-                #   Insert each order line and update stock
-                self.conn.execute("INSERT INTO orderlines (ono, lineNo, pid, qty, uprice) VALUES (?, ?, ?, ?, ?);",
-                    (ono, index, pid, qty, price))
-                self.conn.execute("UPDATE products SET stock_count = stock_count - ? WHERE pid = ?;",(qty, pid))
-                index = index + 1
-            #   Clear cart and commit
-            self.clear_cart(sessionInformation)
-            return ono
-            
+            #   Taken before the write lock; a failed checkout leaves a gap
+            ono = self.ids.next_id("ono")
+            with self.pool.writer() as conn:
+                #   the order is placed from the cart table: write the in-memory
+                #   cart first, in the order's transaction
+                conn.execute("BEGIN IMMEDIATE;")
+                try:
+                    self.carts.flush_locked(conn, sessionInformation)
+                    result = place_order(conn, sessionInformation, shipping_address, ono=ono)
+                except BaseException:
+                    self.carts.resync(sessionInformation)
+                    raise
+            if result.ono is not None:
+                self.carts.drop(sessionInformation)
+            else:
+                #   rolled back together with the order
+                self.carts.resync(sessionInformation)
+            for pid, stock in result.stock.items():
+                self.products.update(pid, stock_count=stock)
+            return result
         except sqlite3.Error as e:
             print("\n[X] SQL Error during order creation:")
             print(e)
-        
-            if self.conn.in_transaction:
-                self.conn.execute("ROLLBACK;")
-            print("\n[X] Transaction rolled back. No changes were made.")
             return None
 
     def clear_cart(self,sessionInformation):
         try:
-            #   Clear cart and commit
-            cur = self.conn.execute( "DELETE FROM cart WHERE cid = ? AND sessionNo = ?;",(sessionInformation.cid, sessionInformation.sessionNo))
-            self.commit()
+            self.carts.clear(sessionInformation)
             return None
         except sqlite3.Error as e:
             print("\n[X] SQL Error in clear_cart()\n")
@@ -489,14 +582,15 @@ class dbFunctions:
     def get_order_details(self,ono):
 
         try:
-            cur = self.conn.execute("""
-                SELECT p.name, p.category, ol.qty, ol.uprice, (ol.qty * ol.uprice) AS total
-                FROM orderlines ol
-                JOIN products p ON ol.pid = p.pid
-                WHERE ol.ono = ?;
-            """, (ono,))
-            rs = cur.fetchall()
-            return rs
+            with self.pool.reader() as conn:
+                cur = conn.execute("""
+                    SELECT p.name, p.category, ol.qty, ol.uprice, (ol.qty * ol.uprice) AS total
+                    FROM orderlines ol
+                    JOIN products p ON ol.pid = p.pid
+                    WHERE ol.ono = ?;
+                """, (ono,))
+                rs = cur.fetchall()
+                return rs
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_order_details()\n")
             print(e)
@@ -510,143 +604,210 @@ class dbFunctions:
     def get_orders(self,uid):
 
         try:
-            cur = self.conn.execute("""SELECT o.ono, o.odate, o.shipping_address, SUM(ol.qty * ol.uprice) AS total
-                FROM orders o
-                JOIN orderlines ol ON o.ono = ol.ono
-                WHERE o.cid = ?
-                GROUP BY o.ono, o.odate, o.shipping_address
-                ORDER BY o.odate DESC;
-            """, (uid,))
-            rs = cur.fetchall()
-            return rs
+            with self.pool.reader() as conn:
+                cur = conn.execute("""SELECT o.ono, o.odate, o.shipping_address, SUM(ol.qty * ol.uprice) AS total
+                    FROM orders o
+                    JOIN orderlines ol ON o.ono = ol.ono
+                    WHERE o.cid = ?
+                    GROUP BY o.ono, o.odate, o.shipping_address
+                    ORDER BY o.odate DESC;
+                """, (uid,))
+                rs = cur.fetchall()
+                return rs
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_orders()")
             print(e)
             return None
+
+    #   A customer's orders, newest first, page by page (see get_orders()).
+    #   Args:
+    #       uid (int): Customer ID.
+    #       page_size (int): Orders per page.
+    #   Returns:
+    #           KeysetCursor: pages of rows (ono, odate, shipping_address, total).
+    def get_orders_cursor(self,uid,page_size=5):
+
+        sql = """SELECT o.ono, o.odate, o.shipping_address,
+                   (SELECT SUM(ol.qty * ol.uprice) FROM orderlines ol WHERE ol.ono = o.ono) AS total
+            FROM orders o
+            WHERE o.cid = ? AND EXISTS (SELECT 1 FROM orderlines ol WHERE ol.ono = o.ono)"""
+        return KeysetCursor(self.pool, sql, [uid], ["o.odate", "o.ono"], descending=True, page_size=page_size)
+
     def get_product_by_pid(self, pid):
         try:
-            cur = self.conn.execute(
-                "SELECT pid, name, category, price, stock_count, descr FROM products WHERE pid = ?;",
-                (pid,),
-            )
-            return cur.fetchone()
+            return self.products.get(pid)
         except sqlite3.Error as e:
             print("\n[X] SQL Error in get_product_by_pid()\n"); 
             print(e)
             return None
 
+    #   Drop products from the cache now and again when the calling thread's
+    #   unit of work ends: rows cached while it was open may show its writes,
+    #   and a rollback must not leave them behind.
+    def _evict_products(self, *pids):
+        self.products.invalidate(*pids)
+        self.uow.on_end(lambda: self.products.invalidate(*pids))
+
     def update_product_price(self, pid, new_price) -> bool:
         try:
-            self.conn.execute("UPDATE products SET price = ? WHERE pid = ?;", (new_price, pid))
-            self.commit()
+            with self.transaction() as conn:
+                #   the cache entry is dropped, not patched: the stored value may differ
+                #   from new_price after type affinity (7 -> 7.0)
+                conn.execute("UPDATE products SET price = ? WHERE pid = ?;", (new_price, pid))
+            self._evict_products(pid)
             return True
         except sqlite3.Error as e:
             print("\n[X] SQL Error in update_product_price()\n"); 
             print(e)
-            self.conn.rollback()
+            self.rollback()
             return False
 
     def update_product_stock(self, pid, new_stock) -> bool:
         try:
-            self.conn.execute("UPDATE products SET stock_count = ? WHERE pid = ?;", (new_stock, pid))
-            self.commit()
+            with self.transaction() as conn:
+                conn.execute("UPDATE products SET stock_count = ? WHERE pid = ?;", (new_stock, pid))
+            self._evict_products(pid)
             return True
         except sqlite3.Error as e:
             print("\n[X] SQL Error in update_product_stock()\n"); 
             print(e)
-            self.conn.rollback()           
+            self.rollback()           
             return False
 
-    def weekly_sales_metrics(self):
+    #   Import a product feed (CSV or JSONL) in chunked transactions that never
+    #   hold the write lock for long (see src/db/catalog_import.py).
+    #   Args:
+    #       path (str): Feed file.
+    #       rejects_path (str): Optional CSV file for the rejected records.
+    #       dry_run (bool): Validate and apply, but commit nothing.
+    #   Returns:
+    #           dict or None: Import report (counts, rejects), None if the feed could not be read.
+    def import_products(self, path, rejects_path=None, dry_run=False):
+        def evict(pids):
+            self._evict_products(*pids)
+            #   top-product reports show product names
+            self.reports.invalidate()
+        try:
+            return import_catalog(self.pool, path, rejects_path, dry_run=dry_run, on_commit=evict)
+        except (OSError, ValueError) as e:
+            print("\n[X] Could not read the product feed\n")
+            print(e)
+            return None
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in import_products()\n")
+            print(e)
+            return None
+
+    #   Run query(conn) on a reader, through the report cache; on the
+    #   snapshot's connection inside report_snapshot().
+    def _report(self, topic, key, query):
+        snap = getattr(self._snapshot, "current", None)
+        if snap is not None:
+            return query(snap.conn)
+        def compute():
+            with self.pool.reader() as conn:
+                return query(conn)
+        return self.reports.get(topic, key, compute)
+
+    def sales_metrics(self, start, end, group_by=None, source="rollup"):
         """
-        Weekly sales report for the last 7 days (inclusive).
-        Returns dict: {orders, products, customers, avg_per_customer, total_sales}
+        Sales metrics for start..end (both inclusive).
+        group_by: None, "day", "week" or "month" for a trend breakdown.
+        source: "rollup" reads the daily rollup tables (cost grows with the
+        number of days, not orders); "raw" makes one pass over orders/orderlines.
+        Returns dict: {start, end, group_by, totals, buckets} (see sales_metrics.py)
         """
+        metrics = compute_sales_metrics if source == "raw" else rollup_sales_metrics
+        key = ("sales_metrics", as_date(start).isoformat(), as_date(end).isoformat(), group_by, source)
         try:
-            params = ()
-            q_orders = (
-                "SELECT COUNT(DISTINCT o.ono) FROM orders o "
-                "WHERE date(o.odate) >= date('now','-6 day') AND date(o.odate) <= date('now');"
-            )
-            orders = self.conn.execute(q_orders, params).fetchone()[0]
-
-            q_products = (
-                "SELECT COUNT(DISTINCT ol.pid) FROM orderlines ol "
-                "JOIN orders o ON ol.ono=o.ono "
-                "WHERE date(o.odate) >= date('now','-6 day') AND date(o.odate) <= date('now');"
-            )
-            products = self.conn.execute(q_products, params).fetchone()[0]
-
-            q_customers = (
-                "SELECT COUNT(DISTINCT o.cid) FROM orders o "
-                "WHERE date(o.odate) >= date('now','-6 day') AND date(o.odate) <= date('now');"
-            )
-            customers = self.conn.execute(q_customers, params).fetchone()[0]
-
-            q_total = (
-                "SELECT COALESCE(SUM(ol.qty * ol.uprice),0) FROM orderlines ol "
-                "JOIN orders o ON ol.ono=o.ono "
-                "WHERE date(o.odate) >= date('now','-6 day') AND date(o.odate) <= date('now');"
-            )
-            total_sales = self.conn.execute(q_total, params).fetchone()[0]
-
-            avg_per_customer = (total_sales / customers) if customers else 0.0
-            return {
-                'orders': orders,
-                'products': products,
-                'customers': customers,
-                'avg_per_customer': round(avg_per_customer, 2),
-                'total_sales': round(total_sales, 2),
-            }
+            return self._report("sales", key, lambda conn: metrics(conn, start, end, group_by))
         except sqlite3.Error as e:
-            print("\n[X] SQL Error in weekly_sales_metrics()\n"); print(e)
+            print("\n[X] SQL Error in sales_metrics()\n"); print(e)
             return None
 
-    def top_products_by_distinct_orders(self):
-        """Top products by count of DISTINCT orders; returns top-3 including ties at rank 3."""
+    def category_sales(self, start, end):
+        """Sales per product category for start..end (inclusive), from the daily rollup."""
+        key = ("category_sales", as_date(start).isoformat(), as_date(end).isoformat())
         try:
-            rows = self.conn.execute(
-                """
-                SELECT p.pid, p.name, COUNT(DISTINCT ol.ono) AS cnt
-                FROM orderlines ol
-                JOIN products p ON p.pid = ol.pid
-                GROUP BY p.pid, p.name
-                ORDER BY cnt DESC, p.pid ASC;
-                """
-            ).fetchall()
-            return self._top3_with_ties(rows, key='cnt')
+            return self._report("sales", key, lambda conn: category_sales(conn, start, end))
         except sqlite3.Error as e:
-            print("\n[X] SQL Error in top_products_by_distinct_orders()\n"); print(e)
+            print("\n[X] SQL Error in category_sales()\n"); print(e)
             return []
 
-    def top_products_by_views(self):
-        """Top products by total views; returns top-3 including ties at rank 3."""
+    def customer_analytics(self, start=None, end=None):
+        """
+        Customer analytics for start..end (inclusive; whole history when None):
+        RFM segments, monthly cohort retention and basket sizes, computed with
+        vectorized NumPy passes (see analytics.py). Read from the newest columnar
+        snapshot when snapshot_dir is set and has one (and no report_snapshot()
+        is active), else from the store.
+        Returns dict: {orders, customers, segments, cohorts, basket, timings_ms, snapshot, ...}
+        """
+        key = ("customer_analytics",
+               None if start is None else as_date(start).isoformat(),
+               None if end is None else as_date(end).isoformat())
         try:
-            rows = self.conn.execute(
-                """
-                SELECT p.pid, p.name, COUNT(*) AS views
-                FROM viewedProduct v
-                JOIN products p ON p.pid = v.pid
-                GROUP BY p.pid, p.name
-                ORDER BY views DESC, p.pid ASC;
-                """
-            ).fetchall()
-            return self._top3_with_ties(rows, key='views')
+            #   inside report_snapshot() the figures must match the other reports
+            live = getattr(self._snapshot, "current", None) is not None
+            snapshot = open_snapshot(self.snapshot_dir) if self.snapshot_dir and not live else None
+            if snapshot is not None:
+                return self.reports.get("sales", key + (snapshot.name,),
+                                        lambda: customer_report(snapshot, start, end))
+            return self._report("sales", key, lambda conn: customer_report(conn, start, end))
+        except (OSError, ValueError) as e:
+            print("\n[X] Could not read the analytics snapshot\n"); print(e)
+            return None
         except sqlite3.Error as e:
-            print("\n[X] SQL Error in top_products_by_views()\n"); print(e)
+            print("\n[X] SQL Error in customer_analytics()\n"); print(e)
+            return None
+
+    def conversion_funnel(self, start=None, end=None, queries=20):
+        """
+        Search-to-purchase funnel of the sessions started in start..end (inclusive;
+        every session when None): sessions that searched, viewed, carted and
+        ordered, time to purchase and conversion of the `queries` most searched
+        queries, from one ordered pass over the event tables (see funnel.py).
+        Not cached: searches and carts don't invalidate reports. Buffered events
+        and carts are written first.
+        Returns dict: {sessions, orders, stages, funnel, time_to_purchase, queries, ...}
+        """
+        try:
+            self.carts.flush_all()
+            with self.report_snapshot() as snap:
+                return funnel_report(snap.conn, start, end, queries)
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in conversion_funnel()\n"); print(e)
+            return None
+
+    def weekly_sales_metrics(self, group_by=None):
+        """
+        Weekly sales report for the last 7 days (inclusive).
+        Returns dict: {orders, products, customers, avg_per_customer, total_sales}
+        plus 'buckets' when group_by is given.
+        """
+        today = dt.date.today()
+        report = self.sales_metrics(today - dt.timedelta(days=6), today, group_by)
+        if report is None:
+            return None
+        metrics = dict(report['totals'])
+        if group_by:
+            metrics['buckets'] = report['buckets']
+        return metrics
+
+    def top_products_by_distinct_orders(self, k=3):
+        """Top products by count of DISTINCT orders; returns top-k including ties at rank k."""
+        try:
+            return self._report("sales", ("top_orders", k), lambda conn: top_k(conn, "orders", k))
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in top_products_by_distinct_orders()\n"); print(e)
             return []
 
-    @staticmethod
-    def _top3_with_ties(rows, key):
-        """rows: list of sqlite3.Row with numeric column `key`."""
-        if not rows:
+    def top_products_by_views(self, k=3):
+        """Top products by total views; returns top-k including ties at rank k."""
+        if getattr(self._snapshot, "current", None) is None:
+            self.flush_events()
+        try:
+            return self._report("views", ("top_views", k), lambda conn: top_k(conn, "views", k))
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in top_products_by_views()\n"); print(e)
             return []
-        counts = [r[key] for r in rows]
-        unique_counts = sorted(set(counts), reverse=True)
-        if len(unique_counts) <= 2:
-            cutoff = unique_counts[-1]
-        else:
-            cutoff = unique_counts[2]  # 3rd distinct value
-        return [dict(pid=r['pid'], name=r['name'], count=r[key]) for r in rows if r[key] >= cutoff]
-# --- END new sale helper function ---------------------------------------------
-  
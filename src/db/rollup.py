@@ -0,0 +1,231 @@
+import sqlite3
+import sys
+
+from src.db.sales_metrics import as_date, bucket_expr, make_report, metrics_dict
+
+#   Daily sales rollup (tables created by migration 4).
+#
+#       sales_daily           (day)       orders, units, total_sales
+#       sales_daily_product   (day, pid)  category, orders, units, total_sales
+#       sales_daily_customer  (day, cid)  orders, total_sales
+#
+#   apply_order() folds one new order into all three inside the checkout
+#   transaction, so the rollup commits or rolls back together with the order.
+#   Range reports read only the rollup: their cost depends on the number of
+#   days (and products/customers per day) in the range, not on how many
+#   orders have ever been placed. Distinct products/customers over a range
+#   are COUNT(DISTINCT) over the per-day keys, which is why those two tables
+#   exist at all.
+#
+#   The category of a sales_daily_product row is the product's category when
+#   the row was first written, i.e. at the day's first sale of that product;
+#   later recategorizations don't move past sales. The raw tables keep no
+#   category history, so the rollup row is the only record of it: rebuild()
+#   and verify() keep the category of every (day, pid) row that exists and use
+#   the product's current category only for rows the rollup has no record of.
+#
+#   Usage: python -m src.db.rollup data/store.db rebuild|verify
+
+ROLLUP_TABLES = ("sales_daily", "sales_daily_product", "sales_daily_customer")
+
+_APPLY = [
+    """
+    INSERT INTO sales_daily (day, orders, units, total_sales)
+    SELECT :day, 1, COALESCE(SUM(qty), 0), COALESCE(SUM(qty * uprice), 0)
+    FROM orderlines WHERE ono = :ono
+    ON CONFLICT (day) DO UPDATE SET
+        orders = orders + excluded.orders,
+        units = units + excluded.units,
+        total_sales = total_sales + excluded.total_sales;
+    """,
+    """
+    INSERT INTO sales_daily_product (day, pid, category, orders, units, total_sales)
+    SELECT :day, ol.pid, p.category, 1, SUM(ol.qty), SUM(ol.qty * ol.uprice)
+    FROM orderlines ol
+    LEFT JOIN products p ON p.pid = ol.pid
+    WHERE ol.ono = :ono
+    GROUP BY ol.pid
+    ON CONFLICT (day, pid) DO UPDATE SET
+        orders = orders + excluded.orders,
+        units = units + excluded.units,
+        total_sales = total_sales + excluded.total_sales;
+    """,
+    """
+    INSERT INTO sales_daily_customer (day, cid, orders, total_sales)
+    SELECT :day, :cid, 1, COALESCE(SUM(qty * uprice), 0)
+    FROM orderlines WHERE ono = :ono
+    ON CONFLICT (day, cid) DO UPDATE SET
+        orders = orders + excluded.orders,
+        total_sales = total_sales + excluded.total_sales;
+    """,
+]
+
+#   Full recomputation from orders/orderlines, one SELECT per rollup table.
+#   {recorded} is the table holding the categories already recorded per (day, pid).
+_FROM_RAW = {
+    "sales_daily": """
+        SELECT substr(o.odate, 1, 10) AS day, COUNT(DISTINCT o.ono) AS orders,
+               COALESCE(SUM(ol.qty), 0) AS units, COALESCE(SUM(ol.qty * ol.uprice), 0) AS total_sales
+        FROM orders o LEFT JOIN orderlines ol ON ol.ono = o.ono
+        GROUP BY day
+    """,
+    "sales_daily_product": """
+        SELECT substr(o.odate, 1, 10) AS day, ol.pid,
+               CASE WHEN r.pid IS NOT NULL THEN r.category ELSE p.category END AS category,
+               COUNT(DISTINCT o.ono) AS orders, SUM(ol.qty) AS units, SUM(ol.qty * ol.uprice) AS total_sales
+        FROM orders o JOIN orderlines ol ON ol.ono = o.ono
+        LEFT JOIN products p ON p.pid = ol.pid
+        LEFT JOIN {recorded} r ON r.day = substr(o.odate, 1, 10) AND r.pid = ol.pid
+        GROUP BY substr(o.odate, 1, 10), ol.pid
+    """,
+    "sales_daily_customer": """
+        SELECT substr(o.odate, 1, 10) AS day, o.cid, COUNT(DISTINCT o.ono) AS orders,
+               COALESCE(SUM(ol.qty * ol.uprice), 0) AS total_sales
+        FROM orders o LEFT JOIN orderlines ol ON ol.ono = o.ono
+        GROUP BY day, o.cid
+    """,
+}
+
+_COLUMNS = {
+    "sales_daily": "day, orders, units, total_sales",
+    "sales_daily_product": "day, pid, category, orders, units, total_sales",
+    "sales_daily_customer": "day, cid, orders, total_sales",
+}
+
+
+#   Add one order to the rollup. Call inside the transaction that inserted
+#   the order and its lines.
+def apply_order(conn: sqlite3.Connection, ono, cid, odate):
+    params = {"ono": ono, "cid": cid, "day": str(odate)[:10]}
+    for stmt in _APPLY:
+        conn.execute(stmt, params)
+
+
+def _raw(table, recorded="sales_daily_product"):
+    return _FROM_RAW[table].format(recorded=recorded)
+
+
+#   Recompute every rollup table from the raw tables, keeping the recorded
+#   categories (see above). Caller owns the transaction.
+def rebuild(conn: sqlite3.Connection):
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_category;")
+    conn.execute("CREATE TEMP TABLE rollup_category (day text, pid int, category text, primary key (day, pid));")
+    conn.execute("INSERT INTO temp.rollup_category SELECT day, pid, category FROM sales_daily_product;")
+    try:
+        for table in ROLLUP_TABLES:
+            conn.execute(f"DELETE FROM {table};")
+            conn.execute(f"INSERT INTO {table} ({_COLUMNS[table]}) {_raw(table, 'temp.rollup_category')};")
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.rollup_category;")
+
+
+#   Compare the rollup with a fresh recomputation.
+#   Returns:
+#           dict: table -> number of rows that differ (missing, extra or changed).
+def verify(conn: sqlite3.Connection):
+    diffs = {}
+    for table in ROLLUP_TABLES:
+        cols = _COLUMNS[table]
+        #   round money so float summation order does not count as a difference
+        norm = cols.replace("total_sales", "ROUND(total_sales, 2)")
+        sql = f"""
+            SELECT COUNT(*) FROM (
+                SELECT {norm} FROM {table}
+                EXCEPT SELECT {norm} FROM ({_raw(table)})
+                UNION ALL
+                SELECT {norm} FROM ({_raw(table)})
+                EXCEPT SELECT {norm} FROM {table}
+            );
+        """
+        diffs[table] = conn.execute(sql).fetchone()[0]
+    return diffs
+
+
+#   Sales metrics for start..end (inclusive) from the rollup; same report
+#   shape as sales_metrics.compute_sales_metrics().
+def rollup_sales_metrics(conn: sqlite3.Connection, start, end, group_by=None):
+
+    params = {"start": as_date(start).isoformat(), "end": as_date(end).isoformat()}
+    bucket = bucket_expr(group_by, "day")
+    where = "WHERE day >= :start AND day <= :end"
+
+    sums = conn.execute(
+        f"SELECT {bucket} AS bucket, SUM(orders), SUM(total_sales) FROM sales_daily {where} GROUP BY bucket;",
+        params).fetchall()
+    products = dict(conn.execute(
+        f"SELECT {bucket} AS bucket, COUNT(DISTINCT pid) FROM sales_daily_product {where} GROUP BY bucket;",
+        params).fetchall())
+    customers = dict(conn.execute(
+        f"SELECT {bucket} AS bucket, COUNT(DISTINCT cid) FROM sales_daily_customer {where} GROUP BY bucket;",
+        params).fetchall())
+
+    buckets = []
+    orders = 0
+    total = 0.0
+    for b, n, amount in sums:
+        orders += n
+        total += amount
+        m = metrics_dict(n, products.get(b, 0), customers.get(b, 0), amount)
+        m['bucket'] = b
+        buckets.append(m)
+
+    if group_by is None:
+        n_products = products.get("all", 0)
+        n_customers = customers.get("all", 0)
+    else:
+        n_products = conn.execute(
+            f"SELECT COUNT(DISTINCT pid) FROM sales_daily_product {where};", params).fetchone()[0]
+        n_customers = conn.execute(
+            f"SELECT COUNT(DISTINCT cid) FROM sales_daily_customer {where};", params).fetchone()[0]
+
+    totals = metrics_dict(orders, n_products, n_customers, total)
+    return make_report(start, end, group_by, totals, sorted(buckets, key=lambda m: m['bucket']))
+
+
+#   Sales per product category for start..end (inclusive), biggest first.
+#   Returns:
+#           list[dict]: {category, orders, units, total_sales}
+def category_sales(conn: sqlite3.Connection, start, end):
+    rows = conn.execute(
+        """
+        SELECT COALESCE(category, '(unknown)') AS category, SUM(orders) AS orders,
+               SUM(units) AS units, ROUND(SUM(total_sales), 2) AS total_sales
+        FROM sales_daily_product
+        WHERE day >= ? AND day <= ?
+        GROUP BY COALESCE(category, '(unknown)')
+        ORDER BY total_sales DESC;
+        """,
+        (as_date(start).isoformat(), as_date(end).isoformat()),
+    ).fetchall()
+    return [dict(category=r[0], orders=r[1], units=r[2], total_sales=r[3]) for r in rows]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[1] not in ("rebuild", "verify"):
+        print("Usage: python -m src.db.rollup <db_path> rebuild|verify")
+        return 1
+
+    from src.db.connection import create_connection
+    from src.db.migrations import migrate
+
+    conn = create_connection(argv[0])
+    migrate(conn)
+    if argv[1] == "rebuild":
+        conn.execute("BEGIN IMMEDIATE;")
+        rebuild(conn)
+        conn.commit()
+        print("[✓] Sales rollup rebuilt.")
+        status = 0
+    else:
+        diffs = verify(conn)
+        for table, n in diffs.items():
+            print(f"{table:<22} {'ok' if n == 0 else str(n) + ' rows differ'}")
+        status = 0 if not any(diffs.values()) else 1
+        print("[✓] Rollup matches the raw tables." if status == 0 else "[X] Rollup is out of date; run rebuild.")
+    conn.close()
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,136 @@
+import datetime as dt
+
+#   Sales metrics over an arbitrary date range, in one pass.
+#
+#   The filter compares the raw odate column (`odate >= start AND odate < end`)
+#   so idx_orders_odate serves it; odate holds either 'YYYY-MM-DD' or
+#   'YYYY-MM-DD HH:MM:SS', and both order correctly as text.
+#
+#   Distinct customers/products are not additive across buckets, so each line
+#   also carries a first-occurrence flag (ROW_NUMBER() = 1 per customer and per
+#   product over the whole range). Summing the flags over all buckets gives the
+#   range totals without a second scan.
+
+GROUPINGS = ("day", "week", "month")
+
+_BUCKET = {
+    None: "'all'",
+    "day": "substr({col}, 1, 10)",
+    #   Monday that starts the week
+    "week": "date(substr({col}, 1, 10), '-6 days', 'weekday 1')",
+    "month": "substr({col}, 1, 7)",
+}
+
+
+#   SQL expression that maps a date/datetime column to its bucket label.
+def bucket_expr(group_by, col):
+    if group_by not in _BUCKET:
+        raise ValueError(f"group_by must be one of {GROUPINGS} or None")
+    return _BUCKET[group_by].format(col=col)
+
+
+_SQL = """
+    WITH lines AS (
+        SELECT {bucket} AS bucket, o.ono, o.cid, ol.pid,
+               COALESCE(ol.qty * ol.uprice, 0) AS amount,
+               ROW_NUMBER() OVER (PARTITION BY o.cid ORDER BY o.odate, o.ono) AS cid_seq,
+               ROW_NUMBER() OVER (PARTITION BY ol.pid ORDER BY o.odate, o.ono) AS pid_seq
+        FROM orders o
+        LEFT JOIN orderlines ol ON ol.ono = o.ono
+        WHERE o.odate >= :start AND o.odate < :end
+    )
+    SELECT bucket,
+           COUNT(DISTINCT ono) AS orders,
+           COUNT(DISTINCT pid) AS products,
+           COUNT(DISTINCT cid) AS customers,
+           SUM(amount) AS total_sales,
+           SUM(cid_seq = 1) AS new_customers,
+           SUM(pid_seq = 1 AND pid IS NOT NULL) AS new_products
+    FROM lines
+    GROUP BY bucket
+    ORDER BY bucket;
+"""
+
+
+#   Accept a date, datetime or 'YYYY-MM-DD' string.
+def as_date(value):
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    return dt.date.fromisoformat(str(value)[:10])
+
+
+#   Build the metrics statement and its parameters.
+#   Args:
+#       start, end: First and last day of the range (both inclusive).
+#       group_by (str): None, "day", "week" or "month".
+#   Returns:
+#           tuple[str, dict]: SQL and named parameters.
+def build_metrics_sql(start, end, group_by=None):
+    params = {
+        "start": as_date(start).isoformat(),
+        #   exclusive upper bound: the day after `end`
+        "end": (as_date(end) + dt.timedelta(days=1)).isoformat(),
+    }
+    return _SQL.format(bucket=bucket_expr(group_by, "o.odate")), params
+
+
+#   One metrics dict in the shape weekly_sales_metrics() has always returned.
+def metrics_dict(orders, products, customers, total_sales):
+    avg_per_customer = (total_sales / customers) if customers else 0.0
+    return {
+        'orders': orders,
+        'products': products,
+        'customers': customers,
+        'avg_per_customer': round(avg_per_customer, 2),
+        'total_sales': round(total_sales, 2),
+    }
+
+
+#   Run the metrics query on `conn`.
+#   Returns:
+#           dict: {'start', 'end', 'group_by', 'totals': {...}, 'buckets': [{'bucket', ...}, ...]}
+#           where each metrics dict has orders, products, customers,
+#           avg_per_customer and total_sales. Empty day buckets are filled with zeros.
+def compute_sales_metrics(conn, start, end, group_by=None):
+
+    sql, params = build_metrics_sql(start, end, group_by)
+    rows = conn.execute(sql, params).fetchall()
+
+    buckets = []
+    orders = products = customers = 0
+    total = 0.0
+    for r in rows:
+        orders += r['orders']
+        products += r['new_products']
+        customers += r['new_customers']
+        total += r['total_sales']
+        m = metrics_dict(r['orders'], r['products'], r['customers'], r['total_sales'])
+        m['bucket'] = r['bucket']
+        buckets.append(m)
+
+    return make_report(start, end, group_by, metrics_dict(orders, products, customers, total), buckets)
+
+
+#   Wrap totals and buckets into the report dict; fills empty days with zeros.
+def make_report(start, end, group_by, totals, buckets):
+
+    if group_by == "day":
+        by_day = {b['bucket']: b for b in buckets}
+        buckets = []
+        day = as_date(start)
+        while day <= as_date(end):
+            key = day.isoformat()
+            buckets.append(by_day.get(key) or dict(metrics_dict(0, 0, 0, 0.0), bucket=key))
+            day += dt.timedelta(days=1)
+    elif group_by is None:
+        buckets = []
+
+    return {
+        'start': as_date(start).isoformat(),
+        'end': as_date(end).isoformat(),
+        'group_by': group_by,
+        'totals': totals,
+        'buckets': buckets,
+    }
@@ -0,0 +1,148 @@
+import sqlite3
+
+#   Full-text index over products(name, descr).
+#
+#   products_fts is an FTS5 external-content table: it stores only the index,
+#   the text itself is read back from `products`. The trigram tokenizer keeps
+#   the old substring semantics of `LOWER(col) LIKE '%kw%'` (case-insensitive,
+#   matches inside words), so "phone" still finds "smartphone".
+#   Triggers keep the index in sync with every insert/update/delete on products.
+
+FTS_TABLE = "products_fts"
+
+#   Trigram can only match terms of 3+ characters; shorter keywords
+#   are checked with LIKE on the candidate rows instead.
+MIN_FTS_TERM = 3
+
+#   bm25() column weights: a hit in the name counts more than in the description.
+NAME_WEIGHT = 10.0
+DESCR_WEIGHT = 1.0
+
+_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, descr,
+        content='products', content_rowid='pid',
+        tokenize='trigram'
+    );
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, descr) VALUES (new.pid, new.name, new.descr);
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, descr) VALUES ('delete', old.pid, old.name, old.descr);
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF pid, name, descr ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, descr) VALUES ('delete', old.pid, old.name, old.descr);
+        INSERT INTO {FTS_TABLE}(rowid, name, descr) VALUES (new.pid, new.name, new.descr);
+    END;
+    """,
+]
+
+
+#   Create the FTS table and its triggers if missing, and (re)build the index
+#   when it is new. Safe to call on every start-up.
+#   Args:
+#       conn (sqlite3.Connection): Open connection to the store.
+#   Returns:
+#           bool: True if the index is available, False if this SQLite build has no FTS5.
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    try:
+        existed = has_search_index(conn)
+        for stmt in _SCHEMA:
+            conn.execute(stmt)
+        if not existed:
+            rebuild_search_index(conn)
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as e:
+        #   e.g. "no such module: fts5" or no trigram tokenizer (SQLite < 3.34)
+        print("\n[!] Full-text search index unavailable, using LIKE search\n")
+        print(e)
+        conn.rollback()
+        return False
+
+
+#   Repopulate the whole index from the products table.
+def rebuild_search_index(conn: sqlite3.Connection):
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild');")
+
+
+#   Check whether the products_fts table exists in this database.
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (FTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+#   Quote a keyword as an FTS5 string so operators/punctuation in user input
+#   are matched literally.
+def _fts_phrase(keyword: str) -> str:
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+#   Build the product search query for a list of keywords, without its ORDER BY.
+#   Every keyword must appear (as a substring, case-insensitive) in the name
+#   or the description — the same AND-of-keywords rule as the old LIKE search.
+#   Args:
+#       keywords (list[str]): Search keywords.
+#       ranked (bool): Order by relevance (bm25) instead of by pid.
+#       use_fts (bool): Use products_fts; False gives the plain LIKE scan.
+#   Returns:
+#           tuple[str, list, list[str], list[str]]: SELECT ... WHERE ..., its parameters,
+#           the sort key expressions and the result columns that hold them.
+def build_search_select(keywords, ranked=True, use_fts=True):
+
+    long_terms = [k for k in keywords if len(k) >= MIN_FTS_TERM] if use_fts else []
+    short_terms = [k for k in keywords if k not in long_terms]
+
+    conditions = []
+    params = []
+    for k in short_terms:
+        conditions.append("(LOWER(p.name) LIKE ? OR LOWER(p.descr) LIKE ?)")
+        params = params + [f"%{k.lower()}%"] * 2
+
+    if long_terms and ranked:
+        score = f"bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCR_WEIGHT})"
+        key, key_columns = [score, "p.pid"], ["score", "pid"]
+        sql = (
+            f"SELECT p.pid, p.name, p.category, p.price, p.stock_count, {score} AS score "
+            f"FROM {FTS_TABLE} JOIN products p ON p.pid = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH ?"
+        )
+    elif long_terms:
+        #   rowid = pid; FTS5 seeks and orders by rowid itself
+        key, key_columns = [f"{FTS_TABLE}.rowid"], ["pid"]
+        sql = (
+            "SELECT p.pid, p.name, p.category, p.price, p.stock_count "
+            f"FROM {FTS_TABLE} JOIN products p ON p.pid = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH ?"
+        )
+    else:
+        #   Nothing the index can answer: fall back to a scan
+        key, key_columns = ["p.pid"], ["pid"]
+        sql = (
+            "SELECT p.pid, p.name, p.category, p.price, p.stock_count "
+            "FROM products p "
+            "WHERE 1"
+        )
+    if long_terms:
+        params = [" AND ".join(_fts_phrase(k) for k in long_terms)] + params
+
+    for c in conditions:
+        sql = sql + " AND " + c
+    return sql, params, key, key_columns
+
+
+#   Build the complete product search statement (see build_search_select()).
+#   Returns:
+#           tuple[str, list]: SQL and its parameters.
+def build_search_sql(keywords, ranked=True, use_fts=True):
+    sql, params, key, _ = build_search_select(keywords, ranked, use_fts)
+    return sql + " ORDER BY " + ", ".join(key) + ";", params
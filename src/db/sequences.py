@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+
+#   Id allocation backed by the id_sequences table (migration 2).
+#
+#   Each sequence is a row (name, scope, next_value). Reserving ids is one
+#   `UPDATE ... SET next_value = next_value + n RETURNING next_value`, which
+#   SQLite runs under the write lock, so two processes can never receive the
+#   same id. Ids are reserved in blocks and handed out from memory, so most
+#   inserts cost no extra query at all; unused ids of a block are simply
+#   skipped (gaps are expected, duplicates are impossible).
+#
+#   A sequence row is created on first use, seeded from the current MAX() of
+#   its table. `scope` partitions a sequence, e.g. session numbers per customer.
+#
+#   Call next_id() outside of a write transaction when possible. Inside one,
+#   exactly one id is reserved as part of that transaction (no block is
+#   cached), so rolling the transaction back also returns the id.
+
+#   name -> (seed SQL giving the first free id, default block size)
+SEQUENCES = {
+    "uid": ("SELECT COALESCE(MAX(uid), 0) + 1 FROM users", 20),
+    "ono": ("SELECT COALESCE(MAX(ono), 0) + 1 FROM orders", 20),
+    #   per customer; blocks of 1 keep each customer's sessions numbered 1, 2, 3, ...
+    "sessionNo": ("SELECT COALESCE(MAX(sessionNo), 0) + 1 FROM sessions WHERE cid = :scope", 1),
+}
+
+
+class IdAllocator:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool whose writer is used for reservations.
+    #       block_sizes (dict): Optional per-sequence block size overrides.
+    def __init__(self, pool, block_sizes=None):
+        self.pool = pool
+        self.block_sizes = {name: size for name, (_, size) in SEQUENCES.items()}
+        if block_sizes:
+            self.block_sizes.update(block_sizes)
+        self._blocks = {}           #   (name, scope) -> [next, end)
+        self._lock = threading.Lock()
+
+    #   Next unique id of a sequence.
+    #   Args:
+    #       name (str): Sequence name (key of SEQUENCES).
+    #       scope (int): Partition of the sequence; 0 for global ones.
+    #   Returns:
+    #           int: A never-before-issued id.
+    def next_id(self, name, scope=0):
+        key = (name, scope)
+        with self._lock:
+            value = self._take(key)
+            if value is not None:
+                return value
+
+        #   Lock order is always writer -> self._lock, never the reverse
+        with self.pool.writer() as conn:
+            with self._lock:
+                value = self._take(key)
+                if value is not None:
+                    return value
+                if conn.in_transaction:
+                    start, _ = self._reserve(conn, name, scope, 1)
+                    return start
+                conn.execute("BEGIN IMMEDIATE;")
+                start, end = self._reserve(conn, name, scope, self.block_sizes[name])
+                conn.commit()
+                self._blocks[key] = [start + 1, end]
+                return start
+
+    #   Hand out the next id of a cached block, or None if it is used up.
+    def _take(self, key):
+        block = self._blocks.get(key)
+        if block and block[0] < block[1]:
+            block[0] += 1
+            return block[0] - 1
+        return None
+
+    #   Reserve `count` consecutive ids at once (e.g. for a bulk import).
+    #   Returns:
+    #           range: The reserved ids.
+    def reserve(self, name, count, scope=0):
+        with self.pool.writer() as conn:
+            own = not conn.in_transaction
+            if own:
+                conn.execute("BEGIN IMMEDIATE;")
+            start, end = self._reserve(conn, name, scope, count)
+            if own:
+                conn.commit()
+        return range(start, end)
+
+    #   Drop cached blocks so the next call re-reads the table
+    #   (after resync() or an external change to id_sequences).
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+    #   Advance the sequence row on `conn`; caller owns the transaction.
+    @staticmethod
+    def _reserve(conn, name, scope, count):
+        params = {"name": name, "scope": scope, "count": count}
+        update = ("UPDATE id_sequences SET next_value = next_value + :count "
+                  "WHERE name = :name AND scope = :scope RETURNING next_value;")
+        row = conn.execute(update, params).fetchone()
+        if row is None:
+            seed = SEQUENCES[name][0]
+            conn.execute(
+                f"INSERT OR IGNORE INTO id_sequences (name, scope, next_value) SELECT :name, :scope, ({seed});",
+                params,
+            )
+            row = conn.execute(update, params).fetchone()
+        end = row[0]
+        return end - count, end
+
+
+#   Move every global sequence past the ids already in its table
+#   (needed after rows were inserted without the allocator, e.g. a bulk load).
+#   Scoped sequences are dropped and re-seeded on next use.
+def resync(conn: sqlite3.Connection):
+    for name, (seed, _) in SEQUENCES.items():
+        if ":scope" in seed:
+            conn.execute("DELETE FROM id_sequences WHERE name = ?;", (name,))
+            continue
+        conn.execute(
+            f"UPDATE id_sequences SET next_value = MAX(next_value, ({seed})) WHERE name = :name;",
+            {"name": name, "scope": 0},
+        )
@@ -0,0 +1,243 @@
+import atexit
+import sqlite3
+import threading
+import time
+
+from src.domain.models import SessionInf
+
+#   In-memory carts with write-behind persistence.
+#
+#   The cart of a session is read from the cart table once, on first use,
+#   and then lives in memory as {pid: qty}: looking at it, adding, changing
+#   and removing lines cost no SQL at all (product columns and stock come
+#   from the ProductCache). Changed lines are written back to the cart table
+#   (one executemany upsert plus one executemany delete) when
+#       - the cart is checked out: flush_locked() runs in the order's
+#         transaction right before place_order(), so the guarded stock
+#         decrement still works on exactly what the customer sees;
+#       - the session ends (logout) or the store closes (also at exit);
+#       - the cart has been idle for `idle_timeout` seconds (background
+#         thread). Idle carts are then dropped from memory; the next access
+#         loads them again.
+#   The write-back joins the caller's transaction and commits with it (so a
+#   logout writes the cart and closes the session in one commit). If that
+#   transaction is rolled back after all, resync() makes the next flush
+#   rewrite the whole cart.
+#   Stock is checked against the cached stock_count when lines are added,
+#   exactly as before; the binding check is still the one in checkout.
+#
+#   Putting something in the cart is also recorded durably in cartedSession
+#   (migration 10), for the conversion funnel: a trigger marks the session
+#   when its first cart row is written, and clear() marks carts that were
+#   emptied before any row reached the table.
+#
+#   A session's cart is owned by the process serving that session. Rows
+#   another connection writes into a cart that is loaded here are not seen
+#   until the cart is dropped (idle, checkout, clear).
+
+_LOAD = "SELECT pid, qty FROM cart WHERE cid = ? AND sessionNo = ?;"
+_UPSERT = """
+    INSERT INTO cart (cid, sessionNo, pid, qty) VALUES (?, ?, ?, ?)
+    ON CONFLICT (cid, sessionNo, pid) DO UPDATE SET qty = excluded.qty;
+"""
+_DELETE = "DELETE FROM cart WHERE cid = ? AND sessionNo = ? AND pid = ?;"
+_CLEAR = "DELETE FROM cart WHERE cid = ? AND sessionNo = ?;"
+_MARK_CARTED = """
+    INSERT OR IGNORE INTO cartedSession (cid, sessionNo, ts)
+    VALUES (?, ?, datetime('now', 'localtime'));
+"""
+
+
+class _Cart:
+
+    def __init__(self, lines):
+        self.lines = lines          #   pid -> qty
+        self.dirty = set()          #   pids changed since the last write
+        self.stale = False          #   table rows unknown: rewrite all lines on the next write
+        self.carted = bool(lines)   #   a product was put in the cart this session
+        self.touched = time.monotonic()
+
+
+class CartStore:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool whose writer receives the batches.
+    #       idle_timeout (float): Seconds without access after which a cart is
+    #           written back and dropped from memory (0: only on flush/close).
+    def __init__(self, pool, idle_timeout=120.0):
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        self._carts = {}            #   (cid, sessionNo) -> _Cart
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self.loads = 0
+        self.writes = 0
+        atexit.register(self.close)
+
+    @staticmethod
+    def _key(sessionInformation):
+        return sessionInformation.cid, sessionInformation.sessionNo
+
+    #   The cart of a session, loaded on first use. Call with the lock held;
+    #   a miss releases it while reading, because the read may need the writer
+    #   (single-connection mode) and flush_locked() takes the lock under it.
+    def _cart(self, sessionInformation):
+        key = self._key(sessionInformation)
+        cart = self._carts.get(key)
+        if cart is None:
+            self._lock.release()
+            try:
+                with self.pool.reader() as conn:
+                    lines = dict(conn.execute(_LOAD, key).fetchall())
+            finally:
+                self._lock.acquire()
+            cart = self._carts.get(key)
+            if cart is None:
+                cart = self._carts[key] = _Cart(lines)
+                self.loads += 1
+                if not self._closed:
+                    self._start_timer()
+        cart.touched = time.monotonic()
+        return cart
+
+    #   Cart lines ordered by pid, as {pid: qty}.
+    #   Raises:
+    #           sqlite3.Error: If the cart has to be loaded and cannot be.
+    def lines(self, sessionInformation):
+        with self._lock:
+            return dict(sorted(self._cart(sessionInformation).lines.items()))
+
+    #   Quantity of one product in the cart, None if it is not there.
+    def qty(self, sessionInformation, pid):
+        with self._lock:
+            return self._cart(sessionInformation).lines.get(pid)
+
+    #   Set the quantity of one line; 0 removes it.
+    def set_qty(self, sessionInformation, pid, qty):
+        with self._lock:
+            cart = self._cart(sessionInformation)
+            if qty > 0:
+                cart.lines[pid] = qty
+                cart.carted = True
+            else:
+                cart.lines.pop(pid, None)
+            cart.dirty.add(pid)
+
+    #   Empty the cart, in memory and in the table (committed with the caller's transaction).
+    def clear(self, sessionInformation):
+        key = self._key(sessionInformation)
+        with self._lock:
+            cart = self._carts.pop(key, None)
+        with self.pool.writer() as conn:
+            if cart is not None and cart.carted:
+                conn.execute(_MARK_CARTED, key)
+            conn.execute(_CLEAR, key)
+
+    #   Write the pending changes of one cart on `conn`, the writer connection
+    #   held by the caller. Nothing is committed here: the caller's transaction
+    #   carries the lines (checkout, logout).
+    def flush_locked(self, conn, sessionInformation):
+        key = self._key(sessionInformation)
+        with self._lock:
+            cart = self._carts.get(key)
+            if cart is None or not (cart.dirty or cart.stale):
+                return 0
+            pending, cart.dirty = cart.dirty, set()
+            stale, cart.stale = cart.stale, False
+            if stale:
+                pending = set(cart.lines)
+            upserts = [(*key, pid, cart.lines[pid]) for pid in pending if pid in cart.lines]
+            deletes = [(*key, pid) for pid in pending if pid not in cart.lines]
+        try:
+            if stale:
+                conn.execute(_CLEAR, key)
+            if upserts:
+                conn.executemany(_UPSERT, upserts)
+            if deletes:
+                conn.executemany(_DELETE, deletes)
+        except sqlite3.Error:
+            self.resync(sessionInformation)
+            raise
+        self.writes += 1
+        return len(pending)
+
+    #   The transaction that wrote this cart was rolled back: rewrite the
+    #   whole cart on the next flush.
+    def resync(self, sessionInformation):
+        with self._lock:
+            cart = self._carts.get(self._key(sessionInformation))
+            if cart is not None:
+                cart.stale = True
+
+    #   Write the pending changes of one session's cart.
+    #   Returns:
+    #           int: Number of lines written.
+    def flush(self, sessionInformation):
+        with self._lock:
+            cart = self._carts.get(self._key(sessionInformation))
+            if cart is None or not (cart.dirty or cart.stale):
+                return 0
+        try:
+            with self.pool.writer() as conn:
+                return self.flush_locked(conn, sessionInformation)
+        except sqlite3.Error:
+            self.resync(sessionInformation)
+            raise
+
+    #   Forget a cart without writing it (after checkout emptied it in the table).
+    def drop(self, sessionInformation):
+        with self._lock:
+            self._carts.pop(self._key(sessionInformation), None)
+
+    #   Write every cart with pending changes; drop carts idle for `older_than` seconds.
+    def flush_all(self, older_than=None):
+        now = time.monotonic()
+        with self._lock:
+            keys = list(self._carts)
+        for cid, sno in keys:
+            session = SessionInf(cid=cid, sessionNo=sno)
+            try:
+                self.flush(session)
+            except sqlite3.Error as e:
+                print("\n[X] SQL Error in CartStore.flush_all()\n")
+                print(e)
+                continue
+            if older_than is not None:
+                with self._lock:
+                    cart = self._carts.get((cid, sno))
+                    if cart is not None and not (cart.dirty or cart.stale) and now - cart.touched >= older_than:
+                        del self._carts[(cid, sno)]
+
+    #   Number of carts held in memory.
+    def size(self):
+        with self._lock:
+            return len(self._carts)
+
+    def _start_timer(self):
+        if self._thread is None and self.idle_timeout:
+            self._thread = threading.Thread(target=self._run, name="cart-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.idle_timeout / 2)
+            self._wake.clear()
+            if not self._closed:
+                self.flush_all(older_than=self.idle_timeout)
+
+    #   Write everything back and stop the background thread. Safe to call more than once.
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        try:
+            self.flush_all()
+        except sqlite3.Error as e:
+            print("\n[X] SQL Error in CartStore.close()\n")
+            print(e)
+
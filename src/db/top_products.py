@@ -0,0 +1,66 @@
+import sqlite3
+
+#   Per-product order/view counters and top-K queries over them.
+#
+#   product_counters (migration 5) holds, per pid:
+#       orders  number of distinct orders containing the product
+#       views   number of viewedProduct rows for the product
+#   Triggers on orderlines and viewedProduct keep it current for every write
+#   path (checkout, the batched event writer, imports, manual edits); rows
+#   skipped by INSERT OR IGNORE never fire them, so duplicates are not counted.
+#
+#   Top-K uses the same tie rule as before: the K highest distinct counts are
+#   kept and every product having one of them is returned. Both steps walk the
+#   (metric DESC, pid) index from the top, so the cost is proportional to the rows
+#   returned, not to the size of orderlines/viewedProduct.
+
+METRICS = ("orders", "views")
+
+_TOP_K = """
+    SELECT pc.pid, p.name, pc.{metric} AS count
+    FROM product_counters pc
+    JOIN products p ON p.pid = pc.pid
+    WHERE pc.{metric} >= (
+        SELECT MIN(c) FROM (
+            SELECT DISTINCT pc2.{metric} AS c
+            FROM product_counters pc2
+            JOIN products p2 ON p2.pid = pc2.pid
+            WHERE pc2.{metric} > 0
+            ORDER BY pc2.{metric} DESC
+            LIMIT :k))
+    ORDER BY pc.{metric} DESC, pc.pid ASC;
+"""
+
+_REBUILD = [
+    "DELETE FROM product_counters;",
+    """
+    INSERT INTO product_counters (pid, orders, views)
+    SELECT pid, SUM(orders), SUM(views) FROM (
+        SELECT pid, COUNT(DISTINCT ono) AS orders, 0 AS views FROM orderlines GROUP BY pid
+        UNION ALL
+        SELECT pid, 0, COUNT(*) FROM viewedProduct GROUP BY pid)
+    GROUP BY pid;
+    """,
+]
+
+
+#   Top products by `metric` with ties at rank k.
+#   Args:
+#       conn (sqlite3.Connection): Connection to the store.
+#       metric (str): "orders" (distinct orders) or "views".
+#       k (int): Number of distinct count values to keep.
+#   Returns:
+#           list[dict]: {pid, name, count}, highest count first, then by pid.
+def top_k(conn: sqlite3.Connection, metric, k=3):
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    if k < 1:
+        return []
+    rows = conn.execute(_TOP_K.format(metric=metric), {"k": int(k)}).fetchall()
+    return [dict(pid=r[0], name=r[1], count=r[2]) for r in rows]
+
+
+#   Recompute the counters from orderlines/viewedProduct. Caller owns the transaction.
+def rebuild_counters(conn: sqlite3.Connection):
+    for stmt in _REBUILD:
+        conn.execute(stmt)
@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+
+#   Unit of work: several related writes, one commit.
+#
+#       with repo.transaction() as conn:
+#           repo.update_session(session)    # nested: a savepoint, no commit
+#           repo.clear_cart(session)
+#
+#   The outermost transaction() runs on the pool's writer inside
+#   BEGIN IMMEDIATE + SAVEPOINT; every nested one is a SAVEPOINT of its own.
+#   An exception rolls back to the savepoint of the block it leaves (and
+#   re-raises), so the work of the enclosing blocks is kept.
+#
+#   Group commit: a finished outermost unit does not commit by itself. Its
+#   transaction stays open as the pool's pending Batch (src/db/pool.py), and
+#   units of other threads that are already waiting for the writer join it.
+#   The batch is committed once, by the first of its units that finds
+#       - no other unit running or waiting,
+#       - `max_batch` units in the batch, or
+#       - `max_wait` seconds passed since it finished,
+#   and every unit returns only after that commit (raising its error, if
+#   any). A single-threaded caller therefore commits at once; concurrent
+#   sessions share commits (and the fsync of synchronous=FULL).
+#   Plain writer() users commit a pending batch before they start.
+#
+#   Work that must wait for the outcome (evicting cached rows the unit wrote)
+#   is registered with on_end() and runs once the outermost unit has been
+#   committed or rolled back.
+
+
+class UnitOfWork:
+
+    #   Args:
+    #       pool (ConnectionPool): Pool whose writer runs the units.
+    #       max_wait (float): Seconds a finished unit waits for others to join its commit.
+    #       max_batch (int): Units after which a batch is committed without waiting.
+    def __init__(self, pool, max_wait=0.002, max_batch=32):
+        self.pool = pool
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0            #   outermost units running or waiting for the writer
+
+    #   Nesting depth of the calling thread (0: not inside a unit).
+    def depth(self):
+        return getattr(self._local, "depth", 0)
+
+    #   Run fn() when the calling thread's outermost unit ends, after its commit
+    #   or rollback; at once when no unit is open.
+    def on_end(self, fn):
+        if not self.depth():
+            fn()
+            return
+        self._local.on_end.append(fn)
+
+    #   Open a unit (or a savepoint, when nested) and yield the writer connection.
+    #   Raises:
+    #           sqlite3.Error: If the unit or its batch commit failed.
+    @contextmanager
+    def transaction(self):
+        depth = self.depth()
+        if depth:
+            with self._savepoint(self.pool.current_writer(), f"uow_{depth}", depth) as conn:
+                yield conn
+            return
+
+        with self._lock:
+            self._active += 1
+        self._local.on_end = []
+        failed = True
+        batch = None
+        try:
+            try:
+                with self.pool.writer(group=True) as conn:
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN IMMEDIATE;")
+                    with self._savepoint(conn, "uow", 0):
+                        yield conn
+                batch = self.pool.joined_batch()
+                failed = False
+            finally:
+                with self._lock:
+                    self._active -= 1
+                if failed:
+                    batch = self.pool.joined_batch()
+                    if batch is not None and self._idle():
+                        #   don't leave the other units' work pending
+                        self.pool.commit_batch(batch)
+            if batch is not None:
+                self._settle(batch)
+        finally:
+            callbacks, self._local.on_end = self._local.on_end, []
+            for fn in callbacks:
+                fn()
+
+    @contextmanager
+    def _savepoint(self, conn, name, depth):
+        conn.execute(f"SAVEPOINT {name};")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            #   SQLite may already have rolled the whole transaction back
+            if conn.in_transaction:
+                conn.execute(f"ROLLBACK TO {name};")
+                conn.execute(f"RELEASE {name};")
+            raise
+        else:
+            conn.execute(f"RELEASE {name};")
+        finally:
+            self._local.depth = depth
+
+    def _idle(self):
+        with self._lock:
+            return self._active == 0
+
+    #   Wait until `batch` is committed, committing it ourselves when it is our turn.
+    def _settle(self, batch):
+        deadline = time.monotonic() + self.max_wait
+        while not batch.done.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or batch.units >= self.max_batch or self._idle():
+                self.pool.commit_batch(batch)
+                break
+            batch.done.wait(min(remaining, 0.0005))
+        if batch.error is not None:
+            raise batch.error
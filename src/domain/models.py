@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class User:
@@ -11,3 +12,25 @@ class User:
 class SessionInf:
     cid: int
     sessionNo: int
+
+@dataclass
+class Shortage:
+    pid: int
+    name: str
+    requested: int
+    available: int
+
+@dataclass
+class CheckoutResult:
+    ono: Optional[int] = None
+    shortages: List[Shortage] = field(default_factory=list)
+    empty: bool = False
+    #   pid -> stock_count after a successful checkout
+    stock: Dict[int, int] = field(default_factory=dict)
+
+@dataclass
+class Page:
+    rows: List[Any]
+    number: int = 0
+    has_prev: bool = False
+    has_next: bool = False
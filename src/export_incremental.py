@@ -0,0 +1,265 @@
+import argparse
+import csv
+import datetime as dt
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.export_to_excel import Progress, iter_chunks, list_tables, open_readonly
+
+#   Incremental export: each run writes only what changed since the last one.
+#
+#   Layout of the output directory:
+#       state.json                   watermarks, table schemas, files per table
+#       deltas/<table>/<run>.csv     rows written by one run
+#       snapshot/<table>.csv         full table, produced by `compact`
+#
+#   Append-only tables (orders, orderlines, search, viewedProduct, sessions)
+#   are read past a rowid watermark. Rowids are handed out in commit order,
+#   so unlike ono (allocated in blocks per process) or ts (stamped when the
+#   event happens, flushed later by the event writer) they cannot let a late
+#   commit slip under the watermark. The row at the watermark is remembered
+#   by key: if VACUUM has renumbered rowids, the table is exported in full
+#   again instead of silently skipping rows. Sessions also get an update when
+#   they are closed, so rows whose end_time is newer than the previous run
+#   (minus SINCE_OVERLAP) are included as well.
+#   Every other table is small and mutable (stock, prices, carts): each run
+#   writes it in full.
+#
+#   `compact` merges, per table, the last full file and every delta after it
+#   into snapshot/<table>.csv, keeping the newest version of each primary key.
+#   The merge runs through a temporary SQLite file, so memory stays flat.
+#   Deleted rows are not tracked; a full run (--full) picks them up.
+#
+#   Usage: python -m src.export_incremental [data/store.db] [export_inc/] run|compact [--full] [--prune]
+
+#   table -> extra condition for rows changed in place (bound to :since)
+INCREMENTAL = {
+    "orders": None,
+    "orderlines": None,
+    "search": None,
+    "viewedProduct": None,
+    "sessions": "end_time >= :since",
+}
+
+#   closed sessions are picked up from this long before the previous run started
+SINCE_OVERLAP = dt.timedelta(minutes=10)
+
+STATE_FILE = "state.json"
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"runs": 0, "last_run": None, "tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+#   Column names, declared types and primary-key columns of a table.
+def table_schema(conn: sqlite3.Connection, table):
+    info = conn.execute(f'PRAGMA table_info("{table}");').fetchall()
+    pk = [r[1] for r in sorted((r for r in info if r[5]), key=lambda r: r[5])]
+    return {
+        "columns": [r[1] for r in info],
+        "types": [r[2] for r in info],
+        "pk": pk or ["rowid"],
+    }
+
+
+def _write_csv(path, columns, chunks):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+#   (max rowid, primary key of that row) of a table, or (0, None) when empty.
+def _watermark(conn, table, pk):
+    row = conn.execute(
+        f'SELECT rowid, {", ".join(pk)} FROM "{table}" ORDER BY rowid DESC LIMIT 1;').fetchone()
+    return (row[0], list(row[1:])) if row else (0, None)
+
+
+#   True if the row recorded at the previous watermark is still there.
+def _watermark_valid(conn, table, pk, mark):
+    if not mark or not mark.get("key"):
+        return False
+    row = conn.execute(
+        f'SELECT {", ".join(pk)} FROM "{table}" WHERE rowid = ?;', (mark["rowid"],)).fetchone()
+    return row is not None and list(row) == mark["key"]
+
+
+#   Export everything that changed since the previous run.
+#   Args:
+#       db_path (str): Path to the store.
+#       out_dir (str): Export directory (created if missing).
+#       full (bool): Ignore watermarks and write every table in full.
+#       chunk_size (int): Rows fetched per step.
+#       progress (Progress): Reporter; finish() is called per table.
+#   Returns:
+#           dict: table -> (mode, rows written) for this run.
+def run_export(db_path, out_dir, full=False, chunk_size=5000, progress=None):
+    progress = progress or Progress()
+    state = load_state(out_dir)
+    run = state["runs"] + 1
+    started_at = dt.datetime.now()
+    since = None
+    if state["last_run"]:
+        since = (dt.datetime.strptime(state["last_run"], _TS_FORMAT) - SINCE_OVERLAP).strftime(_TS_FORMAT)
+
+    summary = {}
+    conn = open_readonly(db_path)
+    try:
+        #   one read transaction: watermarks and rows come from the same snapshot
+        conn.execute("BEGIN;")
+        for table in list_tables(conn):
+            started = time.perf_counter()
+            entry = state["tables"].setdefault(table, {"files": []})
+            entry.update(table_schema(conn, table))
+            pk = entry["pk"]
+
+            where, params, mode = None, {}, "full"
+            if table in INCREMENTAL:
+                mark = entry.get("watermark")
+                if not full and _watermark_valid(conn, table, pk, mark):
+                    mode = "delta"
+                    where = "rowid > :rowid"
+                    params = {"rowid": mark["rowid"]}
+                    if INCREMENTAL[table] and since:
+                        where = f"({where} OR {INCREMENTAL[table]})"
+                        params["since"] = since
+                rowid, key = _watermark(conn, table, pk)
+                entry["watermark"] = {"rowid": rowid, "key": key}
+
+            rel = os.path.join("deltas", table, f"{run:06d}.csv")
+            os.makedirs(os.path.join(out_dir, "deltas", table), exist_ok=True)
+            columns, chunks = iter_chunks(conn, table, chunk_size, where, params, order_by="rowid")
+            rows = _write_csv(os.path.join(out_dir, rel), columns, chunks)
+            entry["files"].append({"path": rel, "mode": mode, "run": run, "rows": rows})
+            summary[table] = (mode, rows)
+            progress.finish(f"{table} ({mode})", rows, time.perf_counter() - started)
+        conn.commit()
+    finally:
+        conn.close()
+
+    state["runs"] = run
+    state["last_run"] = started_at.strftime(_TS_FORMAT)
+    save_state(out_dir, state)
+    return summary
+
+
+#   Merge the files of one table (oldest first) into `dst`, newest row per key wins.
+def _merge(out_dir, entry, files, dst, chunk_size):
+    cols = ", ".join(f'"{c}" {t}' for c, t in zip(entry["columns"], entry["types"]))
+    pk = [c for c in entry["pk"] if c != "rowid"]
+    key = f", PRIMARY KEY ({', '.join(pk)})" if pk else ""
+    marks = ", ".join("?" * len(entry["columns"]))
+
+    fd, tmp_db = tempfile.mkstemp(prefix="compact_", suffix=".db")
+    os.close(fd)
+    merge = sqlite3.connect(tmp_db)
+    try:
+        merge.execute("PRAGMA journal_mode = OFF;")
+        merge.execute("PRAGMA synchronous = OFF;")
+        merge.execute(f"CREATE TABLE t ({cols}{key});")
+        for f in files:
+            with open(os.path.join(out_dir, f["path"]), newline="", encoding="utf-8") as fh:
+                reader = csv.reader(fh)
+                next(reader, None)
+                #   csv has no NULL; the export writes None as an empty field
+                rows = ([v if v != "" else None for v in r] for r in reader)
+                merge.executemany(f"INSERT OR REPLACE INTO t VALUES ({marks});", rows)
+        merge.commit()
+        order = f"ORDER BY {', '.join(pk)}" if pk else ""
+        cur = merge.execute(f"SELECT * FROM t {order};")
+
+        def chunks():
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+        tmp_out = dst + ".tmp"
+        rows = _write_csv(tmp_out, entry["columns"], chunks())
+        os.replace(tmp_out, dst)
+        return rows
+    finally:
+        merge.close()
+        os.remove(tmp_db)
+
+
+#   Merge every table's deltas into snapshot/<table>.csv.
+#   Args:
+#       out_dir (str): Export directory written by run_export().
+#       prune (bool): Make the snapshot the new base file and delete the merged deltas.
+#   Returns:
+#           dict: table -> rows in the snapshot.
+def compact(out_dir, prune=False, chunk_size=5000, progress=None):
+    progress = progress or Progress()
+    state = load_state(out_dir)
+    os.makedirs(os.path.join(out_dir, "snapshot"), exist_ok=True)
+    summary = {}
+    for table, entry in state["tables"].items():
+        if not entry["files"]:
+            continue
+        started = time.perf_counter()
+        #   everything before the last full file is superseded by it
+        base = max(i for i, f in enumerate(entry["files"]) if f["mode"] == "full")
+        files = entry["files"][base:]
+        rel = os.path.join("snapshot", f"{table}.csv")
+        rows = _merge(out_dir, entry, files, os.path.join(out_dir, rel), chunk_size)
+        summary[table] = rows
+        if prune:
+            for f in entry["files"]:
+                if f["path"] != rel:
+                    os.remove(os.path.join(out_dir, f["path"]))
+            entry["files"] = [{"path": rel, "mode": "full", "run": files[-1]["run"], "rows": rows}]
+        progress.finish(table, rows, time.perf_counter() - started)
+    save_state(out_dir, state)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental export with per-table watermarks")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("out_dir", nargs="?", default="export_inc")
+    parser.add_argument("command", nargs="?", choices=("run", "compact"), default="run")
+    parser.add_argument("--full", action="store_true", help="ignore watermarks, export every table in full")
+    parser.add_argument("--prune", action="store_true", help="compact: delete deltas merged into the snapshot")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows fetched per step")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    progress = Progress(enabled=not args.quiet)
+    if args.command == "compact":
+        summary = compact(args.out_dir, args.prune, args.chunk_size, progress)
+        print(f"Compacted {len(summary)} tables, {sum(summary.values()):,} rows into {args.out_dir}/snapshot/")
+        return 0
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    summary = run_export(args.db_path, args.out_dir, args.full, args.chunk_size, progress)
+    deltas = sum(rows for mode, rows in summary.values() if mode == "delta")
+    fulls = sum(rows for mode, rows in summary.values() if mode == "full")
+    print(f"Run {load_state(args.out_dir)['runs']}: {deltas:,} new/changed rows, {fulls:,} rows in full tables")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,186 @@
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from openpyxl import Workbook
+
+from src.export_to_excel import Progress, count_rows, iter_chunks, list_tables, open_readonly, write_sheets
+
+#   Export each table of the store to its own file, tables in parallel.
+#
+#   Serializing rows (openpyxl above all) is CPU-bound, so tables are handed
+#   to a pool of worker processes, biggest first. Each worker opens its own
+#   read-only connection and streams its table in chunks, like
+#   export_to_excel; nothing is shared between processes but the file path.
+#
+#   Formats:
+#       csv      <table>.csv, header row + one line per row
+#       parquet  <table>.parquet, one row group per chunk (needs pyarrow)
+#       xlsx     <table>.xlsx, write-only workbook, split across sheets if needed
+#
+#   Usage: python -m src.export_tables [data/store.db] [export/] [--format csv|parquet|xlsx] [--workers N]
+
+FORMATS = ("csv", "parquet", "xlsx")
+
+
+#   Each _write_* returns the number of data rows written.
+def _write_csv(path, columns, chunks):
+    done = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            done += len(rows)
+    return done
+
+
+#   Arrow type for a declared SQLite column type, by SQLite's affinity rules.
+#   Anything that is not clearly integer or real is exported as text.
+def _arrow_type(pa, decl):
+    decl = (decl or "").upper()
+    if "INT" in decl:
+        return pa.int64()
+    if any(t in decl for t in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _write_parquet(path, columns, chunks, conn, table):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("parquet export needs pyarrow: pip install pyarrow")
+
+    decls = {r[1]: r[2] for r in conn.execute(f'PRAGMA table_info("{table}");')}
+    schema = pa.schema([(c, _arrow_type(pa, decls.get(c))) for c in columns])
+    text_cols = [i for i, f in enumerate(schema) if pa.types.is_string(f.type)]
+
+    done = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            cols = list(zip(*rows))
+            for i in text_cols:
+                cols[i] = [v if v is None or isinstance(v, str) else str(v) for v in cols[i]]
+            writer.write_table(pa.table(cols, schema=schema))
+            done += len(rows)
+    return done
+
+
+def _write_xlsx(path, columns, chunks, total, table):
+    wb = Workbook(write_only=True)
+    done = write_sheets(wb, table, columns, chunks, total)
+    wb.save(path)
+    return done
+
+
+#   Export one table to `out_dir`. Runs inside a worker process.
+#   Returns:
+#           dict: {table, rows, path, bytes, seconds}
+def export_table(db_path, table, out_dir, fmt="csv", chunk_size=5000):
+    started = time.perf_counter()
+    path = os.path.join(out_dir, f"{table}.{fmt}")
+    conn = open_readonly(db_path)
+    try:
+        #   one read transaction: the count (for the xlsx sheet split) matches the rows read
+        conn.execute("BEGIN;")
+        total = count_rows(conn, table) if fmt == "xlsx" else None
+        columns, chunks = iter_chunks(conn, table, chunk_size)
+        if fmt == "csv":
+            rows = _write_csv(path, columns, chunks)
+        elif fmt == "parquet":
+            rows = _write_parquet(path, columns, chunks, conn, table)
+        elif fmt == "xlsx":
+            rows = _write_xlsx(path, columns, chunks, total, table)
+        else:
+            raise ValueError(f"format must be one of {FORMATS}")
+        conn.commit()
+    finally:
+        conn.close()
+    return {
+        "table": table,
+        "rows": rows,
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+#   Export tables in parallel, one file per table.
+#   Args:
+#       db_path (str): Path to the store.
+#       out_dir (str): Directory for the output files (created if missing).
+#       fmt (str): "csv", "parquet" or "xlsx".
+#       tables (list[str]): Tables to export (default: all but the internal ones).
+#       workers (int): Worker processes; 1 exports in this process, one table after another.
+#       chunk_size (int): Rows fetched per step.
+#       progress (Progress): Reporter; finish() is called as each table completes.
+#       internal (bool): With tables=None, export the internal tables too (see export_to_excel).
+#   Returns:
+#           list[dict]: One result per table (see export_table()), in completion order.
+def export_all(db_path, out_dir, fmt="csv", tables=None, workers=None, chunk_size=5000, progress=None,
+               internal=False):
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    progress = progress or Progress()
+    os.makedirs(out_dir, exist_ok=True)
+
+    conn = open_readonly(db_path)
+    try:
+        #   biggest first, so a large table does not start last and finish alone
+        sizes = {t: count_rows(conn, t) for t in (tables or list_tables(conn, internal))}
+    finally:
+        conn.close()
+    order = sorted(sizes, key=sizes.get, reverse=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(order) or 1))
+
+    results = []
+    if workers == 1:
+        for table in order:
+            r = export_table(db_path, table, out_dir, fmt, chunk_size)
+            progress.finish(table, r["rows"], r["seconds"])
+            results.append(r)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(export_table, db_path, t, out_dir, fmt, chunk_size) for t in order]
+        for future in as_completed(futures):
+            r = future.result()
+            progress.finish(r["table"], r["rows"], r["seconds"])
+            results.append(r)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every table of the store to one file per table, in parallel")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("out_dir", nargs="?", default="export")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows fetched per step")
+    parser.add_argument("--table", action="append", dest="tables", help="export only this table (repeatable)")
+    parser.add_argument("--internal", action="store_true",
+                        help="also export internal tables (rollups, id sequences, change log, ...)")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        results = export_all(args.db_path, args.out_dir, args.format, args.tables, args.workers,
+                             args.chunk_size, Progress(enabled=not args.quiet), args.internal)
+    except (RuntimeError, sqlite3.Error) as e:
+        print("\n[X] Export failed\n")
+        print(e)
+        return 1
+    print(f"Exported {len(results)} tables, {sum(r['rows'] for r in results):,} rows, "
+          f"{sum(r['bytes'] for r in results) / 1e6:.1f} MB to {args.out_dir}/ "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
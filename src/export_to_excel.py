@@ -1,23 +1,211 @@
+import argparse
+import itertools
 import sqlite3
-import pandas as pd
+import sys
+import time
 
-db_path = "data/store.db"
-out_path = "store_export.xlsx"
+from openpyxl import Workbook
 
-conn = sqlite3.connect(db_path)
+from src.db.pool import readonly_uri
 
-# find all tables
-tables = pd.read_sql_query(
-    "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';",
-    conn
-)["name"].tolist()
+#   Export every table of the store to one xlsx workbook, streaming.
+#
+#   Rows are read with fetchmany() in chunks and appended to a write-only
+#   openpyxl workbook, which spools each sheet to a temporary file instead of
+#   building the cell tree in memory. Peak memory is therefore one chunk plus
+#   openpyxl's per-sheet buffers, whatever the table size.
+#   A sheet holds at most 1,048,576 rows (header included); larger tables are
+#   split across numbered sheets: viewedProduct_1, viewedProduct_2, ...
+#   Every table is read in one read transaction, so the workbook is a single
+#   snapshot of the store even while checkouts keep committing.
+#
+#   Usage: python -m src.export_to_excel [data/store.db] [store_export.xlsx] [--chunk-size 5000]
 
-print("Tables found:", tables)
+EXCEL_MAX_ROWS = 1048576
+SHEET_NAME_MAX = 31
 
-with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
-    for t in tables:
-        df = pd.read_sql_query(f"SELECT * FROM {t};", conn)
-        df.to_excel(writer, sheet_name=t[:31], index=False)
+#   Bookkeeping tables added by migrations (id allocation, rollups, counters,
+#   change feed, carted sessions). Derived or internal, so left out of an
+#   export unless asked for.
+INTERNAL_TABLES = (
+    "id_sequences", "sales_daily", "sales_daily_product", "sales_daily_customer",
+    "product_counters", "change_log", "change_topics", "cartedSession",
+)
 
-conn.close()
-print(f"Exported to {out_path}")
+#   Virtual tables (the FTS index) and their shadow tables are derived data.
+_TABLES = """
+    SELECT name FROM sqlite_master
+    WHERE type = 'table'
+      AND name NOT LIKE 'sqlite_%'
+      AND sql NOT LIKE 'CREATE VIRTUAL TABLE%'
+      AND name NOT IN (
+          SELECT v.name || s.suffix
+          FROM sqlite_master v,
+               (SELECT '_data' AS suffix UNION ALL SELECT '_idx' UNION ALL SELECT '_content'
+                UNION ALL SELECT '_docsize' UNION ALL SELECT '_config') s
+          WHERE v.type = 'table' AND v.sql LIKE 'CREATE VIRTUAL TABLE%')
+    ORDER BY rowid;
+"""
+
+
+#   Open the store read-only; an export must never write to it.
+def open_readonly(db_path) -> sqlite3.Connection:
+    return sqlite3.connect(readonly_uri(db_path), uri=True)
+
+
+#   Names of the tables to export, in creation order.
+#   Args:
+#       internal (bool): Include INTERNAL_TABLES as well.
+def list_tables(conn: sqlite3.Connection, internal=False):
+    return [r[0] for r in conn.execute(_TABLES) if internal or r[0] not in INTERNAL_TABLES]
+
+
+def count_rows(conn: sqlite3.Connection, table) -> int:
+    return conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+
+
+#   Stream a table as (columns, chunk iterator).
+#   Args:
+#       conn (sqlite3.Connection): Connection to the store.
+#       table (str): Table name (from list_tables()).
+#       chunk_size (int): Rows per fetchmany().
+#       where (str): Optional SQL condition; named `params` are bound to it.
+#       order_by (str): Optional ORDER BY expression.
+#   Returns:
+#           tuple[list[str], iterator[list[tuple]]]
+def iter_chunks(conn: sqlite3.Connection, table, chunk_size=5000, where=None, params=None, order_by=None):
+    sql = f'SELECT * FROM "{table}"'
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    cur = conn.execute(sql + ";", params or {})
+    columns = [d[0] for d in cur.description]
+
+    def chunks():
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    return columns, chunks()
+
+
+#   Sheet names for a table of about `total` rows: the table name alone when
+#   it fits in one sheet, otherwise name_1, name_2, ... (all within 31 chars).
+#   Never runs out: if more rows arrive than were counted, numbering goes on.
+def sheet_names(table, total, rows_per_sheet):
+    parts = max(1, -(-total // rows_per_sheet))
+    if parts == 1:
+        yield table[:SHEET_NAME_MAX]
+    for n in itertools.count(1 if parts > 1 else 2):
+        yield f"{table[:SHEET_NAME_MAX - len(str(n)) - 1]}_{n}"
+
+
+#   Append a streamed table to a write-only workbook, starting a new
+#   numbered sheet every `rows_per_sheet` rows.
+#   Returns:
+#           int: Number of data rows written.
+def write_sheets(wb, table, columns, chunks, total, rows_per_sheet=EXCEL_MAX_ROWS - 1, progress=None):
+    names = sheet_names(table, total, rows_per_sheet)
+    ws = wb.create_sheet(next(names))
+    ws.append(columns)
+    in_sheet = done = 0
+    for rows in chunks:
+        for row in rows:
+            if in_sheet == rows_per_sheet:
+                ws = wb.create_sheet(next(names))
+                ws.append(columns)
+                in_sheet = 0
+            ws.append(row)
+            in_sheet += 1
+        done += len(rows)
+        if progress is not None:
+            progress.update(table, done, total)
+    return done
+
+
+class Progress:
+    """One status line per table, rewritten in place on a terminal."""
+
+    def __init__(self, stream=sys.stdout, enabled=True):
+        self.stream = stream
+        self.enabled = enabled
+        self.tty = enabled and stream.isatty()
+
+    def update(self, table, done, total):
+        if self.tty:
+            pct = (100 * done // total) if total else 100
+            self.stream.write(f"\r  {table:<24} {done:>12,} / {total:,} rows ({pct}%)")
+            self.stream.flush()
+
+    def finish(self, table, done, seconds):
+        if self.enabled:
+            line = f"  {table:<24} {done:>12,} rows in {seconds:.1f}s"
+            #   on a terminal, overwrite the progress line and clear its tail
+            self.stream.write(f"\r{line}\x1b[K\n" if self.tty else f"{line}\n")
+            self.stream.flush()
+
+
+#   Export tables to a write-only xlsx workbook.
+#   Args:
+#       db_path (str): Path to the store.
+#       out_path (str): xlsx file to write.
+#       tables (list[str]): Tables to export (default: all but INTERNAL_TABLES).
+#       chunk_size (int): Rows fetched and appended per step.
+#       rows_per_sheet (int): Data rows per sheet before splitting.
+#       progress (Progress): Progress reporter (default: stdout).
+#       internal (bool): With tables=None, export INTERNAL_TABLES too.
+#   Returns:
+#           dict: table -> number of rows written.
+def export_xlsx(db_path, out_path, tables=None, chunk_size=5000, rows_per_sheet=EXCEL_MAX_ROWS - 1, progress=None,
+                internal=False):
+    progress = progress or Progress()
+    conn = open_readonly(db_path)
+    wb = Workbook(write_only=True)
+    written = {}
+    try:
+        #   one read transaction: every count and every table come from the same snapshot
+        conn.execute("BEGIN;")
+        for table in tables or list_tables(conn, internal):
+            started = time.perf_counter()
+            total = count_rows(conn, table)
+            columns, chunks = iter_chunks(conn, table, chunk_size)
+            done = write_sheets(wb, table, columns, chunks, total, rows_per_sheet, progress)
+            written[table] = done
+            progress.finish(table, done, time.perf_counter() - started)
+        conn.commit()
+        wb.save(out_path)
+    finally:
+        conn.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every table of the store to one xlsx workbook")
+    parser.add_argument("db_path", nargs="?", default="data/store.db")
+    parser.add_argument("out_path", nargs="?", default="store_export.xlsx")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows fetched per step")
+    parser.add_argument("--rows-per-sheet", type=int, default=EXCEL_MAX_ROWS - 1,
+                        help="data rows per sheet before a table is split")
+    parser.add_argument("--table", action="append", dest="tables", help="export only this table (repeatable)")
+    parser.add_argument("--internal", action="store_true",
+                        help="also export internal tables (rollups, id sequences, change log, ...)")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    written = export_xlsx(args.db_path, args.out_path, args.tables, args.chunk_size,
+                          min(args.rows_per_sheet, EXCEL_MAX_ROWS - 1), Progress(enabled=not args.quiet),
+                          args.internal)
+    print(f"Exported {len(written)} tables, {sum(written.values()):,} rows to {args.out_path} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
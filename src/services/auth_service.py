@@ -57,6 +57,10 @@ def register(repo: dbFunctions):
         return None
 
     rs_user = repo.insert_customer(userName, email, password)
+    if rs_user is None:
+        #   registered by someone else since the check above
+        print("\n[X] This email address already registered!\n")
+        return None
     print("\n[✓] Sign up sucessfully!\n")
     print("\nPlease remember your user id is :\n", rs_user.uid)
     print("\n[......] Loading customer page\n")
@@ -39,8 +39,8 @@ class customerFunctions:
     def customer_logout(self):
         print("\n[...] Logging out")
         if self.sessionInformation is not None:
-            self.db.update_session(self.sessionInformation)
-            self.db.clear_cart(self.sessionInformation) 
+            self.db.flush_events()
+            self.db.end_session(self.sessionInformation)
         print("\n [✓] You have been logged out successfully!")
         self.sessionInformation = None
         
@@ -77,8 +77,8 @@ class customerFunctions:
                 return self.customer_logout()
             elif choice == "5":
                 if self.sessionInformation is not None:
-                    self.db.clear_cart(self.sessionInformation)
-                    self.db.update_session(self.sessionInformation)
+                    self.db.end_session(self.sessionInformation)
+                self.db.close()
                 print("\n[...] Exiting program.Thank you for using our program!")
                 sys.exit(1)
             else:
@@ -94,42 +94,28 @@ class customerFunctions:
                 search = input("\n[X] Keywords can not be empty:\n").strip().lower()
             else:
                 break
-        #   Build WHERE conditions dynamically for multi-word searches
-        
         #   Automatically create a session for this customer
         self.check_session()
 
-        conditions = []
-        params = []
         keywords = search.split()
-
-        for k in keywords:
-            conditions.append("(LOWER(name) LIKE ? OR LOWER(descr) LIKE ?)")
-            params = params + [f"%{k}%"] * 2
-        rs = self.db.search_product(conditions, params, self.sessionInformation)
-        if not rs:
+        cursor = self.db.search_product_cursor(keywords, self.sessionInformation)
+        if not cursor.first().rows:
             print("\n[!] There is no result according to the keyword:",search)
             return None
         frm = 'products'
-        return self.show_product_orders(rs,frm)
+        return self.show_product_orders(cursor,frm)
 
     #   Display paginated results for products or orders.
     #   Supports navigation (Next / Previous / Back / Exit).
+    #   Only the page on screen is fetched (keyset pagination, see src/db/pagination.py).
     #   Args:
-    #       result (list): List of products or orders to display.
+    #       cursor (KeysetCursor): Cursor over the products or orders to display.
     #       frm (str): "products" or "orders" to determine display mode.
-    def show_product_orders(self,result,frm):
+    def show_product_orders(self,cursor,frm):
 
         frm = frm
-        page = 0 
-        product_per_page = 5
-
-        #   Check if the result can be divided by 5
-        total_page = ( len(result) // product_per_page )
-
-        if len(result) % product_per_page != 0:
-            total_page = total_page + 1
-        self.display_products_orders(page,product_per_page,result,frm)
+        page = cursor.page or cursor.first()
+        self.display_products_orders(page,frm)
         
         while True:
 
@@ -138,27 +124,27 @@ class customerFunctions:
             choice = input("[N]ext\t\t [P]rev\t\t [#]Select \t\t [B]ack\t\t [L]ogout\t\n ").strip().upper()
 
             if choice.isdigit():
-                if int(choice) <= 0 or int(choice) > 5:
-                    print("\nInvalid Number! Please enter 1 to 5 to see Details!\n")
+                if int(choice) <= 0 or int(choice) > cursor.page_size:
+                    print(f"\nInvalid Number! Please enter 1 to {cursor.page_size} to see Details!\n")
                 else:
-                    index = ( page * product_per_page ) + int(choice) - 1
-                    res = self.product_orders_details(index,result,frm)
+                    index = int(choice) - 1
+                    res = self.product_orders_details(index,page.rows,frm)
                     if res == "Logout":
                         return "Logout"
-                    self.display_products_orders(page, product_per_page, result, frm)
+                    self.display_products_orders(page, frm)
             elif choice == "N":
-                if page < (total_page - 1):
-                    page = page + 1
-                    self.display_products_orders(page, product_per_page, result, frm)
+                if page.has_next:
+                    page = cursor.next()
+                    self.display_products_orders(page, frm)
                 else:
-                    self.display_products_orders(page, product_per_page, result, frm)
+                    self.display_products_orders(page, frm)
                     print("\n[X] This is the last page!")
             elif choice == "P":
-                if page >= 1:
-                    page = page - 1
-                    self.display_products_orders(page, product_per_page, result, frm)
+                if page.has_prev:
+                    page = cursor.prev()
+                    self.display_products_orders(page, frm)
                 else:
-                    self.display_products_orders(page, product_per_page, result, frm)
+                    self.display_products_orders(page, frm)
                     print("\n[X] This is the first page!")
             elif choice == "B":
                 print("\n[......] Backing to Search Page")
@@ -170,39 +156,35 @@ class customerFunctions:
 
     #   Show summary of products or orders for the current page.
     #   Args:
-    #       page (int): Current page index.
-    #       product_per_page (int): Number of records per page.
-    #       result (list): Data rows to display.
+    #       page (Page): Current page (rows and page number).
     #       frm (str): 'products' or 'orders'.
-    def display_products_orders(self,page,product_per_page,result,frm):
+    def display_products_orders(self,page,frm):
         
-        start_index = page * product_per_page
-        end_index = start_index + product_per_page
         count = 1
         print("\n\n")
         order_total = 0
         if frm == "products":
-            for row in result[start_index:end_index]:
+            for row in page.rows:
                 print(count,"Product Name:\t\t",row['name'])
                 print("\n  Product Price:\t",row['price'])
                 print("\n  Product Stock:\t",row['stock_count'])
                 print("\n")
                 count = count + 1
-            print("Current Page number:", (page + 1))
+            print("Current Page number:", (page.number + 1))
         elif frm == "orders":
-            for row in result[start_index:end_index]:
+            for row in page.rows:
                 print(count,". Order number:\t\t",row['ono'])
                 print("\n    Date:\t\t",row['odate'])
                 print("\n    Shipping:\t\t",row['shipping_address'])
                 print("\n    Total:\t\t",row['total'])
                 print("\n")
                 count = count + 1
-            print("Current Page number:", (page + 1))
+            print("Current Page number:", (page.number + 1))
                  
     #   Display detailed information for a selected product or order.
     #   Args:
-    #       index (int): Index of selected item in result list.
-    #       result (list): Search or order results.
+    #       index (int): Index of selected item on the current page.
+    #       result (list): Rows of the current page.
     #       frm (str): Indicates display type ('products' or 'orders').
     def product_orders_details(self,index,result,frm):
 
@@ -509,10 +491,10 @@ class customerFunctions:
     def customer_previous_order(self):
 
         self.check_session()
-        rs = self.db.get_orders(self.userinf.uid)
-        if not rs:
+        cursor = self.db.get_orders_cursor(self.userinf.uid)
+        if not cursor.first().rows:
             print ("\n[!] You have not place any order!")
             return
         frm = 'orders'
-        return self.show_product_orders(rs,frm)
+        return self.show_product_orders(cursor,frm)
         
\ No newline at end of file
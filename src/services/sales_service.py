@@ -1,7 +1,10 @@
 from src.domain.models import User
+from src.db.analytics import print_report
+from src.db.funnel import print_funnel
 from src.db.repository import dbFunctions
 import pandas as pd
 from datetime import datetime
+import sqlite3
 import sys
 
 
@@ -18,8 +21,11 @@ class SalesFunctions:
             print("1. Update product information")
             print("2. Weekly sales report (last 7 days)")
             print("3. Top products (by distinct orders & by views)")
-            print("4. Logout")
-            print("5.Exit program")
+            print("4. Import product feed (CSV / JSONL)")
+            print("5. Customer analytics (RFM segments, cohorts, baskets)")
+            print("6. Conversion funnel (search to purchase)")
+            print("7. Logout")
+            print("8. Exit program")
             print("===========================")
             choice = input("Please enter your choice: ").strip()
             if choice == "1":
@@ -29,13 +35,20 @@ class SalesFunctions:
             elif choice == "3":
                 self.show_top_products()
             elif choice == "4":
+                self.import_products_flow()
+            elif choice == "5":
+                self.show_customer_analytics()
+            elif choice == "6":
+                self.show_conversion_funnel()
+            elif choice == "7":
                 print("\nSee you next time!")
                 return 
-            elif choice =="5":
+            elif choice =="8":
                 print("\nExting program......")
+                self.db.close()
                 sys.exit(0)  
             else:
-                print("\n[X] Invalid input! Please select 1,2,3,4")
+                print("\n[X] Invalid input! Please select 1-8")
 
     def update_product_flow(self):
         # --- PID: loop until a valid integer pid that exists; allow 'q' to cancel ---
@@ -91,21 +104,86 @@ class SalesFunctions:
             else:
                 print("[X] Invalid stock (must be a non-negative integer). Try again.")
 
+    def import_products_flow(self):
+        path = input("Feed file (.csv or .jsonl, blank to cancel): ").strip()
+        if not path:
+            print("[...] Cancelled."); return
+        rejects = input("File for rejected rows (blank: show them here): ").strip() or None
+        report = self.db.import_products(path, rejects)
+        if report is None:
+            return
+        print(f"\n[✓] Read {report['read']} rows: {report['inserted']} new, {report['updated']} updated, "
+              f"{report['unchanged']} unchanged, {report['rejected']} rejected ({report['seconds']}s)")
+        if rejects and report["rejected"]:
+            print(f"Rejected rows written to {rejects}")
+        else:
+            for r in report["rejects"][:20]:
+                print(f"  line {r['line']}: {r['reason']}")
+
     def show_weekly_report(self):
-        metrics = self.db.weekly_sales_metrics()
+        # Totals and trend come from the same snapshot of the store
+        try:
+            with self.db.report_snapshot() as snap:
+                metrics = self.db.weekly_sales_metrics(group_by="day")
+                header = snap.describe()
+        except (sqlite3.Error, ValueError) as e:
+            print("\n[X] Could not take a report snapshot\n"); print(e)
+            return
         if not metrics:
             print("[X] Could not compute weekly sales metrics.")
             return
         print("\n===== Weekly Sales Report (last 7 days inclusive) =====")
+        print(header)
         print(f"Distinct orders:           {metrics['orders']}")
         print(f"Distinct products sold:    {metrics['products']}")
         print(f"Distinct customers:        {metrics['customers']}")
         print(f"Avg spent per customer:    {metrics['avg_per_customer']}")
         print(f"Total sales amount:        {metrics['total_sales']}")
+        self.print_trend(metrics['buckets'])
+
+    def print_trend(self, buckets):
+        # One line per day/week/month bucket, same metrics as the totals above
+        print(f"\n{'Period':<12}{'Orders':>8}{'Products':>10}{'Customers':>11}{'Sales':>14}")
+        print("-" * 55)
+        for b in buckets:
+            print(f"{b['bucket']:<12}{b['orders']:>8}{b['products']:>10}{b['customers']:>11}{b['total_sales']:>14.2f}")
+
+    def show_customer_analytics(self):
+        report = self.db.customer_analytics()
+        if not report:
+            print("[X] Could not compute customer analytics.")
+            return
+        if not report["orders"]:
+            print("(no orders yet)")
+            return
+        print("\n===== Customer Analytics (all orders) =====")
+        if report.get("snapshot"):
+            print("(figures as of the last analytics snapshot)")
+        print_report(report)
+
+    def show_conversion_funnel(self):
+        report = self.db.conversion_funnel()
+        if not report:
+            print("[X] Could not compute the conversion funnel.")
+            return
+        if not report["sessions"]:
+            print("(no sessions yet)")
+            return
+        print("\n===== Conversion Funnel (all sessions) =====")
+        print_funnel(report)
 
     def show_top_products(self):
+        # Both lists (and the export) come from the same snapshot of the store
+        try:
+            with self.db.report_snapshot() as snap:
+                ords = self.db.top_products_by_distinct_orders()
+                views = self.db.top_products_by_views()
+                header = snap.describe()
+        except (sqlite3.Error, ValueError) as e:
+            print("\n[X] Could not take a report snapshot\n"); print(e)
+            return
+        print("\n" + header)
         print("\n===== Top by Distinct Orders (with ties at rank 3) =====")
-        ords = self.db.top_products_by_distinct_orders()
         if not ords:
             print("(no data)")
         else:
@@ -113,7 +191,6 @@ class SalesFunctions:
                 print(f"{i}. PID {r['pid']}  {r['name']}  orders={r['count']}")
 
         print("\n===== Top by Views (with ties at rank 3) =====")
-        views = self.db.top_products_by_views()
         if not views:
             print("(no data)")
         else:
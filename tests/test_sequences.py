@@ -0,0 +1,144 @@
+import multiprocessing as mp
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from src.db.migrations import migrate
+from src.db.pool import ConnectionPool
+from src.db.sequences import IdAllocator, resync
+
+#   Concurrency checks for the id allocator (src/db/sequences.py): ids drawn
+#   from several threads and several processes against one store are unique,
+#   and with every block used up they are consecutive, so neither blocks nor
+#   resync() leave gaps.
+#
+#   Run from the project root: python -m unittest discover tests
+
+STORE = os.path.join(os.path.dirname(__file__), os.pardir, "data", "store.db")
+THREADS = 4
+PROCS = 3
+PER_WORKER = 60         #   a multiple of every block size: no half-used block is left
+
+
+#   Draw `n` ids of one sequence in a process of its own (own pool, own allocator).
+def _draw(db_path, name, scope, n, threads, out):
+    pool = ConnectionPool(db_path, busy_timeout=30.0)
+    try:
+        out.put(_draw_threads(IdAllocator(pool), name, scope, n, threads))
+    finally:
+        pool.close()
+
+
+#   Draw `n` ids per thread from `threads` threads sharing one allocator.
+def _draw_threads(ids, name, scope, n, threads):
+    drawn = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def run():
+        mine = []
+        start.wait()
+        for _ in range(n):
+            mine.append(ids.next_id(name, scope))
+        with lock:
+            drawn.extend(mine)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return drawn
+
+
+class IdAllocatorConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="store_test_")
+        self.path = os.path.join(self.workdir, "store.db")
+        src = sqlite3.connect(STORE)
+        dst = sqlite3.connect(self.path)
+        src.backup(dst)
+        src.close()
+        migrate(dst)
+        self.cid, self.sno = dst.execute("SELECT cid, MIN(sessionNo) FROM sessions GROUP BY cid LIMIT 1;").fetchone()
+        dst.close()
+        self.pool = ConnectionPool(self.path, busy_timeout=30.0)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _first_free(self, name, scope=0):
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("SELECT next_value FROM id_sequences WHERE name = ? AND scope = ?;",
+                               (name, scope)).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+
+    #   ids must be unique and, with every block used up, exactly first..first+len-1
+    def assertConsecutive(self, drawn, first):
+        self.assertEqual(len(drawn), len(set(drawn)), "an id was handed out twice")
+        self.assertEqual(sorted(drawn), list(range(first, first + len(drawn))), "ids were skipped")
+
+    def _draw_processes(self, name, scope):
+        ctx = mp.get_context("spawn")
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_draw, args=(self.path, name, scope, PER_WORKER, THREADS, out))
+                 for _ in range(PROCS)]
+        for p in procs:
+            p.start()
+        drawn = [v for _ in procs for v in out.get(timeout=120)]
+        for p in procs:
+            p.join(timeout=30)
+            self.assertEqual(p.exitcode, 0)
+        return drawn
+
+    def test_threads_share_one_allocator(self):
+        ids = IdAllocator(self.pool)
+        ids.reserve("ono", 0)           #   seed the row before measuring from it
+        first = self._first_free("ono")
+        drawn = _draw_threads(ids, "ono", 0, PER_WORKER, THREADS)
+        self.assertConsecutive(drawn, first)
+
+    def test_processes_and_threads(self):
+        IdAllocator(self.pool).reserve("uid", 0)    #   seed the row before measuring from it
+        first = self._first_free("uid")
+        drawn = self._draw_processes("uid", 0)
+        self.assertEqual(len(drawn), PROCS * THREADS * PER_WORKER)
+        self.assertConsecutive(drawn, first)
+
+    def test_scoped_sequence_across_processes(self):
+        IdAllocator(self.pool).reserve("sessionNo", 0, scope=self.cid)
+        first = self._first_free("sessionNo", self.cid)
+        drawn = self._draw_processes("sessionNo", self.cid)
+        self.assertConsecutive(drawn, first)
+
+    def test_resync_leaves_no_gap_and_no_duplicate(self):
+        ids = IdAllocator(self.pool, block_sizes={"ono": 1})
+        before = [ids.next_id("ono") for _ in range(5)]
+
+        #   the sequence is already past every ono: resync must not move it either way
+        with self.pool.writer() as conn:
+            resync(conn)
+        ids.reset()
+        self.assertEqual(ids.next_id("ono"), before[-1] + 1)
+
+        #   rows written around the allocator: resync moves to exactly MAX(ono) + 1
+        with self.pool.writer() as conn:
+            top = conn.execute("SELECT MAX(ono) FROM orders;").fetchone()[0]
+            conn.execute("INSERT INTO orders (ono, cid, sessionNo, odate, shipping_address) "
+                         "VALUES (?, ?, ?, '2025-01-01', 'test');", (before[-1] + 10, self.cid, self.sno))
+            resync(conn)
+        ids.reset()
+        self.assertGreater(before[-1] + 10, top)
+        self.assertEqual(ids.next_id("ono"), before[-1] + 11)
+
+
+if __name__ == "__main__":
+    unittest.main()